@@ -0,0 +1,372 @@
+### Headless JSON API over the db helpers, for HR and travel integrations ###
+# A plain WSGI application, no web framework needed:
+#   TEAMVERSION_API_TOKEN=secret python -m api --port 8000
+# Every request needs "Authorization: Bearer <token>"; without a configured token the API
+# answers 401 to everything. TestClient calls the application in-process, for local checks.
+#
+#   GET  /users?after=&limit=                     users ordered by user_ID
+#   GET  /users/<user_ID>
+#   GET  /trips?after=&limit=&from=&to=&status=   trips ordered by (start_date, trip_ID)
+#   GET  /trips/<trip_ID>                         with status, budget and participants
+#   GET  /trips/<trip_ID>/participants
+#   PUT  /trips/<trip_ID>/participants            {"user_IDs": [...]}
+#   POST /trips/batch                             {"trips": [{destination, start_date, end_date, ...}]}
+#   PUT  /participants/batch                      {"trips": {"<trip_ID>": [user_IDs]}}
+#   GET  /changes?since=&limit=                   the change feed (migration 11)
+#
+# Lists return {"items": [...], "next": cursor}; pass `next` back as ?after= until it is null.
+# GET responses carry an ETag, a matching If-None-Match gets 304 without a body.
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import sqlite3
+from datetime import date
+from io import BytesIO
+from urllib.parse import parse_qs, urlencode
+from wsgiref.simple_server import make_server
+
+from db.db_migrations import run_migrations, TRIP_STATUSES
+from db.db_functions_users import load_users_page, load_user
+from db.db_functions_trips import (
+    add_trips, load_trip, load_trip_page, set_trip_participants, set_many_trip_participants
+)
+from db.db_functions_budget import trip_budget, load_trip_statuses
+from db.db_functions_changes import changes_since
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_BATCH = 1000
+MAX_BODY = 10 * 1024 * 1024
+#SQLite stores integers as signed 64 bit
+MAX_INTEGER = 2 ** 63 - 1
+
+log = logging.getLogger("teamversion.api")
+
+_STATUS_TEXT = {
+    200: "OK", 201: "Created", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized",
+    404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str, **details):
+        super().__init__(message)
+        self.status = status
+        self.body = {"error": message, **details}
+
+
+### Opaque keyset cursors: the sort key of the last item, base64url-encoded JSON ###
+def encode_cursor(key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError, RecursionError):
+        raise ApiError(400, "invalid cursor")
+
+
+#query strings and path segments arrive as str, JSON bodies and cursors as int; floats and booleans are refused
+def _int(value, name: str, minimum: int = 0) -> int:
+    if not isinstance(value, (int, str)) or isinstance(value, bool):
+        raise ApiError(400, f"{name} has to be an integer")
+    try:
+        number = int(value)
+    except ValueError:
+        raise ApiError(400, f"{name} has to be an integer")
+    if number < minimum:
+        raise ApiError(400, f"{name} has to be at least {minimum}")
+    if number > MAX_INTEGER:
+        raise ApiError(400, f"{name} has to be at most {MAX_INTEGER}")
+    return number
+
+def _date(value, name: str) -> str:
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise ApiError(400, f"{name} has to be YYYY-MM-DD")
+
+def _limit(query: dict) -> int:
+    return min(_int(query.get("limit", DEFAULT_LIMIT), "limit", 1), MAX_LIMIT)
+
+def _user_IDs(value, name: str) -> list:
+    if not isinstance(value, list):
+        raise ApiError(400, f"{name} has to be a list of user_IDs")
+    return [_int(v, name, 1) for v in value]
+
+
+def _user(row) -> dict:
+    user_ID, username, email, role, manager_ID = row
+    return {"user_ID": user_ID, "username": username, "email": email, "role": role, "manager_ID": manager_ID}
+
+def _participant(row) -> dict:
+    user_ID, username, email, manager_ID = row
+    return {"user_ID": user_ID, "username": username, "email": email, "manager_ID": manager_ID}
+
+
+def list_users(query: dict, body):
+    after = _int(decode_cursor(query["after"]), "after") if "after" in query else None
+    limit = _limit(query)
+    rows = load_users_page(after, limit + 1)
+    next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+    return 200, {"items": [_user(r) for r in rows[:limit]], "next": next_cursor}
+
+def get_user(query: dict, body, user_ID: str):
+    row = load_user(_int(user_ID, "user_ID", 1))
+    if row is None:
+        raise ApiError(404, "user not found")
+    return 200, _user(row)
+
+def list_trips(query: dict, body):
+    after = decode_cursor(query["after"]) if "after" in query else None
+    if after is not None:
+        if not isinstance(after, list) or len(after) != 2:
+            raise ApiError(400, "invalid cursor")
+        #(start_day, trip_ID), the day is null for trips without a date
+        after = (None if after[0] is None else _int(after[0], "after"), _int(after[1], "after"))
+    date_from = _date(query["from"], "from") if "from" in query else None
+    date_to = _date(query["to"], "to") if "to" in query else None
+    status = query.get("status")
+    if status is not None and status not in TRIP_STATUSES:
+        raise ApiError(400, f"status has to be one of {', '.join(TRIP_STATUSES)}")
+
+    trips, participants, next_key = load_trip_page(after, _limit(query), date_from, date_to, status)
+    statuses = load_trip_statuses([t[0] for t in trips])
+    items = []
+    for trip_ID, destination, start_date, end_date, occasion in trips:
+        trip_status, budget_cents = statuses.get(trip_ID, (None, None))
+        items.append({
+            "trip_ID": trip_ID, "destination": destination, "start_date": start_date, "end_date": end_date,
+            "occasion": occasion, "status": trip_status, "budget_cents": budget_cents,
+            "participants": [p[0] for p in participants.get(trip_ID, [])],
+        })
+    return 200, {"items": items, "next": encode_cursor(list(next_key)) if next_key else None}
+
+def get_trip(query: dict, body, trip_ID: str):
+    trip, participants = load_trip(_int(trip_ID, "trip_ID", 1))
+    if trip is None:
+        raise ApiError(404, "trip not found")
+    trip_ID, destination, start_date, end_date, occasion = trip
+    status, budget_cents, spent_cents, _ = trip_budget(trip_ID)
+    return 200, {
+        "trip_ID": trip_ID, "destination": destination, "start_date": start_date, "end_date": end_date,
+        "occasion": occasion, "status": status, "budget_cents": budget_cents, "spent_cents": spent_cents,
+        "participants": [_participant(p) for p in participants],
+    }
+
+def get_participants(query: dict, body, trip_ID: str):
+    trip, participants = load_trip(_int(trip_ID, "trip_ID", 1))
+    if trip is None:
+        raise ApiError(404, "trip not found")
+    return 200, {"items": [_participant(p) for p in participants]}
+
+def put_participants(query: dict, body, trip_ID: str):
+    trip, _ = load_trip(_int(trip_ID, "trip_ID", 1))
+    if trip is None:
+        raise ApiError(404, "trip not found")
+    if not isinstance(body, dict):
+        raise ApiError(400, "body has to be an object with user_IDs")
+    added, removed = set_trip_participants(trip[0], _user_IDs(body.get("user_IDs"), "user_IDs"))
+    return 200, {"trip_ID": trip[0], "added": added, "removed": removed}
+
+### Validates the whole batch first, then writes it in one transaction ###
+def create_trips(query: dict, body):
+    trips = body.get("trips") if isinstance(body, dict) else None
+    if not isinstance(trips, list) or not trips:
+        raise ApiError(400, "body has to be an object with a non-empty list of trips")
+    if len(trips) > MAX_BATCH:
+        raise ApiError(413, f"at most {MAX_BATCH} trips per batch")
+
+    clean = []
+    for index, trip in enumerate(trips):
+        try:
+            if not isinstance(trip, dict):
+                raise ApiError(400, "trip has to be an object")
+            destination = str(trip.get("destination") or "").strip()
+            if not destination:
+                raise ApiError(400, "destination is required")
+            start_date = _date(trip.get("start_date"), "start_date")
+            end_date = _date(trip.get("end_date", start_date), "end_date")
+            if end_date < start_date:
+                raise ApiError(400, "end_date is before start_date")
+            status = trip.get("status", "planned")
+            if status not in TRIP_STATUSES:
+                raise ApiError(400, f"status has to be one of {', '.join(TRIP_STATUSES)}")
+            budget_cents = trip.get("budget_cents")
+            clean.append({
+                "destination": destination,
+                "start_date": start_date,
+                "end_date": end_date,
+                "occasion": str(trip.get("occasion") or ""),
+                "manager_ID": None if trip.get("manager_ID") is None else _int(trip["manager_ID"], "manager_ID", 1),
+                "status": status,
+                "budget_cents": None if budget_cents is None else _int(budget_cents, "budget_cents"),
+                "participants": _user_IDs(trip.get("participants", []), "participants"),
+            })
+        except ApiError as e:
+            e.body["index"] = index
+            raise
+
+    return 201, {"trip_IDs": add_trips(clean)}
+
+def set_participants_batch(query: dict, body):
+    trips = body.get("trips") if isinstance(body, dict) else None
+    if not isinstance(trips, dict) or not trips:
+        raise ApiError(400, "body has to be an object mapping trip_IDs to lists of user_IDs")
+    if len(trips) > MAX_BATCH:
+        raise ApiError(413, f"at most {MAX_BATCH} trips per batch")
+    participants = {_int(trip_ID, "trip_ID", 1): _user_IDs(user_IDs, f"trips.{trip_ID}") for trip_ID, user_IDs in trips.items()}
+    missing = set(participants) - set(load_trip_statuses(participants))
+    if missing:
+        raise ApiError(404, "trips not found", trip_IDs=sorted(missing))
+    changes = set_many_trip_participants(participants)
+    return 200, {"items": [{"trip_ID": t, "added": a, "removed": r} for t, (a, r) in changes.items()]}
+
+def list_changes(query: dict, body):
+    entries = changes_since(_int(query.get("since", 0), "since"), _limit(query))
+    return 200, {"items": entries, "next": entries[-1]["seq"] if entries else None}
+
+
+ROUTES = [
+    ("GET", re.compile(r"/users"), list_users),
+    ("GET", re.compile(r"/users/(\d+)"), get_user),
+    ("GET", re.compile(r"/trips"), list_trips),
+    ("POST", re.compile(r"/trips/batch"), create_trips),
+    ("GET", re.compile(r"/trips/(\d+)"), get_trip),
+    ("GET", re.compile(r"/trips/(\d+)/participants"), get_participants),
+    ("PUT", re.compile(r"/trips/(\d+)/participants"), put_participants),
+    ("PUT", re.compile(r"/participants/batch"), set_participants_batch),
+    ("GET", re.compile(r"/changes"), list_changes),
+]
+
+
+def _route(method: str, path: str):
+    allowed = False
+    for route_method, pattern, handler in ROUTES:
+        match = pattern.fullmatch(path)
+        if match:
+            if route_method == method:
+                return handler, match.groups()
+            allowed = True
+    raise ApiError(405 if allowed else 404, "method not allowed" if allowed else "not found")
+
+
+def _read_body(environ):
+    length = _int(environ.get("CONTENT_LENGTH") or 0, "Content-Length")
+    if length > MAX_BODY:
+        raise ApiError(413, "body too large")
+    if not length:
+        return None
+    try:
+        return json.loads(environ["wsgi.input"].read(length))
+    except (ValueError, RecursionError):
+        raise ApiError(400, "body is not valid JSON")
+
+
+### WSGI application; `token` defaults to TEAMVERSION_API_TOKEN ###
+def make_app(token: str | None = None):
+    token = token if token is not None else os.environ.get("TEAMVERSION_API_TOKEN", "")
+    run_migrations()
+
+    def app(environ, start_response):
+        method = environ["REQUEST_METHOD"]
+        etag = None
+        try:
+            supplied = environ.get("HTTP_AUTHORIZATION", "")
+            if not token or not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+                raise ApiError(401, "missing or wrong API token")
+            handler, args = _route(method, environ.get("PATH_INFO", "") or "/")
+            query = {k: v[-1] for k, v in parse_qs(environ.get("QUERY_STRING", "")).items()}
+            status, payload = handler(query, _read_body(environ), *args)
+        except ApiError as e:
+            status, payload = e.status, e.body
+        except sqlite3.IntegrityError as e:
+            status, payload = 409, {"error": str(e)}
+        except Exception:
+            #still a JSON body for the client, the traceback goes to the log
+            log.exception("%s %s failed", method, environ.get("PATH_INFO", ""))
+            status, payload = 500, {"error": "internal error"}
+
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        headers = [("Content-Type", "application/json")]
+        if method == "GET" and status == 200:
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            headers.append(("ETag", etag))
+            if etag in [t.strip() for t in environ.get("HTTP_IF_NONE_MATCH", "").split(",")]:
+                start_response("304 Not Modified", headers)
+                return [b""]
+        headers.append(("Content-Length", str(len(body))))
+        start_response(f"{status} {_STATUS_TEXT.get(status, '')}", headers)
+        return [body]
+
+    return app
+
+
+### In-process client: calls the WSGI app directly, no sockets ###
+class Response:
+    def __init__(self, status: int, headers: dict, body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+class TestClient:
+    def __init__(self, app, token: str | None = None):
+        self.app = app
+        self.token = token
+
+    def request(self, method: str, path: str, params: dict | None = None, json_body=None, headers: dict | None = None):
+        data = json.dumps(json_body).encode() if json_body is not None else b""
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "QUERY_STRING": urlencode(params or {}),
+            "CONTENT_LENGTH": str(len(data)),
+            "CONTENT_TYPE": "application/json",
+            "wsgi.input": BytesIO(data),
+        }
+        if self.token is not None:
+            environ["HTTP_AUTHORIZATION"] = f"Bearer {self.token}"
+        for name, value in (headers or {}).items():
+            environ["HTTP_" + name.upper().replace("-", "_")] = value
+
+        captured = {}
+
+        def start_response(status, response_headers):
+            captured["status"] = int(status.split()[0])
+            captured["headers"] = dict(response_headers)
+
+        body = b"".join(self.app(environ, start_response))
+        return Response(captured["status"], captured["headers"], body)
+
+    def get(self, path: str, params: dict | None = None, headers: dict | None = None):
+        return self.request("GET", path, params, headers=headers)
+
+    def post(self, path: str, json_body=None):
+        return self.request("POST", path, json_body=json_body)
+
+    def put(self, path: str, json_body=None):
+        return self.request("PUT", path, json_body=json_body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Teamversion JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    with make_server(args.host, args.port, make_app()) as server:
+        print(f"Serving on http://{args.host}:{args.port}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
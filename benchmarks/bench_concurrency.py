@@ -0,0 +1,95 @@
+### Reader/writer throughput of the storage profiles under concurrent sessions ###
+# run from the repository root:  python -m benchmarks.bench_concurrency [seconds]
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from db import db_connection
+from db.db_connection import PROFILES, connection, transaction
+from db.db_migrations import run_migrations, day_number
+
+READERS = 16
+WRITERS = 4
+TRIPS = 2000
+
+
+def seed():
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO trips (destination, start_day, end_day, occasion) VALUES (?, ?, ?, ?)",
+            [(f"City {t % 40}", day_number(f"2024-{t % 12 + 1:02d}-{t % 28 + 1:02d}"), day_number(f"2024-{t % 12 + 1:02d}-28"), "Meeting")
+             for t in range(TRIPS)]
+        )
+
+
+def run_profile(profile: str, seconds: float) -> dict:
+    counts = {"reads": 0, "writes": 0, "lock_errors": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    #what a dashboard rerun reads: one page of the trip overview
+    def reader():
+        while time.monotonic() < stop:
+            try:
+                with connection() as conn:
+                    conn.execute("""
+                        SELECT trip_ID, destination, start_date, end_date, occasion
+                        FROM trips ORDER BY start_day, trip_ID LIMIT 25
+                    """).fetchall()
+                count("reads")
+            except sqlite3.OperationalError:
+                count("lock_errors")
+
+    #what a manager saving a trip writes
+    def writer(seed_id):
+        n = seed_id
+        while time.monotonic() < stop:
+            n += WRITERS
+            try:
+                with transaction() as conn:
+                    conn.execute("UPDATE trips SET occasion = ? WHERE trip_ID = ?", (f"edit {n}", n % TRIPS + 1))
+                count("writes")
+            except sqlite3.OperationalError:
+                count("lock_errors")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.configure(path=os.path.join(tmp, f"{profile}.db"), size=READERS + WRITERS, profile=profile)
+        run_migrations()
+        seed()
+        threads = [threading.Thread(target=reader) for _ in range(READERS)]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(WRITERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = db_connection.pool_stats()
+        db_connection.configure(path=os.path.join(tmp, "closed.db"))
+
+    return {
+        "profile": profile,
+        "seconds": seconds,
+        "reads_per_s": round(counts["reads"] / seconds, 1),
+        "writes_per_s": round(counts["writes"] / seconds, 1),
+        "lock_errors": counts["lock_errors"],
+        "checkpoints": stats["checkpoints"],
+    }
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    original = db_connection.DB_USERS
+    results = [run_profile(profile, seconds) for profile in PROFILES]
+    db_connection.configure(path=original)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+### Cold start of every page: import time, first and warm render time, memory per process ###
+# run from the repository root:
+#   python -m benchmarks.bench_startup --scale 1k
+#   python -m benchmarks.bench_startup --db benchmarks/data/100k.db --out benchmarks/results/startup.json
+# Each page is measured in a fresh interpreter, the way a new server worker starts: first
+# `import streamlit`, then the modules the page script imports, then its first render with
+# AppTest (signed in with a generated account of the page's role) and one warm rerun.
+# heavy_modules lists which of HEAVY_MODULES the process had loaded after the first render.
+import argparse
+import ast
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks.generate_data import SCALES, generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join("benchmarks", "data")
+#page script -> role it is rendered as, None renders signed out
+PAGES = {
+    "main.py": None,
+    "pages/user_overview.py": "User",
+    "pages/manager_overview.py": "Manager",
+    "pages/admin_overview.py": "Administrator",
+}
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "altair")
+TIMEOUT = 120
+
+
+### Modules a page script imports at its top level, streamlit excluded ###
+def page_imports(page: str) -> list:
+    with open(os.path.join(ROOT, page)) as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return [m for m in dict.fromkeys(modules) if m.split(".")[0] != "streamlit"]
+
+
+def _ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+### Session state of a generated account with `role`, as main.py would set it after the login ###
+def _session_for(role: str) -> dict:
+    from db.db_connection import connection
+    with connection() as conn:
+        username, user_ID, sortkey = conn.execute("""
+            SELECT u.username, u.user_ID, r.sortkey FROM users u
+            JOIN roles r ON r.role = u.role
+            WHERE u.role = ?
+            ORDER BY (SELECT COUNT(*) FROM user_trips ut WHERE ut.user_ID = u.user_ID)
+                   + (SELECT COUNT(*) FROM users m WHERE m.manager_ID = u.user_ID) DESC
+            LIMIT 1
+        """, (role,)).fetchone()
+    return {"username": username, "role": role, "user_ID": user_ID, "role_sortkey": sortkey}
+
+
+### Runs in the fresh interpreter: measures one page and prints its JSON line ###
+def measure_page(page: str, path: str) -> dict:
+    import importlib
+    import resource
+
+    started = time.perf_counter()
+    import streamlit  # noqa: F401
+    from streamlit.testing.v1 import AppTest
+    streamlit_ms = _ms(started)
+
+    started = time.perf_counter()
+    for module in page_imports(page):
+        importlib.import_module(module)
+    import_ms = _ms(started)
+
+    from db import db_connection
+    db_connection.configure(path=path)
+    at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=TIMEOUT)
+    role = PAGES[page]
+    if role is not None:
+        for key, value in _session_for(role).items():
+            at.session_state[key] = value
+
+    started = time.perf_counter()
+    at.run()
+    first_render_ms = _ms(started)
+    heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+    started = time.perf_counter()
+    at.run()
+    warm_render_ms = _ms(started)
+
+    return {
+        "streamlit_import_ms": streamlit_ms,
+        "import_ms": import_ms,
+        "first_render_ms": first_render_ms,
+        "warm_render_ms": warm_render_ms,
+        "errors": [e.message.splitlines()[0] for e in at.exception],
+        "heavy_modules": heavy,
+        "modules": len(sys.modules),
+        #ru_maxrss is in KiB on Linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_startup(path: str, repeat: int) -> dict:
+    pages = {}
+    for page in PAGES:
+        runs = []
+        for _ in range(repeat):
+            result = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_startup", "--child", page, "--db", path],
+                cwd=ROOT, capture_output=True, text=True, timeout=TIMEOUT * 2
+            )
+            if result.returncode != 0:
+                raise SystemExit(f"{page} failed:\n{result.stderr}")
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+        #median run by first render, the other fields come from the same process
+        runs.sort(key=lambda r: r["first_render_ms"])
+        pages[page] = runs[len(runs) // 2]
+    return {"pages": pages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and first-render time per page")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+    parser.add_argument("--db", help="render against this database instead of a generated one")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh processes per page, the median is reported")
+    parser.add_argument("--out", help="write the JSON results to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(DATA_DIR, f"{args.scale}.db")
+    if args.child:
+        print(json.dumps(measure_page(args.child, path)))
+        return
+    if args.db is None and not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        generate(path, **SCALES[args.scale])
+
+    report = {
+        "meta": {
+            "db": path,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        **run_startup(path, args.repeat),
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
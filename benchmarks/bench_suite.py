@@ -0,0 +1,294 @@
+### Times every public helper of db_functions_users / _trips / _stats / _budget on a synthetic database ###
+# run from the repository root:
+#   python -m benchmarks.bench_suite --scale 100k --out benchmarks/results/run.json
+#   python -m benchmarks.bench_suite --scale 100k --compare benchmarks/results/run.json
+# Databases are generated once into benchmarks/data/<scale>.db and reused. Read helpers are
+# timed cold (query cache cleared) and warm (cache hit), write helpers go through the writer
+# thread. --compare exits with 1 when a helper got slower than --threshold times the baseline.
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import date
+
+import streamlit as st
+
+from db import db_connection
+from db.db_connection import connection
+from db.db_cache import cached_query, clear_cache
+from db.db_migrations import run_migrations
+from db import db_functions_users as users
+from db import db_functions_trips as trips
+from db import db_functions_stats as stats
+from db import db_functions_budget as budget
+from db import db_functions_occupancy as occupancy
+from benchmarks.generate_data import SCALES, generate
+
+DATA_DIR = os.path.join("benchmarks", "data")
+REPEAT = 5
+THRESHOLD = 1.25
+#differences below this are noise, whatever the ratio
+MIN_DELTA_MS = 0.5
+#calendar year of the generated trips, for the occupancy cases
+YEAR = (date(2024, 1, 1), date(2024, 12, 31))
+
+
+### Ids and names the helpers are called with, picked from the generated data ###
+def pick_sample(conn) -> dict:
+    top_manager = conn.execute("""
+        SELECT ancestor_ID FROM user_closure WHERE depth > 0
+        GROUP BY ancestor_ID ORDER BY COUNT(*) DESC LIMIT 1
+    """).fetchone()[0]
+    manager = conn.execute("""
+        SELECT manager_ID FROM users WHERE role = 'User' AND manager_ID IS NOT NULL
+        GROUP BY manager_ID ORDER BY COUNT(*) DESC LIMIT 1
+    """).fetchone()[0]
+    user, username = conn.execute("""
+        SELECT u.user_ID, u.username FROM user_trips ut JOIN users u ON u.user_ID = ut.user_ID
+        GROUP BY ut.user_ID ORDER BY COUNT(*) DESC LIMIT 1
+    """).fetchone()
+    trip_IDs = [r[0] for r in conn.execute("SELECT trip_ID FROM trips ORDER BY start_day, trip_ID LIMIT 100")]
+    team = [r[0] for r in conn.execute("SELECT user_ID FROM users WHERE manager_ID = ? LIMIT 5", (manager,))]
+    return {
+        "top_manager": top_manager,
+        "manager": manager,
+        "manager_name": conn.execute("SELECT username FROM users WHERE user_ID = ?", (manager,)).fetchone()[0],
+        "user": user,
+        "username": username,
+        "trip_IDs": trip_IDs,
+        "team": team,
+    }
+
+
+### (name, function) pairs of the read helpers, called with realistic arguments ###
+def read_cases(s: dict) -> list:
+    def as_manager(fn):
+        def call():
+            st.session_state["user_ID"] = s["manager"]
+            st.session_state["role_sortkey"] = 2
+            st.session_state["username"] = s["manager_name"]
+            return fn()
+        return call
+
+    #what trip_list_view loads for its first page
+    def trip_list_first_page():
+        trips.load_user_directory(s["manager"])
+        return trips.load_trip_page(None, 25)
+
+    def as_admin(fn):
+        def call():
+            st.session_state["user_ID"] = 1
+            st.session_state["role_sortkey"] = 3
+            return fn()
+        return call
+
+    return [
+        ("users.get_user_ID", lambda: users.get_user_ID(s["username"])),
+        ("users.get_manager_ID", lambda: users.get_manager_ID(s["username"])),
+        ("users.get_user_by_credentials", lambda: users.get_user_by_credentials(s["username"], "x")),
+        ("users.get_role_sortkey", lambda: users.get_role_sortkey("Manager")),
+        ("users.list_roles_editable", as_manager(users.list_roles_editable)),
+        ("users.get_users_for_current_manager", as_manager(users.get_users_for_current_manager)),
+        ("users.get_subtree[top_manager]", lambda: users.get_subtree(s["top_manager"])),
+        ("users.count_subtree[top_manager]", lambda: users.count_subtree(s["top_manager"])),
+        ("users.is_under", lambda: users.is_under(s["user"], s["top_manager"])),
+        ("users.load_manageable_users[manager]", lambda: users.load_manageable_users(2, s["manager"])),
+        ("users.load_manageable_users[admin]", lambda: users.load_manageable_users(3)),
+        ("users.get_users_under_me[admin]", as_admin(users.get_users_under_me)),
+        ("trips.load_assignable_users", lambda: trips.load_assignable_users(s["manager"])),
+        ("trips.get_user_trips", lambda: trips.get_user_trips(s["user"])),
+        ("trips.get_user_trips[range]", lambda: trips.get_user_trips(s["user"], "2024-06-01", "2024-08-31")),
+        ("trips.user_has_trips", lambda: trips.user_has_trips(s["user"])),
+        ("trips.load_user_directory", lambda: trips.load_user_directory(s["manager"])),
+        ("trips.load_participants[page]", lambda: trips.load_participants(s["trip_IDs"][:25])),
+        ("trips.load_trip_page[first]", lambda: trips.load_trip_page(None, 25)),
+        ("trips.load_trip_page[range]", lambda: trips.load_trip_page(None, 25, "2024-06-01", "2024-06-30")),
+        ("trips.trip_list_view[first_page]", trip_list_first_page),
+        ("stats.get_user_stats", lambda: stats.get_user_stats(s["user"])),
+        ("stats.get_manager_stats", lambda: stats.get_manager_stats(s["manager"])),
+        ("budget.trip_budget", lambda: budget.trip_budget(s["trip_IDs"][0])),
+        ("budget.load_expenses", lambda: budget.load_expenses(s["trip_IDs"][0])),
+        ("budget.load_org_budget[top_manager]", lambda: budget.load_org_budget(s["top_manager"])),
+        ("budget.load_org_budget[admin]", lambda: budget.load_org_budget()),
+        ("budget.load_trip_budgets", lambda: budget.load_trip_budgets(s["manager"])),
+        ("trips.load_trip_page[status]", lambda: trips.load_trip_page(None, 25, status="approved")),
+        ("occupancy.daily_headcount[year]", lambda: occupancy.daily_headcount(*YEAR)),
+        ("occupancy.daily_headcount[top_manager]", lambda: occupancy.daily_headcount(*YEAR, manager_ID=s["top_manager"])),
+        ("occupancy.busy_days[top_manager]", lambda: occupancy.busy_days(*YEAR, manager_ID=s["top_manager"])),
+        ("occupancy.daily_headcount[user]", lambda: occupancy.daily_headcount(*YEAR, [s["user"]])),
+    ]
+
+
+### (name, function) pairs of the write helpers; each call leaves the data as it found it ###
+# except book_expense, the ledger is append-only and grows by one entry per call
+def write_cases(s: dict) -> list:
+    counter = iter(range(10 ** 9))
+    trip_ID = s["trip_IDs"][0]
+    current = [r[0] for r in cached_query(
+        "SELECT user_ID FROM user_trips WHERE trip_ID = ?", (trip_ID,), tables=("user_trips",)
+    )]
+
+    def add_and_delete_user():
+        st.session_state["user_ID"] = s["manager"]
+        name = f"bench{next(counter)}"
+        users.add_user(name, "x", None, "User")
+        users.del_user(name)
+
+    def add_and_delete_trip():
+        trips.add_trip("Bench", "2024-03-01", "2024-03-03", "", s["team"], s["manager"])
+        trip = cached_query("SELECT MAX(trip_ID) FROM trips", tables=("trips",))[0][0]
+        trips.del_trip(trip)
+
+    def book_expense():
+        budget.book_expense(trip_ID, 100, s["team"][0] if s["team"] else None, booked_by=s["manager"])
+
+    def toggle_participants():
+        trips.set_trip_participants(trip_ID, s["team"])
+        trips.set_trip_participants(trip_ID, current)
+
+    return [
+        ("users.add_user+delete", add_and_delete_user),
+        ("trips.add_trip+del_trip", add_and_delete_trip),
+        ("trips.set_trip_participants x2", toggle_participants),
+        ("budget.book_expense", book_expense),
+    ]
+
+
+def _summary(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "median": round(statistics.median(ordered), 3),
+        "min": round(ordered[0], 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+    }
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - started) * 1000, result
+
+
+#loaders returning (rows, extras...) count their first element
+def _row_count(result):
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        result = result[0]
+    return len(result) if hasattr(result, "__len__") else None
+
+
+def measure_read(fn, repeat: int) -> dict:
+    cold, warm, statements = [], [], []
+    for i in range(repeat):
+        clear_cache()
+        #holding the thread's pooled connection makes the helpers run on it, so the trace sees them
+        with connection() as conn:
+            if i == 0:
+                conn.set_trace_callback(statements.append)
+            try:
+                elapsed, result = _timed(fn)
+            finally:
+                conn.set_trace_callback(None)
+            cold.append(elapsed)
+            warm.append(_timed(fn)[0])
+    return {
+        "cold_ms": _summary(cold),
+        "warm_ms": _summary(warm),
+        "queries": len(statements),
+        "rows": _row_count(result),
+    }
+
+
+def measure_write(fn, repeat: int) -> dict:
+    return {"ms": _summary([_timed(fn)[0] for _ in range(repeat)])}
+
+
+def run_suite(path: str, repeat: int) -> dict:
+    original = db_connection.DB_USERS
+    db_connection.configure(path=path)
+    clear_cache()
+    try:
+        run_migrations()
+        with connection() as conn:
+            sample = pick_sample(conn)
+            counts = {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("users", "trips", "user_trips")
+            }
+        results = {name: measure_read(fn, repeat) for name, fn in read_cases(sample)}
+        results.update({name: measure_write(fn, repeat) for name, fn in write_cases(sample)})
+    finally:
+        db_connection.configure(path=original)
+        clear_cache()
+    return {"counts": counts, "sample": {k: v for k, v in sample.items() if k != "trip_IDs"}, "results": results}
+
+
+### Helpers whose median got slower than threshold x baseline, as (name, old_ms, new_ms) ###
+def compare(baseline: dict, current: dict, threshold: float = THRESHOLD) -> list:
+    slower = []
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        key = "cold_ms" if "cold_ms" in result else "ms"
+        old_ms, new_ms = old[key]["median"], result[key]["median"]
+        if new_ms > old_ms * threshold and new_ms - old_ms > MIN_DELTA_MS:
+            slower.append((name, old_ms, new_ms))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the db_functions helpers")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+    parser.add_argument("--db", help="benchmark this database instead of a generated one")
+    parser.add_argument("--regenerate", action="store_true")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--out", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="baseline JSON of an earlier run")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    generated = None
+    path = args.db
+    if path is None:
+        path = os.path.join(DATA_DIR, f"{args.scale}.db")
+        if args.regenerate or not os.path.exists(path):
+            os.makedirs(DATA_DIR, exist_ok=True)
+            generated = generate(path, **SCALES[args.scale])
+
+    report = {
+        "meta": {
+            "scale": None if args.db else args.scale,
+            "db": path,
+            "repeat": args.repeat,
+            "profile": db_connection.current_profile(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "generated": generated,
+        },
+        **run_suite(path, args.repeat),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(json.load(f), report, args.threshold)
+        for name, old_ms, new_ms in slower:
+            print(f"REGRESSION {name}: {old_ms} ms -> {new_ms} ms", file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+### Statements per render of the manager dashboard's trip overview, for a growing number of trips ###
+# run from the repository root:  python -m benchmarks.bench_trip_list_view
+# Renders pages/manager_overview.py with AppTest, the way a browser session does, and reads
+# the statement count of each rerun from db_instrumentation.recent_reruns():
+#   render     cold first render (query cache cleared) with PAGE_SIZES trip panels
+#   load_more  the rerun after clicking "Load more", which loads one more page
+#   rerun      a plain rerun with both pages open
+# Every panel of a page shares the page's queries, so the counts must not grow with the
+# number of trips; the run fails when they do.
+import json
+import os
+import sys
+import tempfile
+import time
+
+from streamlit.testing.v1 import AppTest
+
+from db import db_connection
+from db.db_connection import transaction
+from db.db_cache import bump_version, clear_cache
+from db.db_instrumentation import recent_reruns
+from db.db_migrations import run_migrations, day_number
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGE = os.path.join(ROOT, "pages", "manager_overview.py")
+TRIP_COUNTS = (10, 100, 300, 1000, 3000)
+PAGE_SIZES = (25, 100)
+USERS_PER_MANAGER = 50
+PARTICIPANTS_PER_TRIP = 5
+TIMEOUT = 120
+
+
+def seed(trip_count: int):
+    with transaction() as conn:
+        conn.execute("DELETE FROM trips")
+        conn.execute("DELETE FROM users")
+        conn.execute("INSERT INTO users (user_ID, username, password, role, manager_ID) VALUES (1, 'manager', 'x', 'Manager', 1)")
+        conn.executemany(
+            "INSERT INTO users (user_ID, username, password, email, role, manager_ID) VALUES (?, ?, 'x', ?, 'User', 1)",
+            [(2 + i, f"user{i}", f"user{i}@example.com") for i in range(USERS_PER_MANAGER)]
+        )
+        conn.executemany(
+            "INSERT INTO trips (trip_ID, destination, start_day, end_day, occasion, manager_ID, budget_cents) VALUES (?, ?, ?, ?, ?, 1, 100000)",
+            [(t, f"City {t % 40}", day_number(f"2024-{t % 12 + 1:02d}-01"), day_number(f"2024-{t % 12 + 1:02d}-05"), "Meeting")
+             for t in range(1, trip_count + 1)]
+        )
+        conn.executemany(
+            "INSERT INTO user_trips (trip_ID, user_ID) VALUES (?, ?)",
+            [(t, 2 + (t + k) % USERS_PER_MANAGER) for t in range(1, trip_count + 1) for k in range(PARTICIPANTS_PER_TRIP)]
+        )
+        conn.executemany(
+            "INSERT INTO trip_expenses (trip_ID, user_ID, amount_cents, booked_by) VALUES (?, ?, 2500, 1)",
+            [(t, 2 + t % USERS_PER_MANAGER) for t in range(1, trip_count + 1, 3)]
+        )
+    bump_version("users", "trips", "user_trips", "trip_expenses")
+
+
+#statements and time of the rerun `run` performs
+def _rerun(run) -> tuple:
+    started = time.perf_counter()
+    at = run()
+    elapsed = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError("; ".join(e.message for e in at.exception))
+    rerun = next(r for r in recent_reruns() if r["page"] == "manager_overview")
+    return at, {"queries": rerun["queries"], "rows": rerun["rows"], "db_ms": rerun["db_ms"], "ms": round(elapsed * 1000, 2)}
+
+
+def measure(trip_count: int, page_size: int) -> dict:
+    at = AppTest.from_file(PAGE, default_timeout=TIMEOUT)
+    at.session_state["username"] = "manager"
+    at.session_state["role"] = "Manager"
+    at.session_state["user_ID"] = 1
+    at.session_state["role_sortkey"] = 2
+    at.run()
+    [size] = [s for s in at.selectbox if s.label == "Trips per page"]
+    size.set_value(page_size)
+
+    #cold: the query cache, and with it the overview's cached pages, start empty
+    clear_cache()
+    at, render = _rerun(at.run)
+    panels = sum(" — " in e.label for e in at.expander)
+    result = {"trips": trip_count, "page_size": page_size, "panels": panels, "render": render}
+    more = [b for b in at.button if b.label == "Load more"]
+    if more:
+        at, result["load_more"] = _rerun(more[0].click().run)
+        at, result["rerun"] = _rerun(at.run)
+    return result
+
+
+### Trip counts whose statements per rerun differ from the smallest run, per page size and rerun ###
+def growth(results) -> list:
+    problems = []
+    for page_size in PAGE_SIZES:
+        runs = [r for r in results if r["page_size"] == page_size]
+        for step in ("render", "load_more", "rerun"):
+            counts = {r["trips"]: r[step]["queries"] for r in runs if step in r}
+            if len(set(counts.values())) > 1:
+                problems.append(f"page size {page_size}, {step}: queries per trip count {counts}")
+    return problems
+
+
+def main():
+    original = db_connection.DB_USERS
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.configure(path=os.path.join(tmp, "bench.db"))
+        run_migrations()
+        results = []
+        for trip_count in TRIP_COUNTS:
+            seed(trip_count)
+            results += [measure(trip_count, page_size) for page_size in PAGE_SIZES]
+        db_connection.configure(path=original)
+    print(json.dumps(results, indent=2))
+    problems = growth(results)
+    if problems:
+        sys.exit("statement count grows with the trips:\n" + "\n".join(problems))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+### Write throughput of 50+ concurrent managers: inline transactions vs. the writer queue ###
+# run from the repository root:  python -m benchmarks.bench_writer [managers] [edits per manager]
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from db import db_connection
+from db.db_connection import transaction
+from db.db_migrations import run_migrations, day_number
+from db.db_writer import write_sql, writer_stats
+
+TRIPS = 500
+
+
+def seed():
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO trips (destination, start_day, end_day, occasion) VALUES (?, ?, ?, '')",
+            [(f"City {t}", day_number("2024-05-01"), day_number("2024-05-03")) for t in range(TRIPS)]
+        )
+
+
+def inline_edit(n):
+    with transaction() as conn:
+        conn.execute("UPDATE trips SET occasion = ? WHERE trip_ID = ?", (f"edit {n}", n % TRIPS + 1))
+
+
+def queued_edit(n):
+    write_sql("UPDATE trips SET occasion = ? WHERE trip_ID = ?", (f"edit {n}", n % TRIPS + 1), tables=("trips",))
+
+
+def run(mode: str, edit, profile: str, managers: int, edits: int) -> dict:
+    errors = []
+
+    def manager(i):
+        for k in range(edits):
+            try:
+                edit(i * edits + k)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.configure(path=os.path.join(tmp, "bench.db"), size=managers + 1, profile=profile)
+        run_migrations()
+        seed()
+        threads = [threading.Thread(target=manager, args=(i,)) for i in range(managers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        db_connection.configure(path=os.path.join(tmp, "closed.db"))
+
+    return {
+        "mode": mode,
+        "profile": profile,
+        "managers": managers,
+        "writes_per_s": round((managers * edits - len(errors)) / elapsed, 1),
+        "lock_errors": len(errors),
+    }
+
+
+def main():
+    managers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    edits = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    original = db_connection.DB_USERS
+    results = []
+    for profile in ("wal", "durable"):
+        results.append(run("inline", inline_edit, profile, managers, edits))
+        results.append(run("queue", queued_edit, profile, managers, edits))
+    db_connection.configure(path=original)
+    print(json.dumps({"results": results, "writer": writer_stats()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
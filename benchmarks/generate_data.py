@@ -0,0 +1,136 @@
+### Synthetic users.db at a configurable scale, for the benchmark suite and manual testing ###
+# run from the repository root:  python -m benchmarks.generate_data PATH [--scale 100k] [--users N] ...
+# Builds a manager hierarchy (self-rooted top managers with middle managers below them),
+# users spread over the managers, and trips planned by the managers with participants
+# taken from their own users, spread over two years, with budgets and expense entries.
+import argparse
+import json
+import os
+import random
+import time
+from datetime import date, timedelta
+
+from db import db_connection
+from db.db_connection import transaction
+from db import db_migrations
+from db.db_migrations import run_migrations, TRIP_STATUSES
+
+SCALES = {
+    "1k": {"users": 1_000, "managers": 20, "trips": 2_000},
+    "100k": {"users": 100_000, "managers": 2_000, "trips": 200_000},
+    "1M": {"users": 1_000_000, "managers": 20_000, "trips": 1_000_000},
+}
+PARTICIPANTS_PER_TRIP = 4
+#share of participants with an expense booked on their trip
+EXPENSE_SHARE = 0.5
+TOP_MANAGER_SHARE = 10
+CHUNK = 10_000
+FIRST_DAY = date(2024, 1, 1)
+
+
+def _chunks(rows):
+    for i in range(0, len(rows), CHUNK):
+        yield rows[i:i + CHUNK]
+
+
+def generate(path: str, users: int, managers: int, trips: int,
+             participants_per_trip: int = PARTICIPANTS_PER_TRIP, seed: int = 1) -> dict:
+    for leftover in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    #the file is new, even if this process migrated one at the same path before
+    db_migrations._migrated.discard(path)
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    original = db_connection.DB_USERS
+    db_connection.configure(path=path)
+    try:
+        run_migrations()
+        #ids 1-3 are the demo users of the seed migration, Admin is the root above everyone
+        first_ID = 4
+        manager_IDs = list(range(first_ID, first_ID + managers))
+        top = manager_IDs[:max(1, managers // TOP_MANAGER_SHARE)]
+        manager_rows = [(m, f"manager{m}", f"manager{m}@example.com", "Manager", m) for m in top]
+        manager_rows += [
+            (m, f"manager{m}", f"manager{m}@example.com", "Manager", rng.choice(top))
+            for m in manager_IDs[len(top):]
+        ]
+
+        user_IDs = range(first_ID + managers, first_ID + managers + users)
+        team = {m: [] for m in manager_IDs}
+        user_rows = []
+        for u in user_IDs:
+            m = rng.choice(manager_IDs)
+            team[m].append(u)
+            user_rows.append((u, f"user{u}", f"user{u}@example.com", "User", m))
+
+        trip_rows, link_rows, expense_rows = [], [], []
+        for t in range(1, trips + 1):
+            m = rng.choice(manager_IDs)
+            start = FIRST_DAY + timedelta(days=rng.randrange(730))
+            end = start + timedelta(days=rng.randrange(7))
+            trip_rows.append((
+                t, f"City {rng.randrange(500)}", start.toordinal(), end.toordinal(), "Meeting", m,
+                rng.choice(TRIP_STATUSES), rng.randrange(50, 500) * 1000
+            ))
+            if team[m]:
+                k = min(len(team[m]), rng.randint(1, participants_per_trip))
+                participants = rng.sample(team[m], k)
+                link_rows += [(t, u) for u in participants]
+                expense_rows += [(t, u, rng.randrange(1000, 100000), m) for u in participants if rng.random() < EXPENSE_SHARE]
+
+        #managers first, the closure triggers need the manager's row to exist already
+        with transaction() as conn:
+            for chunk in _chunks(manager_rows + user_rows):
+                conn.executemany(
+                    "INSERT INTO users (user_ID, username, password, email, role, manager_ID) VALUES (?, ?, 'x', ?, ?, ?)",
+                    chunk
+                )
+            for chunk in _chunks(trip_rows):
+                conn.executemany(
+                    "INSERT INTO trips (trip_ID, destination, start_day, end_day, occasion, manager_ID, status, budget_cents) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    chunk
+                )
+            for chunk in _chunks(link_rows):
+                conn.executemany("INSERT INTO user_trips (trip_ID, user_ID) VALUES (?, ?)", chunk)
+            for chunk in _chunks(expense_rows):
+                conn.executemany(
+                    "INSERT INTO trip_expenses (trip_ID, user_ID, amount_cents, category, booked_by) VALUES (?, ?, ?, 'travel', ?)",
+                    chunk
+                )
+    finally:
+        db_connection.configure(path=original)
+
+    return {
+        "path": path,
+        "users": users,
+        "managers": managers,
+        "trips": trips,
+        "links": len(link_rows),
+        "expenses": len(expense_rows),
+        "seed": seed,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic users.db")
+    parser.add_argument("path")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--managers", type=int)
+    parser.add_argument("--trips", type=int)
+    parser.add_argument("--participants", type=int, default=PARTICIPANTS_PER_TRIP)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    sizes = dict(SCALES[args.scale])
+    for key in sizes:
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+    print(json.dumps(generate(args.path, participants_per_trip=args.participants, seed=args.seed, **sizes), indent=2))
+
+
+if __name__ == "__main__":
+    main()
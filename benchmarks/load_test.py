@@ -0,0 +1,299 @@
+### Many concurrent sessions against the Streamlit pages, driven headlessly with AppTest ###
+# run from the repository root:
+#   python -m benchmarks.load_test --scale 1k --sessions 200 --concurrency 50
+#   python -m benchmarks.load_test --scale 100k --sessions 500 --concurrency 100 --out benchmarks/results/load.json
+# Each session replays one realistic flow (employee, manager or admin, see FLOWS) against a
+# scratch copy of the generated database. AppTest swaps process-wide Streamlit state on every
+# run, so sessions cannot share a process: --concurrency worker processes each run their
+# sessions one after another, with their own connection pool, query cache and writer thread,
+# like that many `streamlit run` replicas on one database file.
+# Reports p50/p95/p99 rerun latency, errors and lock errors per page plus the throughput.
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from streamlit.testing.v1 import AppTest
+
+from db import db_connection
+from db.db_cache import clear_cache
+from db.db_connection import connection
+from db.db_writer import writer_stats
+from db.db_migrations import run_migrations
+from db.db_functions_trips import load_user_directory
+from benchmarks.generate_data import SCALES, FIRST_DAY, generate
+from benchmarks.bench_suite import DATA_DIR
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+#share of the sessions per flow
+FLOWS = {"employee": 0.6, "manager": 0.3, "admin": 0.1}
+TIMEOUT = 60
+#writer_stats() counters summed over all sessions
+WRITE_COUNTERS = ("submitted", "committed", "failed", "rejected")
+LOCK_MARKERS = ("database is locked", "database table is locked", "Write queue is full")
+
+
+### Rerun latencies and errors per page ###
+class Recorder:
+    def __init__(self):
+        self.pages = {}
+
+    def _page(self, page: str) -> dict:
+        return self.pages.setdefault(page, {"ms": [], "errors": 0, "lock_errors": 0, "messages": {}})
+
+    def record(self, page: str, ms: float, error: str | None = None):
+        stats = self._page(page)
+        stats["ms"].append(ms)
+        if error is not None:
+            stats["errors"] += 1
+            stats["lock_errors"] += any(marker in error for marker in LOCK_MARKERS)
+            key = error.splitlines()[0][:200]
+            stats["messages"][key] = stats["messages"].get(key, 0) + 1
+
+    #adds the pages recorded by a worker process
+    def merge(self, pages: dict):
+        for page, other in pages.items():
+            stats = self._page(page)
+            stats["ms"] += other["ms"]
+            stats["errors"] += other["errors"]
+            stats["lock_errors"] += other["lock_errors"]
+            for key, count in other["messages"].items():
+                stats["messages"][key] = stats["messages"].get(key, 0) + count
+
+
+### Runs one rerun of `at` (after `action` set its widgets) and records it under `page` ###
+def _rerun(recorder: Recorder, page: str, at: AppTest, action=None) -> AppTest:
+    started = time.perf_counter()
+    error = None
+    try:
+        at = action(at) if action else at.run()
+        if at.exception:
+            error = "; ".join(e.message for e in at.exception)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    recorder.record(page, (time.perf_counter() - started) * 1000, error)
+    return at
+
+
+def _login(recorder: Recorder, username: str, password: str, page: str) -> AppTest:
+    at = _rerun(recorder, "main", AppTest.from_file(MAIN, default_timeout=TIMEOUT))
+
+    def submit(at):
+        at.text_input[0].input(username)
+        at.text_input[1].input(password)
+        return at.button[0].click().run()
+
+    at = _rerun(recorder, "main", at, submit)
+    return _rerun(recorder, page, at, lambda at: at.switch_page(f"pages/{page}.py").run())
+
+
+def employee_flow(recorder: Recorder, rng: random.Random, accounts: dict):
+    at = _login(recorder, rng.choice(accounts["users"]), "x", "user_overview")
+    if at.date_input:
+        first = rng.randrange(0, 700)
+        window = (_day(first), _day(first + rng.randrange(1, 60)))
+        _rerun(recorder, "user_overview", at, lambda at: at.date_input[0].set_value(window).run())
+    _rerun(recorder, "user_overview", at)
+
+
+def manager_flow(recorder: Recorder, rng: random.Random, accounts: dict):
+    username, manager_ID = rng.choice(accounts["managers"])
+    at = _login(recorder, username, "x", "manager_overview")
+
+    #edit the participants of the first trip panel, choosing from the manager's own users
+    team = [user_ID for user_ID, _ in load_user_directory(manager_ID)]
+    if team and any(m.label == "Select participants" for m in at.multiselect):
+        def update(at):
+            select = [m for m in at.multiselect if m.label == "Select participants"][0]
+            select.set_value(rng.sample(team, rng.randint(1, min(4, len(team)))))
+            return [b for b in at.button if b.label == "Update participants"][0].click().run()
+        _rerun(recorder, "manager_overview", at, update)
+
+    #register a user
+    def register(at):
+        name = f"load{os.getpid()}_{rng.randrange(10 ** 9)}"
+        inputs = {t.label: t for t in at.text_input if t.form_id == "register_user_form"}
+        inputs["Username"].input(name)
+        inputs["E-mail"].input(f"{name}@example.com")
+        inputs["Password"].input("x")
+        inputs["Confirm password"].input("x")
+        return [b for b in at.button if b.form_id == "register_user_form"][0].click().run()
+    _rerun(recorder, "manager_overview", at, register)
+
+
+def admin_flow(recorder: Recorder, rng: random.Random, accounts: dict):
+    at = _login(recorder, "Admin", "123", "admin_overview")
+    if any(t.label == "Search users" for t in at.text_input):
+        def search(at):
+            [t for t in at.text_input if t.label == "Search users"][0].input(f"user{rng.randrange(100)}")
+            return at.run()
+        _rerun(recorder, "admin_overview", at, search)
+
+
+FLOW_FUNCTIONS = {"employee": employee_flow, "manager": manager_flow, "admin": admin_flow}
+
+
+def _day(offset: int) -> date:
+    return FIRST_DAY + timedelta(days=offset)
+
+
+### Generated accounts to log in with (password "x", see generate_data) ###
+def load_accounts(limit: int = 500) -> dict:
+    with connection() as conn:
+        users = [r[0] for r in conn.execute(
+            "SELECT u.username FROM users u WHERE u.role = 'User' AND u.password = 'x' "
+            "AND EXISTS (SELECT 1 FROM user_trips ut WHERE ut.user_ID = u.user_ID) LIMIT ?", (limit,)
+        )]
+        managers = [tuple(r) for r in conn.execute(
+            "SELECT m.username, m.user_ID FROM users m WHERE m.role = 'Manager' AND m.password = 'x' "
+            "AND EXISTS (SELECT 1 FROM users u WHERE u.manager_ID = m.user_ID AND u.user_ID != m.user_ID) LIMIT ?",
+            (limit,)
+        )]
+    if not users or not managers:
+        raise SystemExit("the database has no generated users/managers to log in with")
+    return {"users": users, "managers": managers}
+
+
+def _percentile(ordered: list, p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def summarize(recorder: Recorder, seconds: float) -> dict:
+    pages = {}
+    total = 0
+    for page, stats in sorted(recorder.pages.items()):
+        ordered = sorted(stats["ms"])
+        total += len(ordered)
+        pages[page] = {
+            "reruns": len(ordered),
+            "p50_ms": round(_percentile(ordered, 0.50), 1),
+            "p95_ms": round(_percentile(ordered, 0.95), 1),
+            "p99_ms": round(_percentile(ordered, 0.99), 1),
+            "max_ms": round(ordered[-1], 1),
+            "errors": stats["errors"],
+            "lock_errors": stats["lock_errors"],
+            "error_messages": stats["messages"],
+        }
+    return {
+        "seconds": round(seconds, 2),
+        "reruns": total,
+        "reruns_per_s": round(total / seconds, 1) if seconds else None,
+        "pages": pages,
+    }
+
+
+#worker process state, set up once by _init_worker
+_accounts = None
+
+
+def _init_worker(path: str, accounts: dict):
+    global _accounts
+    db_connection.configure(path=path)
+    _accounts = accounts
+
+
+### One session in a worker: the recorded pages plus the writes it committed or lost ###
+def _session(item) -> dict:
+    name, session_seed = item
+    recorder = Recorder()
+    before = writer_stats()
+    FLOW_FUNCTIONS[name](recorder, random.Random(session_seed), _accounts)
+    after = writer_stats()
+    return {
+        "pages": recorder.pages,
+        "writes": {k: after[k] - before[k] for k in WRITE_COUNTERS},
+    }
+
+
+def run_load(path: str, sessions: int, concurrency: int, seed: int = 1) -> dict:
+    original = db_connection.DB_USERS
+    db_connection.configure(path=path)
+    clear_cache()
+    try:
+        run_migrations()
+        accounts = load_accounts()
+    finally:
+        db_connection.configure(path=original)
+        clear_cache()
+
+    rng = random.Random(seed)
+    names, weights = zip(*FLOWS.items())
+    plan = [(rng.choices(names, weights)[0], rng.randrange(10 ** 9)) for _ in range(sessions)]
+    flows = {name: 0 for name in names}
+    for name, _ in plan:
+        flows[name] += 1
+
+    recorder = Recorder()
+    writes = {k: 0 for k in WRITE_COUNTERS}
+    #spawn, not fork: the parent may already run the writer thread
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(concurrency, mp_context=context, initializer=_init_worker,
+                             initargs=(path, accounts)) as pool:
+        #start every worker (imports, Streamlit) before the clock runs
+        list(pool.map(time.sleep, [0.2] * concurrency))
+        started = time.perf_counter()
+        for result in pool.map(_session, plan):
+            recorder.merge(result["pages"])
+            for k in WRITE_COUNTERS:
+                writes[k] += result["writes"][k]
+        seconds = time.perf_counter() - started
+
+    report = summarize(recorder, seconds)
+    report["flows"] = flows
+    report["writes"] = writes
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit pages with concurrent AppTest sessions")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+    parser.add_argument("--db", help="copy this database instead of the generated one")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    source = args.db or os.path.join(DATA_DIR, f"{args.scale}.db")
+    if args.db is None and not os.path.exists(source):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        generate(source, **SCALES[args.scale])
+    #sessions register users and edit trips, so every run starts from a fresh copy
+    path = os.path.join(DATA_DIR, "load.db")
+    for leftover in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    with sqlite3.connect(source) as src, sqlite3.connect(path) as dst:
+        src.backup(dst)
+
+    report = {
+        "meta": {
+            "source": source,
+            "sessions": args.sessions,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "profile": db_connection.current_profile(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        **run_load(path, args.sessions, args.concurrency, args.seed),
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    #through the module, so the workers unpickle benchmarks.load_test._session (AppTest
+    #replaces __main__ with the app script)
+    from benchmarks.load_test import main
+    main()
@@ -0,0 +1,83 @@
+import os
+import threading
+from collections import OrderedDict
+
+from db.db_connection import connection
+
+CACHE_SIZE = int(os.environ.get("TEAMVERSION_DB_CACHE_SIZE", "512"))
+
+### Read-through cache for the db helpers ###
+# Entries are keyed by (sql, params, versions of the tables the query reads). Every write
+# path bumps the version of the tables it touched, so later lookups build a new key and
+# the stale entries simply age out of the LRU. Versions live in this process only; writes
+# made by another process are not seen until the cache is cleared.
+_lock = threading.Lock()
+_entries = OrderedDict()
+_versions = {}
+_generation = [0]
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+### Called by every write helper after its transaction committed ###
+def bump_version(*tables: str):
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+        _stats["invalidations"] += 1
+
+
+def _versions_of(tables) -> tuple:
+    return tuple(_versions.get(table, 0) for table in tables)
+
+
+### Current versions of `tables`, for helpers that cache derived structures themselves ###
+# Includes a generation counter, so clear_cache() invalidates those structures as well.
+def table_versions(*tables: str) -> tuple:
+    with _lock:
+        return (_generation[0], *_versions_of(tables))
+
+
+### Returns the rows of `sql`, from the cache while none of `tables` changed ###
+def cached_query(sql: str, params=(), tables=()) -> list:
+    params = tuple(params)
+    with _lock:
+        key = (sql, params, _versions_of(tables))
+        rows = _entries.get(key)
+        if rows is not None:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return list(rows)
+        _stats["misses"] += 1
+
+    with connection() as conn:
+        rows = tuple(conn.execute(sql, params).fetchall())
+
+    with _lock:
+        _entries[key] = rows
+        _entries.move_to_end(key)
+        while len(_entries) > CACHE_SIZE:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+    return list(rows)
+
+
+### Rows as a list of {column: value} dicts, for st.dataframe and JSON without pandas ###
+def as_records(rows, columns) -> list:
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def clear_cache():
+    with _lock:
+        _entries.clear()
+        _generation[0] += 1
+
+
+def cache_stats() -> dict:
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "size": len(_entries),
+            "max_size": CACHE_SIZE,
+            **_stats,
+            "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,223 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from db.db_instrumentation import connection_factory
+
+DB_USERS = os.environ.get("TEAMVERSION_DB", "db/users.db")
+POOL_SIZE = int(os.environ.get("TEAMVERSION_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("TEAMVERSION_DB_POOL_TIMEOUT", "10"))
+
+### Storage profiles, applied once to every connection when the pool opens it ###
+# "wal" lets dashboard reads run while a manager is saving, "durable" is WAL with a
+# full fsync on every commit, "rollback" is sqlite's default journal for comparison.
+# Pick one per deployment with TEAMVERSION_DB_PROFILE.
+PROFILES = {
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,
+        "mmap_size": 128 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,
+        "mmap_size": 128 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,
+    },
+    "rollback": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+}
+DB_PROFILE = os.environ.get("TEAMVERSION_DB_PROFILE", "wal")
+
+### Passive WAL checkpoint after this many committed transactions (0 turns it off) ###
+CHECKPOINT_EVERY = int(os.environ.get("TEAMVERSION_DB_CHECKPOINT_EVERY", "500"))
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    pass
+
+
+### A connection set up like the pooled ones, for callers that keep their own (the writer thread) ###
+def open_connection(path: str | None = None, profile: str | None = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(path or DB_USERS, check_same_thread=False, factory=connection_factory())
+    conn.execute("PRAGMA foreign_keys = ON")
+    for pragma, value in PROFILES[profile or DB_PROFILE].items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
+
+
+### Small pool of sqlite connections shared by the Streamlit script threads ###
+# Streamlit starts a fresh script thread for every rerun, so a connection is bound to
+# a thread only while it is checked out. Nested connection() calls in the same thread
+# get the connection that thread already holds; on release it goes back to the idle list
+# for the next rerun instead of being closed.
+class ConnectionPool:
+    def __init__(self, path: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT, profile: str = DB_PROFILE):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown database profile '{profile}', expected one of {sorted(PROFILES)}")
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.profile = profile
+        self._commits = 0
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._stats = {"hits": 0, "misses": 0, "waits": 0, "reentrant": 0, "checkpoints": 0}
+
+    def _create(self) -> sqlite3.Connection:
+        return open_connection(self.path, self.profile)
+
+    def _checkpoint(self, conn: sqlite3.Connection):
+        if not CHECKPOINT_EVERY or PROFILES[self.profile]["journal_mode"] != "WAL":
+            return
+        with self._cond:
+            self._commits += 1
+            due = self._commits % CHECKPOINT_EVERY == 0
+            if due:
+                self._stats["checkpoints"] += 1
+        if due:
+            #PASSIVE never blocks readers or writers, it copies what it can
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def _acquire(self) -> sqlite3.Connection:
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    self._stats["hits"] += 1
+                    return self._idle.pop()
+                if self._open < self.size:
+                    self._open += 1
+                    self._stats["misses"] += 1
+                    break
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No database connection free after {self.timeout}s")
+                self._cond.wait(remaining)
+
+        try:
+            return self._create()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        local = self._local
+        held = getattr(local, "conn", None)
+        if held is not None:
+            with self._cond:
+                self._stats["reentrant"] += 1
+            yield held
+            return
+
+        conn = self._acquire()
+        local.conn = conn
+        local.tx_depth = 0
+        try:
+            yield conn
+        finally:
+            local.conn = None
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            local = self._local
+            if local.tx_depth:
+                # joined an outer transaction, which commits or rolls back for us
+                local.tx_depth += 1
+                try:
+                    yield conn
+                finally:
+                    local.tx_depth -= 1
+                return
+
+            local.tx_depth = 1
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                local.tx_depth = 0
+            self._checkpoint(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "profile": self.profile,
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                **self._stats,
+            }
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._open -= 1
+
+
+_pool = ConnectionPool(DB_USERS)
+_pool_lock = threading.Lock()
+
+
+### Context-managed access for the db_functions_* helpers ###
+def connection():
+    return _pool.connection()
+
+
+### Commits on success, rolls back on any exception ###
+def transaction():
+    return _pool.transaction()
+
+
+def pool_stats() -> dict:
+    return _pool.stats()
+
+
+def current_profile() -> str:
+    return _pool.profile
+
+
+### Point the pool at another database file or storage profile (benchmarks, scripts) ###
+def configure(path: str | None = None, size: int | None = None, profile: str | None = None):
+    global _pool, DB_USERS
+    with _pool_lock:
+        _pool.close()
+        DB_USERS = path or DB_USERS
+        _pool = ConnectionPool(DB_USERS, size or _pool.size, profile=profile or _pool.profile)
@@ -0,0 +1,198 @@
+import streamlit as st
+from decimal import Decimal, InvalidOperation
+from db.db_cache import cached_query, as_records
+from db.db_writer import write_sql
+from db.db_migrations import TRIP_STATUSES
+
+EXPENSE_CATEGORIES = ("travel", "lodging", "meals", "fees", "other")
+#ledger entries shown per trip panel, newest first
+LEDGER_ROWS = 20
+
+### Amount as typed by a user ("12.50", "12,5", 12) -> integer cents, None when empty ###
+def to_cents(amount) -> int | None:
+    if amount is None or str(amount).strip() == "":
+        return None
+    try:
+        return int((Decimal(str(amount).strip().replace(",", ".")) * 100).to_integral_value())
+    except InvalidOperation:
+        raise ValueError(f"'{amount}' is not an amount")
+
+def format_amount(cents) -> str:
+    if cents is None:
+        return "–"
+    return f"{cents / 100:,.2f}"
+
+### Status and budget of a trip in one statement, one write and one version bump ###
+def set_trip_budget(trip_ID: int, status: str, budget_cents: int | None):
+    if status not in TRIP_STATUSES:
+        raise ValueError(f"unknown status '{status}'")
+    write_sql("UPDATE trips SET status = ?, budget_cents = ? WHERE trip_ID = ?", (status, budget_cents, trip_ID), tables=("trips",))
+
+### Appends one entry to the trip's ledger; corrections are negative amounts ###
+def book_expense(trip_ID: int, amount_cents: int, user_ID: int | None = None,
+                 category: str = "other", note: str = "", booked_by: int | None = None):
+    return write_sql(
+        "INSERT INTO trip_expenses (trip_ID, user_ID, amount_cents, category, note, booked_by) VALUES (?, ?, ?, ?, ?, ?)",
+        (trip_ID, user_ID, amount_cents, category, note or None, booked_by),
+        tables=("trip_expenses",)
+    )
+
+### trip_ID -> (status, budget_cents, spent_cents, entries) for a page of trips, from the rollup ###
+def trip_budgets(trip_IDs) -> dict:
+    trip_IDs = list(trip_IDs)
+    if not trip_IDs:
+        return {}
+    rows = cached_query(f"""
+        SELECT t.trip_ID, t.status, t.budget_cents, COALESCE(x.spent_cents, 0), COALESCE(x.entries, 0)
+        FROM trips t
+        LEFT JOIN trip_expense_totals x ON x.trip_ID = t.trip_ID
+        WHERE t.trip_ID IN ({', '.join('?' * len(trip_IDs))})
+    """, trip_IDs, tables=("trips", "trip_expenses"))
+    return {trip_ID: tuple(budget) for trip_ID, *budget in rows}
+
+### (status, budget_cents, spent_cents, entries) of one trip ###
+def trip_budget(trip_ID: int):
+    return trip_budgets([trip_ID]).get(trip_ID)
+
+### trip_ID -> (status, budget_cents) for a page of trips ###
+def load_trip_statuses(trip_IDs) -> dict:
+    trip_IDs = list(trip_IDs)
+    if not trip_IDs:
+        return {}
+    rows = cached_query(
+        f"SELECT trip_ID, status, budget_cents FROM trips WHERE trip_ID IN ({', '.join('?' * len(trip_IDs))})",
+        trip_IDs, tables=("trips",)
+    )
+    return {trip_ID: (status, budget_cents) for trip_ID, status, budget_cents in rows}
+
+### The latest ledger entries of a trip, newest first ###
+def load_expenses(trip_ID: int, limit: int = LEDGER_ROWS):
+    return cached_query("""
+        SELECT e.expense_ID, e.booked_at, COALESCE(u.username, '–'), e.category, e.amount_cents, e.note
+        FROM trip_expenses e
+        LEFT JOIN users u ON u.user_ID = e.user_ID
+        WHERE e.trip_ID = ?
+        ORDER BY e.expense_ID DESC
+        LIMIT ?
+    """, (trip_ID, limit), tables=("trip_expenses", "users"))
+
+### Budget and spending per planning manager, for one subtree or for everyone ###
+# Reads one rollup row per manager, the ledger is not touched.
+def load_org_budget(manager_ID: int | None = None):
+    if manager_ID is None:
+        return cached_query("""
+            SELECT s.manager_ID, u.username, s.trips, s.budget_cents, s.spent_cents
+            FROM trip_stats_manager s
+            JOIN users u ON u.user_ID = s.manager_ID
+            ORDER BY s.spent_cents DESC
+        """, tables=("trips", "trip_expenses", "users"))
+    return cached_query("""
+        SELECT s.manager_ID, u.username, s.trips, s.budget_cents, s.spent_cents
+        FROM user_closure c
+        JOIN trip_stats_manager s ON s.manager_ID = c.descendant_ID
+        JOIN users u ON u.user_ID = s.manager_ID
+        WHERE c.ancestor_ID = ?
+        ORDER BY s.spent_cents DESC
+    """, (manager_ID,), tables=("trips", "trip_expenses", "users"))
+
+### A manager's trips with budget and spending, newest first ###
+def load_trip_budgets(manager_ID: int, limit: int = 50):
+    return cached_query("""
+        SELECT t.trip_ID, t.destination, t.start_date, t.status, t.budget_cents, COALESCE(x.spent_cents, 0)
+        FROM trips t
+        LEFT JOIN trip_expense_totals x ON x.trip_ID = t.trip_ID
+        WHERE t.manager_ID = ?
+        ORDER BY t.start_day DESC, t.trip_ID DESC
+        LIMIT ?
+    """, (manager_ID, limit), tables=("trips", "trip_expenses"))
+
+### Status, budget and expense ledger inside a trip panel ###
+# `participants` are the panel's (user_ID, username, ...) rows; `on_saved(message)` reruns the panel.
+# `budget` is the trip's entry of trip_budgets, loaded for the whole page; looked up when missing.
+# The ledger is only read once its toggle is switched on.
+def trip_budget_section(trip_ID: int, participants, on_saved, key: str = "trip", budget=None):
+    if budget is None:
+        budget = trip_budget(trip_ID)
+    if budget is None:
+        return
+    status, budget_cents, spent_cents, entries = budget
+
+    st.markdown("**Budget:**")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Budget", format_amount(budget_cents))
+    col2.metric("Spent", format_amount(spent_cents))
+    col3.metric("Remaining", format_amount(None if budget_cents is None else budget_cents - spent_cents))
+
+    with st.form(f"{key}_budget_{trip_ID}"):
+        new_status = st.selectbox("Status", TRIP_STATUSES, index=TRIP_STATUSES.index(status))
+        new_budget = st.text_input("Budget", value="" if budget_cents is None else f"{budget_cents / 100:.2f}")
+        if st.form_submit_button("Save budget"):
+            try:
+                new_budget_cents = to_cents(new_budget)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                if (new_status, new_budget_cents) != (status, budget_cents):
+                    set_trip_budget(trip_ID, new_status, new_budget_cents)
+                on_saved("Budget updated!")
+
+    if entries and st.toggle(f"Show ledger ({entries} entries)", key=f"{key}_ledger_{trip_ID}"):
+        st.dataframe(
+            as_records(
+                [(e[1], e[2], e[3], format_amount(e[4]), e[5]) for e in load_expenses(trip_ID)],
+                ["booked_at", "user", "category", "amount", "note"]
+            ),
+            hide_index=True, use_container_width=True
+        )
+        if entries > LEDGER_ROWS:
+            st.caption(f"Latest {LEDGER_ROWS} of {entries} entries.")
+
+    with st.form(f"{key}_expense_{trip_ID}", clear_on_submit=True):
+        st.write("Book expense (negative amounts correct earlier entries)")
+        users = {p[0]: p[1] for p in participants}
+        user_ID = st.selectbox("Participant", [None, *users], format_func=lambda uid: "–" if uid is None else users[uid])
+        category = st.selectbox("Category", EXPENSE_CATEGORIES)
+        amount = st.text_input("Amount")
+        note = st.text_input("Note")
+        if st.form_submit_button("Book"):
+            try:
+                amount_cents = to_cents(amount)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                if not amount_cents:
+                    st.error("Amount must not be empty or zero.")
+                else:
+                    book_expense(trip_ID, amount_cents, user_ID, category, note, st.session_state.get("user_ID"))
+                    on_saved("Expense booked!")
+
+### Budget report: spending per manager in the subtree (or of everyone), and per trip ###
+def budget_report_dropdown(title: str = "Budget report", manager_ID: int | None = None):
+    with st.expander(title, expanded=False):
+        rows = load_org_budget(manager_ID)
+        if not rows:
+            st.info("No budgets or expenses yet.")
+        else:
+            total_budget = sum(r[3] for r in rows)
+            total_spent = sum(r[4] for r in rows)
+            col1, col2 = st.columns(2)
+            col1.metric("Budget", format_amount(total_budget))
+            col2.metric("Spent", format_amount(total_spent))
+            st.dataframe(
+                as_records(
+                    [(r[1], r[2], format_amount(r[3]), format_amount(r[4]), format_amount(r[3] - r[4])) for r in rows],
+                    ["manager", "trips", "budget", "spent", "remaining"]
+                ),
+                hide_index=True, use_container_width=True
+            )
+        if manager_ID is not None:
+            trips = load_trip_budgets(manager_ID)
+            if trips:
+                st.markdown("**Own trips:**")
+                st.dataframe(
+                    as_records(
+                        [(t[0], t[1], t[2], t[3], format_amount(t[4]), format_amount(t[5])) for t in trips],
+                        ["trip_ID", "destination", "start_date", "status", "budget", "spent"]
+                    ),
+                    hide_index=True, use_container_width=True
+                )
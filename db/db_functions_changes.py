@@ -0,0 +1,103 @@
+import json
+import streamlit as st
+from db.db_connection import connection
+from db.db_cache import as_records
+
+### Tables whose changes are logged (migration 11) ###
+CHANGE_LOG_TABLES = ("users", "trips", "user_trips", "trip_expenses")
+#entries per changes_since() call
+CHANGES_PAGE_SIZE = 1000
+
+def _entry(row) -> dict:
+    seq, table_name, row_ID, op, data, old_data, changed_at = row
+    return {
+        "seq": seq,
+        "table": table_name,
+        "row_ID": row_ID,
+        "op": op,
+        "data": json.loads(data) if data is not None else None,
+        "old_data": json.loads(old_data) if old_data is not None else None,
+        "changed_at": changed_at,
+    }
+
+### Highest seq written so far, 0 for an empty log ###
+# A new consumer reads the tables once, then follows changes_since(latest_seq()) from there.
+def latest_seq() -> int:
+    with connection() as conn:
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+
+### Log entries with a seq above `seq`, oldest first, at most `limit` of them ###
+# Pass the seq of the last entry back in to get the next batch; an empty list means
+# the consumer is up to date. Read straight from the log (not the query cache), so
+# changes written by other processes show up as well.
+def changes_since(seq: int, limit: int = CHANGES_PAGE_SIZE, table_names=None) -> list:
+    params = [seq]
+    condition = ""
+    if table_names:
+        table_names = list(table_names)
+        condition = f"AND table_name IN ({', '.join('?' * len(table_names))})"
+        params += table_names
+    with connection() as conn:
+        rows = conn.execute(f"""
+            SELECT seq, table_name, row_ID, op, data, old_data, changed_at
+            FROM change_log
+            WHERE seq > ?
+            {condition}
+            ORDER BY seq
+            LIMIT ?
+        """, (*params, limit)).fetchall()
+    return [_entry(r) for r in rows]
+
+### Audit trail of one row, oldest first ###
+def row_history(table_name: str, row_ID: int) -> list:
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT seq, table_name, row_ID, op, data, old_data, changed_at
+            FROM change_log
+            WHERE table_name = ? AND row_ID = ?
+            ORDER BY seq
+        """, (table_name, row_ID)).fetchall()
+    return [_entry(r) for r in rows]
+
+def _recent_changes(limit: int, table_name=None):
+    with connection() as conn:
+        if table_name is None:
+            rows = conn.execute("""
+                SELECT seq, table_name, row_ID, op, data, old_data, changed_at
+                FROM change_log ORDER BY seq DESC LIMIT ?
+            """, (limit,)).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT seq, table_name, row_ID, op, data, old_data, changed_at
+                FROM change_log WHERE table_name = ? ORDER BY seq DESC LIMIT ?
+            """, (table_name, limit)).fetchall()
+    return [_entry(r) for r in rows]
+
+### Latest changes, or the history of a single row, on the admin dashboard ###
+def change_log_dropdown(title: str = "Change log", limit: int = 50):
+    with st.expander(title, expanded=False):
+        col1, col2 = st.columns(2)
+        table_name = col1.selectbox("Table", [None, *CHANGE_LOG_TABLES], format_func=lambda t: "all" if t is None else t)
+        row_ID = col2.text_input("Row ID", placeholder="optional, needs a table")
+
+        if table_name is not None and row_ID.strip():
+            if not row_ID.strip().isdigit():
+                st.error("Row ID has to be an integer.")
+                return
+            entries = row_history(table_name, int(row_ID))
+        else:
+            entries = _recent_changes(limit, table_name)
+
+        if not entries:
+            st.info("No changes logged yet.")
+            return
+        st.caption(f"Latest seq: {latest_seq()}")
+        st.dataframe(
+            as_records(
+                [(e["seq"], e["changed_at"], e["table"], e["row_ID"], e["op"],
+                  json.dumps(e["data"]) if e["data"] else "", json.dumps(e["old_data"]) if e["old_data"] else "")
+                 for e in entries],
+                ["seq", "changed_at", "table", "row_ID", "op", "data", "old_data"]
+            ),
+            hide_index=True, use_container_width=True
+        )
@@ -0,0 +1,131 @@
+import threading
+import streamlit as st
+from db.db_connection import connection
+from db.db_cache import cached_query, table_versions, as_records
+from db.db_migrations import day_number, iso_date
+
+### Trips of the given users overlapping [start_date, end_date] ###
+# Returns {user_ID: [(trip_ID, destination, start_date, end_date), ...]} for users with a
+# conflict only. exclude_trip skips the trip that is being edited.
+# One query. Each user's links are read from ix_user_trips_days (user_ID, end_day, start_day),
+# migration 13: a range seek to end_day >= start_date, start_day <= end_date checked inside
+# the index. Per user that is O(log n) plus the user's trips ending on or after start_date;
+# trips that ended before the window are never read.
+def find_conflicts(user_ids, start_date, end_date, exclude_trip=None) -> dict:
+    user_ids = sorted({int(user_ID) for user_ID in user_ids})
+    if not user_ids:
+        return {}
+    rows = cached_query(f"""
+        SELECT ut.user_ID, t.trip_ID, t.destination, t.start_date, t.end_date
+        FROM user_trips ut
+        JOIN trips t ON t.trip_ID = ut.trip_ID
+        WHERE ut.user_ID IN ({', '.join('?' * len(user_ids))})
+        AND ut.end_day >= ?
+        AND ut.start_day <= ?
+        AND ut.trip_ID IS NOT ?
+        ORDER BY ut.user_ID, ut.start_day, ut.trip_ID
+    """, [*user_ids, day_number(start_date), day_number(end_date or start_date), exclude_trip],
+        tables=("trips", "user_trips"))
+    conflicts = {}
+    for user_ID, *trip in rows:
+        conflicts.setdefault(user_ID, []).append(tuple(trip))
+    return conflicts
+
+### find_conflicts for the participants of many trips at once, e.g. a page of trip panels ###
+# Returns {trip_ID: {user_ID: [(trip_ID, destination, start_date, end_date), ...]}}, trips
+# without a double-booked participant are left out. One query for all trips: every
+# participant's other trips come from the same ix_user_trips_days range as above.
+def find_trip_conflicts(trip_IDs) -> dict:
+    trip_IDs = sorted({int(trip_ID) for trip_ID in trip_IDs})
+    if not trip_IDs:
+        return {}
+    rows = cached_query(f"""
+        SELECT p.trip_ID, o.user_ID, t.trip_ID, t.destination, t.start_date, t.end_date
+        FROM user_trips p
+        JOIN user_trips o ON o.user_ID = p.user_ID
+            AND o.end_day >= p.start_day
+            AND o.start_day <= p.end_day
+            AND o.trip_ID != p.trip_ID
+        JOIN trips t ON t.trip_ID = o.trip_ID
+        WHERE p.trip_ID IN ({', '.join('?' * len(trip_IDs))})
+        ORDER BY p.trip_ID, o.user_ID, o.start_day, o.trip_ID
+    """, trip_IDs, tables=("trips", "user_trips"))
+    conflicts = {}
+    for trip_ID, user_ID, *other in rows:
+        conflicts.setdefault(trip_ID, {}).setdefault(user_ID, []).append(tuple(other))
+    return conflicts
+
+### Every pair of overlapping trips per user, for everyone or for the subtree below one manager ###
+# One sweep per user over the start-sorted trips, keeping the trips still running.
+# Returns [(username, trip_ID, destination, other_trip_ID, other_destination, overlap_from, overlap_to), ...].
+def find_all_conflicts(manager_ID=None) -> list:
+    scope, params = "", ()
+    if manager_ID is not None:
+        scope = "AND ut.user_ID IN (SELECT descendant_ID FROM user_closure WHERE ancestor_ID = ? AND depth > 0)"
+        params = (manager_ID,)
+    with connection() as conn:
+        rows = conn.execute(f"""
+            SELECT ut.user_ID, u.username, t.trip_ID, t.destination, t.start_day, t.end_day
+            FROM user_trips ut
+            JOIN trips t ON t.trip_ID = ut.trip_ID
+            JOIN users u ON u.user_ID = ut.user_ID
+            WHERE t.start_day IS NOT NULL {scope}
+            ORDER BY ut.user_ID, t.start_day, t.trip_ID
+        """, params).fetchall()
+
+    report = []
+    current, running = None, []
+    for user_ID, username, trip_ID, destination, start, end in rows:
+        if user_ID != current:
+            current, running = user_ID, []
+        running = [r for r in running if r[3] >= start]
+        for other_ID, other_destination, _, other_end in running:
+            report.append((username, other_ID, other_destination, trip_ID, destination,
+                           iso_date(start), iso_date(min(end, other_end))))
+        running.append((trip_ID, destination, start, end))
+    return report
+
+_lock = threading.Lock()
+_reports = {}
+
+### find_all_conflicts, computed again only after trips, participants or users changed ###
+def load_conflict_report(manager_ID=None) -> list:
+    versions = table_versions("trips", "user_trips", "users")
+    with _lock:
+        cached = _reports.get(manager_ID)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+    report = find_all_conflicts(manager_ID)
+    with _lock:
+        _reports[manager_ID] = (versions, report)
+    return report
+
+### Warning listing the overlapping trips of the selected users ###
+def show_conflicts(conflicts: dict, usernames: dict):
+    lines = [
+        f"- **{usernames.get(user_ID, user_ID)}** is already on "
+        + ", ".join(f"{trip_ID} — {destination} ({start} → {end})" for trip_ID, destination, start, end in found)
+        for user_ID, found in conflicts.items()
+    ]
+    st.warning("Double bookings:\n" + "\n".join(lines))
+
+### Org-wide (admin) or per-manager (their whole subtree) report of all double bookings ###
+# The report reads every trip of everyone in scope, so it is built only once asked for.
+def conflict_report_dropdown(title: str = "Double bookings", manager_ID=None):
+    with st.expander(title, expanded=False):
+        key = f"conflict_report_{manager_ID}"
+        if st.button("Check for double bookings", key=f"{key}_button"):
+            st.session_state[key] = True
+        if not st.session_state.get(key):
+            return
+        report = load_conflict_report(manager_ID)
+        if not report:
+            st.info("No double bookings.")
+            return
+        st.dataframe(
+            as_records(
+                report,
+                ["username", "trip_ID", "destination", "other_trip_ID", "other_destination", "overlap_from", "overlap_to"],
+            ),
+            hide_index=True, use_container_width=True
+        )
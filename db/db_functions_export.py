@@ -0,0 +1,127 @@
+import csv
+import io
+from datetime import date, datetime, timedelta, timezone
+import streamlit as st
+from db.db_connection import open_connection
+
+CSV_COLUMNS = ["trip_ID", "destination", "start_date", "end_date", "occasion", "participants"]
+
+### Trips of a manager (planned by them or with one of their users) or of a single user ###
+def _trip_query(manager_ID=None, user_ID=None):
+    select = """
+        SELECT t.trip_ID, t.destination, t.start_date, t.end_date, t.occasion,
+               (SELECT group_concat(u.username, ';')
+                  FROM user_trips ut JOIN users u ON u.user_ID = ut.user_ID
+                 WHERE ut.trip_ID = t.trip_ID) AS participants
+        FROM trips t
+    """
+    if user_ID is not None:
+        return select + """
+        WHERE t.trip_ID IN (SELECT trip_ID FROM user_trips WHERE user_ID = ?)
+        ORDER BY t.start_day, t.trip_ID
+        """, (user_ID,)
+    if manager_ID is not None:
+        return select + """
+        WHERE t.manager_ID = ?
+        OR t.trip_ID IN (
+            SELECT ut.trip_ID FROM user_trips ut JOIN users u ON u.user_ID = ut.user_ID
+            WHERE u.manager_ID = ?
+        )
+        ORDER BY t.start_day, t.trip_ID
+        """, (manager_ID, manager_ID)
+    return select + " ORDER BY t.start_day, t.trip_ID", ()
+
+### Yields the trips one at a time straight from the cursor ###
+# The generator owns a dedicated connection instead of a pooled one: pooled connections
+# are bound to the thread that checked them out, while a suspended generator may be
+# resumed, abandoned or closed from any thread. It is closed once the rows run out or
+# the generator is closed or garbage collected.
+def iter_trips(manager_ID=None, user_ID=None):
+    sql, params = _trip_query(manager_ID, user_ID)
+    conn = open_connection()
+    try:
+        yield from conn.execute(sql, params)
+    finally:
+        conn.close()
+
+### Streams the trips as CSV text, one line per yield ###
+# Rows are never held all at once, so writing the chunks to a file or an HTTP response
+# keeps memory flat however many trips there are.
+def export_trips_csv(manager_ID=None, user_ID=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for row in iter_trips(manager_ID, user_ID):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _ics_text(value) -> str:
+    text = str(value or "")
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+### Long content lines are folded at 75 octets (RFC 5545 3.1) ###
+def _ics_line(line: str) -> str:
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts, current = [], b""
+    for char in line:
+        encoded = char.encode("utf-8")
+        if len(current) + len(encoded) > (75 if not parts else 74):
+            parts.append(current.decode("utf-8"))
+            current = b""
+        current += encoded
+    parts.append(current.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+### Streams the trips as an iCalendar file, one all-day event per trip ###
+def export_trips_ics(manager_ID=None, user_ID=None):
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Teamversion//Trips//EN\r\nCALSCALE:GREGORIAN\r\n"
+    for trip_ID, destination, start_date, end_date, occasion, participants in iter_trips(manager_ID, user_ID):
+        try:
+            start = date.fromisoformat(str(start_date))
+            end = date.fromisoformat(str(end_date or start_date))
+        except ValueError:
+            continue
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:trip-{trip_ID}@teamversion",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;VALUE=DATE:{start:%Y%m%d}",
+            #DTEND of all-day events is exclusive
+            f"DTEND;VALUE=DATE:{end + timedelta(days=1):%Y%m%d}",
+            f"SUMMARY:{_ics_text(destination)}",
+            f"DESCRIPTION:{_ics_text(occasion)}",
+        ]
+        if participants:
+            lines.append(f"COMMENT:Participants: {_ics_text(participants.replace(';', ', '))}")
+        lines.append("END:VEVENT")
+        yield "".join(_ics_line(line) for line in lines)
+    yield "END:VCALENDAR\r\n"
+
+### Joins a streamed export into the UTF-8 bytes a deferred download_button has to return ###
+# download_button only takes str/bytes/file objects, and the MediaFileManager keeps the
+# file in memory to serve it, so the browser download is built in one piece on click;
+# only the rows are streamed from the database.
+def _to_bytes(chunks) -> bytes:
+    return b"".join(chunk.encode("utf-8") for chunk in chunks)
+
+### Download buttons for the trips of the logged in manager or user, generated only when clicked ###
+def export_trips_dropdown(title: str = "Export trips", manager_ID=None, user_ID=None):
+    with st.expander(title, expanded=False):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                "Download CSV", lambda: _to_bytes(export_trips_csv(manager_ID, user_ID)),
+                "trips.csv", "text/csv", key="export_trips_csv"
+            )
+        with col2:
+            st.download_button(
+                "Download iCalendar", lambda: _to_bytes(export_trips_ics(manager_ID, user_ID)),
+                "trips.ics", "text/calendar", key="export_trips_ics"
+            )
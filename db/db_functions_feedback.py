@@ -0,0 +1,10 @@
+import streamlit as st
+
+### Messages that survive st.rerun() and st.switch_page(), shown as toasts by the next run ###
+def flash(message: str, icon: str = "✅"):
+    st.session_state.setdefault("flash_messages", []).append((message, icon))
+
+### Shows and clears the pending messages; every page and fragment calls this first ###
+def show_flashes():
+    for message, icon in st.session_state.pop("flash_messages", []):
+        st.toast(message, icon=icon)
@@ -0,0 +1,219 @@
+import csv
+import io
+from datetime import date
+import streamlit as st
+from db.db_cache import cached_query, as_records
+from db.db_writer import write
+from db.db_functions_users import get_subtree
+
+### Rows per executemany transaction ###
+IMPORT_CHUNK = 1000
+
+### CSV text of `rows` with a header line, e.g. for an error report download ###
+def _to_csv(rows, columns) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return out.getvalue()
+
+### Streams CSV rows (dicts) from an upload, a path or an open text file ###
+def _csv_rows(source):
+    if isinstance(source, str):
+        with open(source, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+        return
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    if not isinstance(source, io.TextIOBase):
+        #st.file_uploader hands us a binary buffer
+        source = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    yield from csv.DictReader(source)
+
+### Inserts one chunk, skipping usernames that exist already; runs on the writer thread ###
+def _insert_user_chunk(conn, chunk, errors):
+    names = [row[0] for _, row in chunk]
+    existing = {
+        r[0] for r in conn.execute(
+            f"SELECT username FROM users WHERE username IN ({', '.join('?' * len(names))})", names
+        )
+    }
+    rows = []
+    for line, row in chunk:
+        if row[0] in existing:
+            errors.append((line, row[0], "username exists already"))
+        else:
+            rows.append(row)
+    conn.executemany(
+        "INSERT INTO users (username, password, email, role, manager_ID) VALUES (?, ?, ?, ?, ?)", rows
+    )
+    return len(rows)
+
+### Bulk import of users from a CSV with the columns username, password, email, role[, manager_ID] ###
+# Roles must rank below `importer_sortkey`, like in the register forms. manager_ID defaults to
+# `default_manager_ID`; a manager_ID column is only honoured with allow_manager_column (admins).
+# Returns {"rows", "imported", "errors": [(line, username, message), ...]}.
+def import_users_csv(source, importer_sortkey: int, default_manager_ID=None,
+                     allow_manager_column: bool = False, chunk_size: int = IMPORT_CHUNK) -> dict:
+    allowed_roles = {
+        role for role, _ in cached_query(
+            "SELECT role, sortkey FROM roles WHERE sortkey < ?", (importer_sortkey,), tables=("roles",)
+        )
+    }
+    report = {"rows": 0, "imported": 0, "errors": []}
+    errors = report["errors"]
+    seen = set()
+    chunk = []
+
+    def flush():
+        if chunk:
+            report["imported"] += write(lambda conn: _insert_user_chunk(conn, chunk, errors), tables=("users",))
+            chunk.clear()
+
+    #line 1 is the header
+    for line, record in enumerate(_csv_rows(source), start=2):
+        report["rows"] += 1
+        username = (record.get("username") or "").strip()
+        password = record.get("password") or ""
+        email = (record.get("email") or "").strip() or None
+        role = (record.get("role") or "").strip()
+
+        if not username or not password:
+            errors.append((line, username, "username and password are required"))
+            continue
+        if role not in allowed_roles:
+            errors.append((line, username, f"role '{role}' is not allowed"))
+            continue
+        if username in seen:
+            errors.append((line, username, "duplicate username in file"))
+            continue
+
+        manager_ID = default_manager_ID
+        if allow_manager_column and (record.get("manager_ID") or "").strip():
+            try:
+                manager_ID = int(record["manager_ID"])
+            except ValueError:
+                errors.append((line, username, "manager_ID has to be an integer"))
+                continue
+
+        seen.add(username)
+        chunk.append((line, (username, password, email, role, manager_ID)))
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+
+    errors.sort()
+    return report
+
+### Dropdown to upload a CSV of users (manager and admin page) ###
+def import_users_dropdown(title: str = "Import users from CSV", allow_manager_column: bool = False):
+    if "role_sortkey" not in st.session_state:
+        st.warning("You're not authorized to add new users")
+        return
+
+    with st.expander(title, expanded=False):
+        columns = "username, password, email, role" + (", manager_ID" if allow_manager_column else "")
+        st.caption(f"CSV with a header row and the columns: {columns}")
+        with st.form("import_users_form", clear_on_submit=True):
+            upload = st.file_uploader("CSV file", type=["csv"])
+            submitted = st.form_submit_button("Import")
+
+        if submitted:
+            if upload is None:
+                st.warning("Please choose a CSV file.")
+                return
+            report = import_users_csv(
+                upload,
+                st.session_state["role_sortkey"],
+                default_manager_ID=st.session_state.get("user_ID"),
+                allow_manager_column=allow_manager_column,
+            )
+            st.success(f"Imported {report['imported']} of {report['rows']} users.")
+            if report["errors"]:
+                columns = ["line", "username", "error"]
+                st.error(f"{len(report['errors'])} rows were skipped:")
+                st.dataframe(as_records(report["errors"], columns), hide_index=True, use_container_width=True)
+                st.download_button("Download error report", _to_csv(report["errors"], columns), "import_errors.csv", "text/csv")
+
+### Inserts one chunk of trips and their participants; runs on the writer thread ###
+def _insert_trip_chunk(conn, chunk):
+    links = []
+    for destination, start_day, end_day, occasion, manager_ID, user_ids in chunk:
+        trip_ID = conn.execute(
+            "INSERT INTO trips (destination, start_day, end_day, occasion, manager_ID) VALUES (?, ?, ?, ?, ?)",
+            (destination, start_day, end_day, occasion, manager_ID)
+        ).lastrowid
+        links += [(trip_ID, user_ID) for user_ID in user_ids]
+    conn.executemany("INSERT OR IGNORE INTO user_trips (trip_ID, user_ID) VALUES (?, ?)", links)
+    return len(chunk)
+
+### Bulk import of trips from a CSV with the columns destination, start_date, end_date, occasion, participants ###
+# participants holds usernames separated by ';'. They are resolved against everyone below the
+# manager at any depth (their subtree in user_closure, all users when manager_ID is None),
+# loaded with a single query up front.
+# Returns {"rows", "imported", "errors": [(line, destination, message), ...]}.
+def import_trips_csv(source, manager_ID=None, chunk_size: int = IMPORT_CHUNK) -> dict:
+    if manager_ID is None:
+        user_IDs = dict(cached_query("SELECT username, user_ID FROM users", tables=("users",)))
+    else:
+        user_IDs = {username: user_ID for user_ID, username, *_ in get_subtree(manager_ID)}
+
+    report = {"rows": 0, "imported": 0, "errors": []}
+    errors = report["errors"]
+    chunk = []
+
+    def flush():
+        if chunk:
+            report["imported"] += write(lambda conn: _insert_trip_chunk(conn, chunk), tables=("trips", "user_trips"))
+            chunk.clear()
+
+    for line, record in enumerate(_csv_rows(source), start=2):
+        report["rows"] += 1
+        destination = (record.get("destination") or "").strip()
+        occasion = (record.get("occasion") or "").strip()
+
+        if not destination:
+            errors.append((line, destination, "destination is required"))
+            continue
+        try:
+            start_date = date.fromisoformat((record.get("start_date") or "").strip())
+            end_date = date.fromisoformat((record.get("end_date") or "").strip())
+        except ValueError:
+            errors.append((line, destination, "dates have to be YYYY-MM-DD"))
+            continue
+        if end_date < start_date:
+            errors.append((line, destination, "end_date is before start_date"))
+            continue
+
+        usernames = [u.strip() for u in (record.get("participants") or "").split(";") if u.strip()]
+        unknown = [u for u in usernames if u not in user_IDs]
+        if unknown:
+            errors.append((line, destination, f"unknown participants: {', '.join(unknown)}"))
+            continue
+
+        chunk.append((destination, start_date.toordinal(), end_date.toordinal(), occasion, manager_ID,
+                      [user_IDs[u] for u in usernames]))
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+
+    return report
+
+### Dropdown to upload a CSV of trips (manager page) ###
+def import_trips_dropdown(title: str = "Import trips from CSV"):
+    with st.expander(title, expanded=False):
+        st.caption("CSV with a header row and the columns: destination, start_date, end_date, occasion, "
+                   "participants (usernames separated by ';')")
+        with st.form("import_trips_form", clear_on_submit=True):
+            upload = st.file_uploader("CSV file", type=["csv"])
+            submitted = st.form_submit_button("Import")
+
+        if submitted:
+            if upload is None:
+                st.warning("Please choose a CSV file.")
+                return
+            report = import_trips_csv(upload, manager_ID=st.session_state["user_ID"])
+            st.success(f"Imported {report['imported']} of {report['rows']} trips.")
+            if report["errors"]:
+                st.error(f"{len(report['errors'])} rows were skipped:")
+                st.dataframe(as_records(report["errors"], ["line", "destination", "error"]), hide_index=True, use_container_width=True)
@@ -0,0 +1,204 @@
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+import numpy as np
+import streamlit as st
+from db.db_connection import connection
+from db.db_cache import table_versions, as_records
+from db.db_functions_users import get_subtree
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+#loaded (window, scope) combinations kept in memory
+INTERVAL_CACHE_SIZE = 64
+
+### Travel intervals of all participants as NumPy arrays of day ordinals ###
+# One row per stretch of consecutive travel days of a user: the user's overlapping or
+# back-to-back trips are merged, so every day counts once per person however many trips
+# cover it. Rows are sorted by (user_ID, start), ends are inclusive.
+class Intervals:
+    def __init__(self, user_IDs, starts, ends):
+        self.user_IDs = user_IDs
+        self.starts = starts
+        self.ends = ends
+
+    @classmethod
+    def merged(cls, user_IDs, starts, ends):
+        if len(user_IDs) == 0:
+            return cls(user_IDs, starts, ends)
+        ends = np.maximum(ends, starts)
+        order = np.lexsort((starts, user_IDs))
+        user_IDs, starts, ends = user_IDs[order], starts[order], ends[order]
+
+        #shift every user into its own range of keys, then one running maximum over all rows
+        #gives each row the latest end of its user's earlier trips
+        span = int(ends.max()) + 2
+        _, group = np.unique(user_IDs, return_inverse=True)
+        offset = group.astype(np.int64) * span
+        running_end = np.maximum.accumulate(offset + ends)
+        #a row opens a new stretch unless it starts at most one day after that end
+        first = np.ones(len(starts), dtype=bool)
+        first[1:] = offset[1:] + starts[1:] > running_end[:-1] + 1
+        heads = np.flatnonzero(first)
+        tails = np.append(heads[1:] - 1, len(starts) - 1)
+        return cls(user_IDs[heads], starts[heads], running_end[tails] - offset[heads])
+
+    ### Rows overlapping [first, last], clipped to it ###
+    def window(self, first: int, last: int):
+        mask = (self.starts <= last) & (self.ends >= first)
+        return self.user_IDs[mask], np.maximum(self.starts[mask], first), np.minimum(self.ends[mask], last)
+
+    def __len__(self):
+        return len(self.user_IDs)
+
+_lock = threading.Lock()
+_intervals = OrderedDict()
+
+def _interval_rows(conn, first_day: int, last_day: int, user_IDs, manager_ID):
+    #trips store date.toordinal() day numbers, see db_migrations; a scope reads each of its
+    #users' links from ix_user_trips_days, which carries the days of their trips (migration 13)
+    sql = """
+        SELECT user_ID, start_day, end_day FROM user_trips
+        WHERE end_day >= ? AND start_day <= ?
+    """
+    if user_IDs is not None:
+        rows = []
+        for i in range(0, len(user_IDs), 500):
+            chunk = user_IDs[i:i + 500]
+            rows += conn.execute(
+                sql + f" AND user_ID IN ({', '.join('?' * len(chunk))})", (first_day, last_day, *chunk)
+            ).fetchall()
+        return rows
+    if manager_ID is not None:
+        return conn.execute(
+            sql + " AND user_ID IN (SELECT descendant_ID FROM user_closure WHERE ancestor_ID = ? AND depth > 0)",
+            (first_day, last_day, manager_ID)
+        ).fetchall()
+    #everyone: the window is found on the trips' (end_day, start_day) index
+    return conn.execute("""
+        SELECT ut.user_ID, t.start_day, t.end_day
+        FROM trips t JOIN user_trips ut ON ut.trip_ID = t.trip_ID
+        WHERE t.end_day >= ? AND t.start_day <= ?
+    """, (first_day, last_day)).fetchall()
+
+### Travel intervals touching [first_day, last_day] of the given users, of the subtree below manager_ID or of everyone ###
+# Only the trips in the window and in scope are read. Each (window, scope) is loaded again
+# only after trips, user_trips or, for a subtree, users changed.
+def load_intervals(first_day: int, last_day: int, user_IDs=None, manager_ID=None) -> Intervals:
+    if user_IDs is not None:
+        user_IDs = sorted({int(user_ID) for user_ID in user_IDs})
+        scope = ("users", tuple(user_IDs))
+    else:
+        scope = ("manager", manager_ID)
+    key = (first_day, last_day, scope)
+    versions = table_versions("trips", "user_trips", *(("users",) if manager_ID is not None else ()))
+    with _lock:
+        cached = _intervals.get(key)
+        if cached is not None and cached[0] == versions:
+            _intervals.move_to_end(key)
+            return cached[1]
+
+    with connection() as conn:
+        rows = _interval_rows(conn, first_day, last_day, user_IDs, manager_ID)
+    data = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    intervals = Intervals.merged(data[:, 0], data[:, 1], data[:, 2])
+
+    with _lock:
+        _intervals[key] = (versions, intervals)
+        _intervals.move_to_end(key)
+        while len(_intervals) > INTERVAL_CACHE_SIZE:
+            _intervals.popitem(last=False)
+    return intervals
+
+### People travelling on each day of [first, last]; of the given users, the subtree below manager_ID or everyone ###
+# Difference array over the window: +1 on the first day of every stretch, -1 after its
+# last day, the running sum is the headcount. Returns one int per day.
+def daily_headcount(first: date, last: date, user_IDs=None, manager_ID=None) -> np.ndarray:
+    first_day, last_day = first.toordinal(), last.toordinal()
+    days = last_day - first_day + 1
+    if days <= 0:
+        return np.zeros(0, dtype=np.int64)
+    _, starts, ends = load_intervals(first_day, last_day, user_IDs, manager_ID).window(first_day, last_day)
+    delta = np.bincount(starts - first_day, minlength=days + 1) - np.bincount(ends - first_day + 1, minlength=days + 1)
+    return np.cumsum(delta[:days])
+
+### Travel days per user within [first, last], as (user_IDs, days) arrays, busiest first ###
+def busy_days(first: date, last: date, user_IDs=None, manager_ID=None):
+    first_day, last_day = first.toordinal(), last.toordinal()
+    users, starts, ends = load_intervals(first_day, last_day, user_IDs, manager_ID).window(first_day, last_day)
+    if len(users) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    #rows are sorted by user, so every user's rows are one run
+    heads = np.flatnonzero(np.append(True, users[1:] != users[:-1]))
+    days = np.add.reduceat(ends - starts + 1, heads)
+    order = np.argsort(-days, kind="stable")
+    return users[heads][order], days[order]
+
+def _year(year: int):
+    return date(year, 1, 1), date(year, 12, 31)
+
+### Calendar heatmap, one cell per day: weeks left to right, Monday on top ###
+def _heatmap(first: date, counts: np.ndarray, label: str):
+    offset = first.weekday()
+    rows = [
+        (str(first + timedelta(days=i)), (offset + i) // 7, WEEKDAYS[(offset + i) % 7], int(c))
+        for i, c in enumerate(counts.tolist())
+    ]
+    st.vega_lite_chart(
+        as_records(rows, ["date", "week", "weekday", label]),
+        {
+            "mark": {"type": "rect", "tooltip": True},
+            "encoding": {
+                "x": {"field": "week", "type": "ordinal", "title": None, "axis": {"labels": False, "ticks": False}},
+                "y": {"field": "weekday", "type": "ordinal", "sort": WEEKDAYS, "title": None},
+                "color": {"field": label, "type": "quantitative", "scale": {"scheme": "blues"}},
+                "tooltip": [{"field": "date", "type": "nominal"}, {"field": label, "type": "quantitative"}],
+            },
+            "height": 140,
+        },
+        use_container_width=True
+    )
+
+def _year_select(key: str) -> int:
+    today = date.today()
+    return st.selectbox("Year", range(today.year + 1, today.year - 4, -1), index=1, key=key)
+
+#True once the calendar behind `key` was asked for in this session
+def _opened(key: str) -> bool:
+    if st.button("Show calendar", key=f"{key}_button"):
+        st.session_state[key] = True
+    return bool(st.session_state.get(key))
+
+### Team calendar on the manager page: people travelling per day, busiest members ###
+# Built only once asked for, from the trips of the manager's subtree in the selected year.
+def team_calendar_dropdown(manager_ID: int, title: str = "Team calendar"):
+    with st.expander(title, expanded=False):
+        if not _opened("team_calendar"):
+            return
+        team = {u[0]: u[1] for u in get_subtree(manager_ID)}
+        if not team:
+            st.info("Nobody reports to you yet.")
+            return
+        first, last = _year(_year_select("team_calendar_year"))
+        counts = daily_headcount(first, last, manager_ID=manager_ID)
+        col1, col2 = st.columns(2)
+        col1.metric("Busiest day", int(counts.max()) if len(counts) else 0)
+        col2.metric("Person-days away", int(counts.sum()))
+        _heatmap(first, counts, "people")
+
+        users, days = busy_days(first, last, manager_ID=manager_ID)
+        if len(users):
+            st.markdown("**Most travel days:**")
+            st.dataframe(
+                as_records([(team[int(u)], int(d)) for u, d in zip(users[:10], days[:10])], ["username", "days"]),
+                hide_index=True, use_container_width=True
+            )
+
+### Own travel days over a year on the user page ###
+def my_calendar_dropdown(user_ID: int, title: str = "My travel calendar"):
+    with st.expander(title, expanded=False):
+        if not _opened("my_calendar"):
+            return
+        first, last = _year(_year_select("my_calendar_year"))
+        counts = daily_headcount(first, last, [user_ID])
+        st.metric("Days away", int(counts.sum()))
+        _heatmap(first, counts, "travelling")
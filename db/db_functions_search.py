@@ -0,0 +1,129 @@
+import re
+import streamlit as st
+from db.db_cache import cached_query, as_records
+from db.db_functions_trips import load_participants, load_user_directory, trip_panel
+from db.db_functions_conflicts import find_trip_conflicts
+from db.db_functions_budget import trip_budgets
+
+### Results per page of the search boxes ###
+SEARCH_PAGE_SIZE = 10
+### Matches up to which results are ranked by bm25; broader searches list newest first ###
+# Scoring every match of a word found in most rows takes half a second at 200k trips,
+# while listing them in rowid order stays in the low milliseconds.
+RANK_LIMIT = 1000
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+### Turns free text into an FTS5 query: every word has to match, the last one as a prefix ###
+# Words are quoted, so input like `AND`, `-` or `"` is never parsed as FTS5 syntax.
+def _match_query(text: str) -> str | None:
+    words = _TOKEN.findall(text or "")
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words[:-1]] + [f'"{words[-1]}"*']
+    return " ".join(terms)
+
+### ORDER BY for a search: relevance for selective queries, newest first for broad ones ###
+def _order_by(fts: str, query: str, tables: tuple) -> str:
+    matches = cached_query(
+        f"SELECT COUNT(*) FROM (SELECT rowid FROM {fts} WHERE {fts} MATCH ? LIMIT ?)",
+        (query, RANK_LIMIT + 1), tables=tables
+    )[0][0]
+    return "f.rank" if matches <= RANK_LIMIT else "f.rowid DESC"
+
+### Trips whose destination or occasion match, best match first ###
+# Returns (rows, has_more) with rows shaped like the trip overview's.
+def search_trips(text: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0):
+    query = _match_query(text)
+    if query is None:
+        return [], False
+    rows = cached_query(f"""
+        SELECT t.trip_ID, t.destination, t.start_date, t.end_date, t.occasion
+        FROM trips_fts f
+        JOIN trips t ON t.trip_ID = f.rowid
+        WHERE trips_fts MATCH ?
+        ORDER BY {_order_by("trips_fts", query, ("trips",))}
+        LIMIT ? OFFSET ?
+    """, (query, limit + 1, offset), tables=("trips",))
+    return rows[:limit], len(rows) > limit
+
+### Users whose username or email match, below a role sortkey and optionally below a manager ###
+# Returns (rows, has_more), rows are (user_ID, username, email, role, manager_ID).
+def search_users(text: str, max_sortkey: int, manager_ID: int | None = None,
+                 limit: int = SEARCH_PAGE_SIZE, offset: int = 0):
+    query = _match_query(text)
+    if query is None:
+        return [], False
+    scope = ""
+    params = [query, max_sortkey]
+    if manager_ID is not None:
+        scope = "AND u.user_ID IN (SELECT descendant_ID FROM user_closure WHERE ancestor_ID = ? AND depth > 0)"
+        params.append(manager_ID)
+    rows = cached_query(f"""
+        SELECT u.user_ID, u.username, u.email, u.role, u.manager_ID
+        FROM users_fts f
+        JOIN users u ON u.user_ID = f.rowid
+        JOIN roles r ON r.role = u.role
+        WHERE users_fts MATCH ?
+        AND r.sortkey < ?
+        {scope}
+        ORDER BY {_order_by("users_fts", query, ("users",))}
+        LIMIT ? OFFSET ?
+    """, (*params, limit + 1, offset), tables=("users", "roles"))
+    return rows[:limit], len(rows) > limit
+
+### Text input plus previous/next buttons, returns (text, offset) ###
+def _search_controls(key: str, label: str, placeholder: str):
+    text = st.text_input(label, placeholder=placeholder, key=f"{key}_text")
+    #back to the first page whenever the search text changes
+    if st.session_state.get(f"{key}_last") != text:
+        st.session_state[f"{key}_last"] = text
+        st.session_state[f"{key}_page"] = 0
+    return text, st.session_state[f"{key}_page"] * SEARCH_PAGE_SIZE
+
+def _pager(key: str, has_more: bool):
+    page = st.session_state[f"{key}_page"]
+    col1, col2, col3 = st.columns([1, 1, 3])
+    if page > 0 and col1.button("Previous", key=f"{key}_prev"):
+        st.session_state[f"{key}_page"] = page - 1
+        st.rerun()
+    if has_more and col2.button("Next", key=f"{key}_next"):
+        st.session_state[f"{key}_page"] = page + 1
+        st.rerun()
+    col3.caption(f"Page {page + 1}")
+
+### Search box on the manager dashboard, hits open as editable trip panels ###
+def trip_search_box(title: str = "Search trips"):
+    manager_ID = int(st.session_state["user_ID"])
+    text, offset = _search_controls("trip_search", title, "Destination or occasion, e.g. zur conf")
+    if not text.strip():
+        return
+    trips, has_more = search_trips(text, offset=offset)
+    if not trips:
+        st.info("No matching trips.")
+        return
+    usernames = dict(load_user_directory(manager_ID))
+    participants = load_participants([t[0] for t in trips])
+    conflicts = find_trip_conflicts([t[0] for t in trips])
+    budgets = trip_budgets([t[0] for t in trips])
+    for trip in trips:
+        trip_panel(trip, participants.get(trip[0], []), usernames, manager_ID, key="trip_search",
+                   conflicts=conflicts.get(trip[0], {}), budget=budgets.get(trip[0]))
+    _pager("trip_search", has_more)
+
+### Search box on the admin dashboard (all users) or the manager dashboard (own subtree) ###
+def user_search_box(title: str = "Search users", manager_ID: int | None = None):
+    if "role_sortkey" not in st.session_state:
+        return
+    text, offset = _search_controls("user_search", title, "Username or e-mail")
+    if not text.strip():
+        return
+    users, has_more = search_users(text, st.session_state["role_sortkey"], manager_ID, offset=offset)
+    if not users:
+        st.info("No matching users.")
+        return
+    st.dataframe(
+        as_records(users, ["user_ID", "username", "email", "role", "manager_ID"]),
+        hide_index=True, use_container_width=True
+    )
+    _pager("user_search", has_more)
@@ -0,0 +1,64 @@
+import streamlit as st
+from datetime import date
+from db.db_cache import cached_query
+from db.db_functions_budget import format_amount
+
+#the stats tables change with every write to these (see migrations 9 and 10)
+_TABLES = ("trips", "user_trips", "users", "trip_expenses")
+
+### Trip statistics of one participant, read from the summary tables ###
+# Returns a dict with total trips and travel days, trips starting this month or later,
+# the travel days of trips starting this year and the expenses booked on the user.
+# Reads one row plus at most the month buckets in range, however long the history is.
+def get_user_stats(user_ID: int, today: date | None = None) -> dict:
+    month = (today or date.today()).strftime("%Y-%m")
+    row = cached_query("""
+        SELECT
+            (SELECT trips FROM trip_stats_user WHERE user_ID = ?),
+            (SELECT travel_days FROM trip_stats_user WHERE user_ID = ?),
+            (SELECT spent_cents FROM trip_stats_user WHERE user_ID = ?),
+            (SELECT SUM(trips) FROM trip_stats_user_month WHERE user_ID = ? AND month >= ?),
+            (SELECT SUM(travel_days) FROM trip_stats_user_month WHERE user_ID = ? AND month BETWEEN ? AND ?)
+    """, (user_ID, user_ID, user_ID, user_ID, month, user_ID, month[:4] + "-01", month[:4] + "-12"), tables=_TABLES)[0]
+    trips, travel_days, spent_cents, upcoming, days_this_year = (v or 0 for v in row)
+    return {"trips": trips, "travel_days": travel_days, "spent_cents": spent_cents,
+            "upcoming": upcoming, "days_this_year": days_this_year}
+
+### Trip statistics of the trips a manager planned ###
+# participants counts every (trip, user) pair, travel_days sums the days of all participants,
+# budget_cents / spent_cents are the planned budgets and the booked expenses of those trips.
+def get_manager_stats(manager_ID: int, today: date | None = None) -> dict:
+    month = (today or date.today()).strftime("%Y-%m")
+    row = cached_query("""
+        SELECT
+            (SELECT trips FROM trip_stats_manager WHERE manager_ID = ?),
+            (SELECT participants FROM trip_stats_manager WHERE manager_ID = ?),
+            (SELECT travel_days FROM trip_stats_manager WHERE manager_ID = ?),
+            (SELECT budget_cents FROM trip_stats_manager WHERE manager_ID = ?),
+            (SELECT spent_cents FROM trip_stats_manager WHERE manager_ID = ?),
+            (SELECT SUM(trips) FROM trip_stats_manager_month WHERE manager_ID = ? AND month >= ?)
+    """, (manager_ID,) * 6 + (month,), tables=_TABLES)[0]
+    trips, participants, travel_days, budget_cents, spent_cents, upcoming = (v or 0 for v in row)
+    return {"trips": trips, "participants": participants, "travel_days": travel_days,
+            "budget_cents": budget_cents, "spent_cents": spent_cents, "upcoming": upcoming}
+
+### KPI tiles above the user dashboard ###
+def user_kpi_tiles(user_ID: int):
+    stats = get_user_stats(user_ID)
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Trips", stats["trips"])
+    col2.metric("From this month on", stats["upcoming"])
+    col3.metric("Travel days", stats["travel_days"])
+    col4.metric(f"Travel days {date.today().year}", stats["days_this_year"])
+    col5.metric("Expenses", format_amount(stats["spent_cents"]))
+
+### KPI tiles above the manager dashboard ###
+def manager_kpi_tiles(manager_ID: int):
+    stats = get_manager_stats(manager_ID)
+    col1, col2, col3, col4, col5, col6 = st.columns(6)
+    col1.metric("Trips planned", stats["trips"])
+    col2.metric("From this month on", stats["upcoming"])
+    col3.metric("Participants", stats["participants"])
+    col4.metric("Travel days (all participants)", stats["travel_days"])
+    col5.metric("Budget", format_amount(stats["budget_cents"]))
+    col6.metric("Spent", format_amount(stats["spent_cents"]))
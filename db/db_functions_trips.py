@@ -1,86 +1,127 @@
 import sqlite3
-import time
 import streamlit as st
-import pandas as pd
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from datetime import date
-DB_PATH = "db/users.db"
+from db.db_connection import connection
+from db.db_cache import cached_query, table_versions, as_records
+from db.db_writer import write, write_sql
+from db.db_instrumentation import begin_rerun
+from db.db_migrations import run_migrations, day_number
+from db.db_functions_feedback import flash, show_flashes
+from db.db_functions_conflicts import find_conflicts, find_trip_conflicts, show_conflicts
+from db.db_functions_budget import TRIP_STATUSES, to_cents, trip_budgets, trip_budget_section
 
-### Connecting to the database trips.db ###
+### Connecting to the database users.db, through the shared connection pool (foreign_keys is set there) ###
 def connect():
-    return sqlite3.connect(DB_PATH)
+    return connection()
 
+### Trip tables are created by the migration runner, these stay for existing callers ###
 def create_trip_table():
-    conn = connect()
-    conn.execute("PRAGMA foreign_keys = ON;")
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS trips (
-                        trip_ID INTEGER NOT NULL UNIQUE PRIMARY KEY AUTOINCREMENT,
-                        destination TEXT NOT NULL,
-                        start_date TEXT,
-                        end_date TEXT, 
-                        occasion TEXT
-    )
-    """)
-    conn.commit()
-    conn.close()
+    run_migrations()
 
 def create_trip_users_table():
-    conn = connect()
-    conn.execute("PRAGMA foreign_keys = ON;")
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS user_trips (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        trip_ID INTEGER NOT NULL,
-                        user_ID INTEGER NOT NULL,
-                        UNIQUE (user_ID, trip_ID),
-                        FOREIGN KEY(trip_ID) REFERENCES trips(trip_ID) ON DELETE CASCADE,
-                        FOREIGN KEY(user_ID) REFERENCES users(user_ID) ON DELETE CASCADE
-    )
-    """)
-    c.execute("CREATE INDEX IF NOT EXISTS ix_user_trips_trip ON user_trips(trip_ID);")
-    c.execute("CREATE INDEX IF NOT EXISTS ix_user_trips_user ON user_trips(user_ID);")
-    conn.commit()
-    conn.close()
-
-def add_trip(destination, start_date, end_date, occasion, user_ids):
-    conn = connect()
-    conn.execute("PRAGMA foreign_keys = ON;")
-    c = conn.cursor()
+    run_migrations()
+
+def add_trip(destination, start_date, end_date, occasion, user_ids, manager_ID=None, budget_cents=None):
     try:
-        c.execute(
-            "INSERT INTO trips (destination, start_date, end_date, occasion) VALUES (?, ?, ?, ?)",
-            (destination, start_date, end_date, occasion)
-        )
-        if user_ids:
-            trip_ID = c.lastrowid
-            user_trips_list = [(trip_ID, user_ID) for user_ID in user_ids]
-            c.executemany("INSERT OR IGNORE INTO user_trips (trip_ID, user_ID) VALUES (?, ?)", user_trips_list)
-        conn.commit()
+        def insert_trip(conn):
+            c = conn.cursor()
+            c.execute(
+                "INSERT INTO trips (destination, start_day, end_day, occasion, manager_ID, budget_cents) VALUES (?, ?, ?, ?, ?, ?)",
+                (destination, day_number(start_date), day_number(end_date or start_date), occasion, manager_ID, budget_cents)
+            )
+            if user_ids:
+                trip_ID = c.lastrowid
+                user_trips_list = [(trip_ID, user_ID) for user_ID in user_ids]
+                c.executemany("INSERT OR IGNORE INTO user_trips (trip_ID, user_ID) VALUES (?, ?)", user_trips_list)
+
+        write(insert_trip, tables=("trips", "user_trips"))
     except Exception as e:
         st.error(f"Unable to add the trip: {e}")
-    finally:
-        conn.close()
+
+### Creates many trips with their participants in one transaction, returns the new trip_IDs ###
+# Each trip is a dict with destination, start_date and optionally end_date (default: the start
+# day), occasion, manager_ID, status, budget_cents and participants (user_IDs). Errors
+# propagate and nothing is written.
+def add_trips(trips) -> list:
+    def insert_trips(conn):
+        trip_IDs, links = [], []
+        for trip in trips:
+            trip_ID = conn.execute(
+                "INSERT INTO trips (destination, start_day, end_day, occasion, manager_ID, status, budget_cents) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (trip["destination"], day_number(trip["start_date"]), day_number(trip.get("end_date") or trip["start_date"]), trip.get("occasion", ""),
+                 trip.get("manager_ID"), trip.get("status", "planned"), trip.get("budget_cents"))
+            ).lastrowid
+            trip_IDs.append(trip_ID)
+            links += [(trip_ID, user_ID) for user_ID in trip.get("participants", ())]
+        conn.executemany("INSERT OR IGNORE INTO user_trips (trip_ID, user_ID) VALUES (?, ?)", links)
+        return trip_IDs
+
+    return write(insert_trips, tables=("trips", "user_trips"))
 
 def del_trip(deleted_tripID: int):
-    conn = connect()
-    conn.execute("PRAGMA foreign_keys = ON;")
-    c = conn.cursor()
     try:
-        c.execute(
-            "DELETE FROM trips WHERE trip_ID = ?",
-            (deleted_tripID,)
-        )
-        c.execute(
-            "DELETE FROM user_trips WHERE trip_ID = ?",
-            (deleted_tripID,)
-        )
-        conn.commit()
+        def delete_trip(conn):
+            conn.execute(
+                "DELETE FROM trips WHERE trip_ID = ?",
+                (deleted_tripID,)
+            )
+            conn.execute(
+                "DELETE FROM user_trips WHERE trip_ID = ?",
+                (deleted_tripID,)
+            )
+
+        write(delete_trip, tables=("trips", "user_trips", "trip_expenses"))
     except:
         st.error("Unable to delete the trip")
-    finally:
-        conn.close()
+
+### Brings user_trips in line with the wanted participants, touching only the rows that differ ###
+# `participants` maps trip_ID -> user_IDs. Returns trip_ID -> (added, removed).
+def _apply_participants(conn, participants: dict) -> dict:
+    trip_IDs = list(participants)
+    current = {trip_ID: set() for trip_ID in trip_IDs}
+    for i in range(0, len(trip_IDs), 500):
+        chunk = trip_IDs[i:i + 500]
+        rows = conn.execute(
+            f"SELECT trip_ID, user_ID FROM user_trips WHERE trip_ID IN ({', '.join('?' * len(chunk))})", chunk
+        )
+        for trip_ID, user_ID in rows:
+            current[trip_ID].add(user_ID)
+
+    added, removed, changes = [], [], {}
+    for trip_ID, user_ids in participants.items():
+        wanted = {int(uid) for uid in user_ids}
+        to_add = wanted - current[trip_ID]
+        to_remove = current[trip_ID] - wanted
+        added += [(trip_ID, uid) for uid in sorted(to_add)]
+        removed += [(trip_ID, uid) for uid in sorted(to_remove)]
+        changes[trip_ID] = (len(to_add), len(to_remove))
+
+    if removed:
+        conn.executemany("DELETE FROM user_trips WHERE trip_ID = ? AND user_ID = ?", removed)
+    if added:
+        conn.executemany("INSERT INTO user_trips (trip_ID, user_ID) VALUES (?, ?)", added)
+    return changes
+
+### Sets the participants of one trip in a single transaction, returns (added, removed) ###
+def set_trip_participants(trip_ID: int, user_ids) -> tuple:
+    return write(lambda conn: _apply_participants(conn, {trip_ID: user_ids})[trip_ID], tables=("user_trips",))
+
+### Same for many trips at once, all in one transaction ###
+def set_many_trip_participants(participants: dict) -> dict:
+    return write(lambda conn: _apply_participants(conn, participants), tables=("user_trips",))
+
+### Users a manager can put on a new trip, as (user_ID, username) ###
+def load_assignable_users(manager_ID: int):
+    return cached_query("""SELECT u.user_ID, u.username FROM users u 
+                           JOIN roles r ON u.role = r.role 
+                           WHERE r.sortkey < 3
+                           AND u.manager_ID = ? 
+                           ORDER BY username""", (manager_ID,),
+                           tables=("users", "roles"),
+    )
 
 def create_trip_dropdown(title: str = "Create new trip"):
     with st.expander(title, expanded=False):
@@ -89,30 +130,45 @@ def create_trip_dropdown(title: str = "Create new trip"):
             start_date = st.date_input("Departure")
             end_date = st.date_input("Return")
             occasion = st.text_input("Occasion")
+            budget = st.text_input("Budget", placeholder="optional, e.g. 1200.00")
 
-            conn = connect()
-            user_df = pd.read_sql_query("""SELECT u.user_ID, u.username FROM users u 
-                                        JOIN roles r ON u.role = r.role 
-                                        WHERE r.sortkey < 3
-                                        AND u.manager_ID = ? 
-                                        ORDER BY username""", conn, params=(int(st.session_state["user_ID"]),),
-            )
-            conn.close()
-
+            options = load_assignable_users(int(st.session_state["user_ID"]))
 
-            options = list(zip(user_df["user_ID"], user_df["username"]))
             selected = st.multiselect("Assign users", options=options, format_func=lambda x: x[1])
             user_ids = [opt[0] for opt in selected]
 
             submitted = st.form_submit_button("invite")
 
         if submitted:
-            if not destination:
-                st.error("Destination must not be empty.")
+            try:
+                budget_cents = to_cents(budget)
+            except ValueError as e:
+                st.error(str(e))
             else:
-                add_trip(destination, start_date, end_date, occasion, user_ids)
-                st.success("Trip saved!")
-                time.sleep(0.5)
+                if not destination:
+                    st.error("Destination must not be empty.")
+                elif end_date < start_date:
+                    st.error("Return must not be before departure.")
+                elif find_conflicts(user_ids, start_date, end_date):
+                    #hold the trip back until the manager confirms the double booking
+                    st.session_state["pending_trip"] = (destination, start_date, end_date, occasion, user_ids, budget_cents)
+                else:
+                    add_trip(destination, start_date, end_date, occasion, user_ids, st.session_state["user_ID"], budget_cents)
+                    flash("Trip saved!")
+                    st.rerun()
+
+        pending = st.session_state.get("pending_trip")
+        if pending:
+            destination, start_date, end_date, occasion, user_ids, budget_cents = pending
+            show_conflicts(find_conflicts(user_ids, start_date, end_date), dict(options))
+            col1, col2 = st.columns(2)
+            if col1.button("Save anyway", key="pending_trip_save"):
+                add_trip(destination, start_date, end_date, occasion, user_ids, st.session_state["user_ID"], budget_cents)
+                del st.session_state["pending_trip"]
+                flash("Trip saved!")
+                st.rerun()
+            if col2.button("Cancel", key="pending_trip_cancel"):
+                del st.session_state["pending_trip"]
                 st.rerun()
 
 def del_trip_dropdown(title: str = "Delete trip"):
@@ -131,116 +187,293 @@ def del_trip_dropdown(title: str = "Delete trip"):
                         st.error("TRIP ID has to be a integer")
                     else:
                         del_trip(deleted_tripID)
-                        st.success("Trip deleted!")
-                        time.sleep(0.5)
+                        flash("Trip deleted!")
                         st.rerun()
 
-#trip table overview
-def trip_list_view():
-    conn = connect()
-    trip_df = pd.read_sql_query("""
-        SELECT trip_ID, destination, start_date, end_date, occasion
+### Trips of one user overlapping [date_from, date_to], newest first ###
+# Rows are (trip_ID, destination, start_date, end_date, occasion, status, budget_cents).
+# With a date range the user's links are read from ix_user_trips_days (migration 13) starting
+# at end_day >= date_from, so trips that ended before the range are never visited.
+def get_user_trips(user_ID: int, date_from=None, date_to=None):
+    if date_from is None and date_to is None:
+        return cached_query("""
+            SELECT t.trip_ID, t.destination, t.start_date, t.end_date, t.occasion, t.status, t.budget_cents
+            FROM user_trips ut
+            JOIN trips t ON t.trip_ID = ut.trip_ID
+            WHERE ut.user_ID = ?
+            ORDER BY t.start_day DESC, t.trip_ID DESC
+        """, (user_ID,), tables=("trips", "user_trips"))
+
+    date_from = date_from or date_to
+    date_to = date_to or date_from
+    return cached_query("""
+        SELECT t.trip_ID, t.destination, t.start_date, t.end_date, t.occasion, t.status, t.budget_cents
+        FROM user_trips ut
+        JOIN trips t ON t.trip_ID = ut.trip_ID
+        WHERE ut.user_ID = ?
+        AND ut.end_day >= ?
+        AND ut.start_day <= ?
+        ORDER BY t.start_day DESC, t.trip_ID DESC
+    """, (user_ID, day_number(date_from), day_number(date_to)), tables=("trips", "user_trips"))
+
+def user_has_trips(user_ID: int) -> bool:
+    return bool(cached_query(
+        "SELECT 1 FROM user_trips WHERE user_ID = ? LIMIT 1", (user_ID,), tables=("user_trips",)
+    ))
+
+### Page size choices for the paginated trip overview ###
+PAGE_SIZES = (10, 25, 50, 100)
+
+### The manager's user directory, identical for every trip ###
+def load_user_directory(manager_ID: int):
+    return cached_query("""
+        SELECT u.user_ID, u.username FROM users u
+        WHERE u.manager_ID = ?
+        ORDER BY username
+    """, (manager_ID,), tables=("users",))
+
+### Participants grouped by trip_ID, for the given trips or for all trips ###
+def load_participants(trip_IDs=None) -> dict:
+    query = """
+        SELECT ut.trip_ID, u.user_ID, u.username, u.email, u.manager_ID
+        FROM user_trips ut
+        JOIN users u ON ut.user_ID = u.user_ID
+    """
+    params = ()
+    if trip_IDs is not None:
+        if not trip_IDs:
+            return {}
+        trip_IDs = list(trip_IDs)
+        query += f" WHERE ut.trip_ID IN ({', '.join('?' * len(trip_IDs))})"
+        params = trip_IDs
+
+    links = cached_query(query + " ORDER BY u.username", params, tables=("users", "user_trips"))
+
+    participants = {}
+    for trip_ID, user_ID, username, email, user_manager_ID in links:
+        participants.setdefault(trip_ID, []).append((user_ID, username, email, user_manager_ID))
+    return participants
+
+### One page of trips, keyset-paginated on (start_day, trip_ID) ###
+# `after` is the (start_day, trip_ID) of the last trip of the previous page, None for the first page.
+# Trips without a date (start_day NULL) sort first, a key with a NULL day continues with the
+# rest of them and then every dated trip.
+# Returns the page, its participants and the key for the next page (None when there is no next page).
+def load_trip_page(after=None, limit: int = 25, date_from=None, date_to=None, status=None):
+    conditions, params = [], []
+    #with a status the page is read from the (status, start_day) index
+    if status is not None:
+        conditions.append("status = ?")
+        params.append(status)
+    if after is not None and after[0] is None:
+        conditions.append("(start_day IS NOT NULL OR trip_ID > ?)")
+        params.append(after[1])
+    elif after is not None:
+        conditions.append("(start_day, trip_ID) > (?, ?)")
+        params += list(after)
+    #date window: every trip overlapping [date_from, date_to]
+    if date_from is not None:
+        conditions.append("end_day >= ?")
+        params.append(day_number(date_from))
+    if date_to is not None:
+        conditions.append("start_day <= ?")
+        params.append(day_number(date_to))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = cached_query(f"""
+        SELECT trip_ID, destination, start_date, end_date, occasion, start_day
         FROM trips
-        ORDER BY start_date
-    """, conn)
-    conn.close()
+        {where}
+        ORDER BY start_day, trip_ID
+        LIMIT ?
+    """, params + [limit + 1], tables=("trips",))
+    next_key = (rows[limit - 1][5], rows[limit - 1][0]) if len(rows) > limit else None
+    trips = [row[:5] for row in rows[:limit]]
+    participants = load_participants([t[0] for t in trips])
+
+    return trips, participants, next_key
+
+#tables a page of the overview is read from, its cached pages are dropped when one changes
+TRIP_VIEW_TABLES = ("trips", "user_trips", "users", "trip_expenses")
+
+### A page of the overview with everything its panels show, loaded once per session and cursor ###
+# Pages already loaded by "Load more" come from session_state, so a rerun with k pages open
+# runs no page queries at all, and loading one more page queries only that page. The pages
+# are dropped when the filter changes or any of TRIP_VIEW_TABLES was written to; each page
+# then continues after the reloaded page before it, so a trip added in between is not skipped.
+def _trip_view_page(after, page_size: int, date_from, date_to, status):
+    pages = st.session_state["trip_view_pages"]
+    if after not in pages:
+        trips, participants, next_key = load_trip_page(after, page_size, date_from, date_to, status)
+        trip_IDs = [t[0] for t in trips]
+        pages[after] = (trips, participants, next_key, find_trip_conflicts(trip_IDs), trip_budgets(trip_IDs))
+    return pages[after]
+
+#trip table overview, paginated
+def trip_list_view():
+    manager_ID = int(st.session_state["user_ID"])
+
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("Trips per page", PAGE_SIZES, index=1)
+    with col2:
+        status = st.selectbox("Status", [None, *TRIP_STATUSES], format_func=lambda s: "all" if s is None else s)
+    with col3:
+        window = st.date_input("Date window", value=(), help="Only show trips overlapping this range")
+    date_from = window[0] if len(window) > 0 else None
+    date_to = window[1] if len(window) > 1 else date_from
+
+    #start again from the first page when the controls change
+    view_filter = (page_size, status, date_from, date_to)
+    if st.session_state.get("trip_view_filter") != view_filter:
+        st.session_state["trip_view_filter"] = view_filter
+        st.session_state["trip_view_page_count"] = 1
+        st.session_state["trip_view_pages"] = {}
+    #the same pages, read again after a write
+    versions = table_versions(*TRIP_VIEW_TABLES)
+    if st.session_state.get("trip_view_versions") != versions:
+        st.session_state["trip_view_versions"] = versions
+        st.session_state["trip_view_pages"] = {}
+
+    usernames = dict(load_user_directory(manager_ID))
+    #this full run hands every panel fresh data again
+    st.session_state["trip_panels_stale"] = set()
 
-    if trip_df.empty:
+    shown = 0
+    next_key = None
+    for _ in range(st.session_state["trip_view_page_count"]):
+        trips, participants_by_trip, next_key, conflicts, budgets = _trip_view_page(next_key, page_size, date_from, date_to, status)
+        for trip in trips:
+            trip_panel(trip, participants_by_trip.get(trip[0], []), usernames, manager_ID,
+                       conflicts=conflicts.get(trip[0], {}), budget=budgets.get(trip[0]))
+        shown += len(trips)
+        if next_key is None:
+            break
+
+    if not shown:
         st.info("No trips available.")
         return
 
-    #loop all trips
-    for _, row in trip_df.iterrows():
-        with st.expander(
-            f"{row.trip_ID} — {row.destination} ({row.start_date} → {row.end_date})",
-            expanded=False
-        ):
-            #list details
-            st.write("**Occasion:**", row.occasion)
-            st.write("**Start:**", row.start_date)
-            st.write("**End:**", row.end_date)
-
-            #load participants into table
-            conn = connect()
-            participants = pd.read_sql_query("""
-                SELECT u.username, u.email
-                FROM users u
-                JOIN user_trips ut ON ut.user_ID = u.user_ID
-                WHERE ut.trip_ID = ?
-                ORDER BY u.username
-            """, conn, params=(row.trip_ID,))
-            conn.close()
-
-            st.markdown("**Participants:**")
-            st.dataframe(participants, hide_index=True, use_container_width=True)
-
-            #edit occasion
-            with st.form(f"edit_trip_{row.trip_ID}"):
-                new_occasion = st.text_input("Edit occasion", value=row.occasion)
-                submitted = st.form_submit_button("Save changes")
-                if submitted:
-                    conn = connect()
-                    conn.execute(
-                        "UPDATE trips SET occasion = ? WHERE trip_ID = ?",
-                        (new_occasion, row.trip_ID)
-                    )
-                    conn.commit()
-                    conn.close()
-                    st.success("Occasion updated!")
-                    time.sleep(0.5)
-                    st.rerun()
-            
-            with st.form(f"edit_participants_{row.trip_ID}"):
-                st.write("Manage participants")
-
-                #load participants to edit them
-                conn = connect()
-                all_users_df = pd.read_sql_query("""SELECT u.user_ID, u.username FROM users u 
-                    WHERE u.manager_ID = ? 
-                    ORDER BY username
-                """, conn, params=(int(st.session_state["user_ID"]),),
-                )
-                conn.close()
-
-                #load current participants from db
-                conn = connect()
-                current_df = pd.read_sql_query("""
-                    SELECT u.user_ID, u.username
-                    FROM users u
-                    JOIN user_trips ut ON ut.user_ID = u.user_ID
-                    WHERE ut.trip_ID = ?
-                    AND u.manager_ID = ?
-                """, conn, params=(row.trip_ID, int(st.session_state["user_ID"]),), 
-                )
-                conn.close()
-
-                #multiselect to choose from
-                selected_users = st.multiselect(
-                    "Select participants",
-                    options=all_users_df["user_ID"].tolist(),
-                    default=current_df["user_ID"].tolist(),
-                    format_func=lambda uid: all_users_df.loc[all_users_df["user_ID"] == uid, "username"].values[0]
+    if next_key is not None and st.button("Load more"):
+        st.session_state["trip_view_page_count"] += 1
+        st.rerun()
+
+### One trip with its participants, for a panel that re-renders on its own ###
+def load_trip(trip_ID: int):
+    rows = cached_query(
+        "SELECT trip_ID, destination, start_date, end_date, occasion FROM trips WHERE trip_ID = ?",
+        (trip_ID,), tables=("trips",)
+    )
+    if not rows:
+        return None, []
+    return rows[0], load_participants([trip_ID]).get(trip_ID, [])
+
+### Marks a panel's data as changed and re-renders only that panel ###
+def _rerun_panel(trip_ID: int, message: str):
+    st.session_state.setdefault("trip_panels_stale", set()).add(trip_ID)
+    flash(message)
+    _rerun_fragment()
+
+#a fragment's widgets normally trigger a fragment run, but they can also be handled in a full run
+def _rerun_fragment():
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+#a fragment rerun skips the page's begin_rerun(), it gets a summary of its own
+def _begin_fragment_rerun(name: str):
+    ctx = get_script_run_ctx()
+    if ctx is not None and ctx.fragment_ids_this_run:
+        begin_rerun(name)
+
+### Expander with details and edit forms of a single trip ###
+# A fragment: saving in one panel reruns just this panel. Fragment reruns get the arguments
+# of the last full run, so a panel that saved since then loads its own trip again.
+# `key` prefixes the widget keys, for pages that show the same trip in two places.
+# `conflicts` and `budget` are the trip's entries of find_trip_conflicts and trip_budgets,
+# loaded for the whole page; a panel called without them looks up its own.
+@st.fragment
+def trip_panel(trip, participants, usernames: dict, manager_ID: int, key: str = "trip", conflicts=None, budget=None):
+    _begin_fragment_rerun("trip_panel")
+    show_flashes()
+    if trip[0] in st.session_state.get("trip_panels_stale", ()):
+        trip, participants = load_trip(trip[0])
+        if trip is None:
+            return
+        conflicts = budget = None
+    trip_ID, destination, start_date, end_date, occasion = trip
+    if conflicts is None:
+        conflicts = find_trip_conflicts([trip_ID]).get(trip_ID, {})
+
+    with st.expander(
+        f"{trip_ID} — {destination} ({start_date} → {end_date})",
+        expanded=False
+    ):
+        #list details
+        st.write("**Occasion:**", occasion)
+        st.write("**Start:**", start_date)
+        st.write("**End:**", end_date)
+
+        #participants into table
+        st.markdown("**Participants:**")
+        st.dataframe(
+            as_records([(p[1], p[2]) for p in participants], ["username", "email"]),
+            hide_index=True, use_container_width=True
+        )
+
+        #participants already booked on an overlapping trip
+        if conflicts:
+            show_conflicts(conflicts, {p[0]: p[1] for p in participants})
+
+        trip_budget_section(trip_ID, participants, lambda message: _rerun_panel(trip_ID, message), key=key, budget=budget)
+
+        #edit occasion
+        with st.form(f"{key}_edit_{trip_ID}"):
+            new_occasion = st.text_input("Edit occasion", value=occasion)
+            submitted = st.form_submit_button("Save changes")
+            if submitted:
+                write_sql(
+                    "UPDATE trips SET occasion = ? WHERE trip_ID = ?",
+                    (new_occasion, trip_ID),
+                    tables=("trips",)
                 )
+                _rerun_panel(trip_ID, "Occasion updated!")
+        
+        with st.form(f"{key}_participants_{trip_ID}"):
+            st.write("Manage participants")
 
-                #submit button
-                update_participants = st.form_submit_button("Update participants")
+            #current participants are the ones from the manager's own directory
+            current_ids = [p[0] for p in participants if p[3] == manager_ID]
 
-                if update_participants:
-                    conn = connect()
-                    c = conn.cursor()
+            #multiselect to choose from
+            selected_users = st.multiselect(
+                "Select participants",
+                options=list(usernames),
+                default=current_ids,
+                format_func=lambda uid: usernames[uid]
+            )
 
-                    #delete old connection
-                    c.execute("DELETE FROM user_trips WHERE trip_ID = ?", (row.trip_ID,))
+            #submit button
+            update_participants = st.form_submit_button("Update participants")
 
-                    #create new connection
-                    user_trips_list = [(row.trip_ID, uid) for uid in selected_users]
-                    c.executemany(
-                        "INSERT OR IGNORE INTO user_trips (trip_ID, user_ID) VALUES (?, ?)",
-                    user_trips_list
-                    )
+            if update_participants:
+                added = set(selected_users) - set(current_ids)
+                if find_conflicts(added, start_date, end_date, exclude_trip=trip_ID):
+                    st.session_state[f"pending_participants_{trip_ID}"] = selected_users
+                else:
+                    set_trip_participants(trip_ID, selected_users)
+                    _rerun_panel(trip_ID, "Participants updated!")
 
-                    conn.commit()
-                    conn.close()
-                    st.success("Participants updated!")
-                    time.sleep(0.5)
-                    st.rerun()
+        pending = st.session_state.get(f"pending_participants_{trip_ID}")
+        if pending is not None:
+            added = set(pending) - set(current_ids)
+            show_conflicts(find_conflicts(added, start_date, end_date, exclude_trip=trip_ID), usernames)
+            col1, col2 = st.columns(2)
+            if col1.button("Save anyway", key=f"{key}_pending_save_{trip_ID}"):
+                set_trip_participants(trip_ID, pending)
+                del st.session_state[f"pending_participants_{trip_ID}"]
+                _rerun_panel(trip_ID, "Participants updated!")
+            if col2.button("Cancel", key=f"{key}_pending_cancel_{trip_ID}"):
+                del st.session_state[f"pending_participants_{trip_ID}"]
+                _rerun_fragment()
@@ -1,145 +1,153 @@
 import sqlite3
-import time
 import streamlit as st
-import pandas as pd
-DB_USERS = "db/users.db"
+from db.db_connection import connection
+from db.db_cache import cached_query, as_records
+from db.db_writer import write, write_sql
+from db.db_migrations import run_migrations
+from db.db_functions_feedback import flash
 
-### Connecting to the database users.db ###
+### Connecting to the database users.db, through the shared connection pool ###
 def connect():
-    return sqlite3.connect(DB_USERS)
+    return connection()
 
-### Creating necessary tables for different role in main.py ###
+### Creating necessary tables for different role, now done once per process by the migration runner ###
 def create_tables():
-    conn = connect()
-    c = conn.cursor()
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        user_ID INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE,
-        password TEXT NOT NULL,
-        email TEXT,
-        role TEXT NOT NULL,
-        manager_ID INTEGER,
-        FOREIGN KEY (role) REFERENCES roles (role)
-    )
-    """)
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS roles (
-        role TEXT PRIMARY KEY,
-        sortkey INTEGER NOT NULL
-    )
-    """)
-
-    c.executemany("""
-    INSERT OR IGNORE INTO roles (role, sortkey)
-    VALUES (?, ?)
-    """, [
-        ("Administrator", 3),
-        ("Manager", 2),
-        ("User", 1)
-    ])
-
-    conn.commit()
-    conn.close()
+    run_migrations()
 
 ### we use user_ID of the manager, to add their user_ID to the users they create with another column manager_id, so manager only have access to these users, they've created ###
 def get_user_ID(username: str):
-    conn = connect()
-    c = conn.cursor()
-
-    c.execute("SELECT user_ID FROM users WHERE username = ?", (username,))
-    row = c.fetchone()
-
-    conn.close()
+    rows = cached_query("SELECT user_ID FROM users WHERE username = ?", (username,), tables=("users",))
 
-    if row:
-        return row[0]
+    if rows:
+        return rows[0][0]
     return None
 
 def get_manager_ID(username: str):
-    conn = connect()
-    c = conn.cursor()
-    c.execute("SELECT manager_ID FROM users WHERE username = ?", (username,))
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else None
+    rows = cached_query("SELECT manager_ID FROM users WHERE username = ?", (username,), tables=("users",))
+    return rows[0][0] if rows else None
+
+#a deleted user's links cascade out of user_trips, trips.manager_ID and trip_expenses.user_ID
+#are set to NULL; the triggers keep user_closure and the trip statistics up to date
+USER_DELETE_TABLES = ("users", "user_trips", "trips", "trip_expenses")
+
+### Deleting users ###
+def del_user(username: str):
+    write_sql("DELETE FROM users WHERE username = ?", (username,), tables=USER_DELETE_TABLES)
 
 ### Adding users ###
 def add_user(username, password, email, role):
-    conn = connect()
-    c = conn.cursor()
     manager_ID = st.session_state.get("user_ID", None)
     try:
-        c.execute(
+        write_sql(
             "INSERT INTO users (username, password, email, role, manager_ID) VALUES (?, ?, ?, ?, ?)",
-            (username, password, email, role, manager_ID)
+            (username, password, email, role, manager_ID),
+            tables=("users",)
         )
-        conn.commit()
         print(f"✅ User '{username}' sucessfully added!")
     except sqlite3.IntegrityError:
         print(f"User '{username}' exists already.")
-    finally:
-        conn.close()
 
 ### Comparison from inputs to databank ###
 def get_user_by_credentials(username, password):
-    conn = connect()
-    c = conn.cursor()
-    c.execute(
-        "SELECT username, role FROM users WHERE username = ? AND password = ?",
-        (username, password)
-    )
-    user = c.fetchone()
-    conn.close()
+    with connect() as conn:
+        user = conn.execute(
+            "SELECT username, role FROM users WHERE username = ? AND password = ?",
+            (username, password)
+        ).fetchone()
     return user
 
 ### Assign sortkey to roles for user management ###
 def get_role_sortkey(role):
-    conn = sqlite3.connect(DB_USERS)
-    c = conn.cursor()
-    c.execute('SELECT sortkey FROM roles WHERE role = ?', (role,))
-    data = c.fetchone()[0]
-    conn.close()
+    data = cached_query('SELECT sortkey FROM roles WHERE role = ?', (role,), tables=("roles",))[0][0]
     return data
 
 ### List of all users under own role_sortkey ###
 def list_roles_editable():
     current_sortkey = st.session_state["role_sortkey"]
-    conn = sqlite3.connect(DB_USERS)
-    c = conn.cursor()
-
-    c.execute("""
+    roles = cached_query("""
         SELECT role, sortkey
         FROM roles
         WHERE sortkey < ?
         ORDER BY sortkey DESC
-    """, (current_sortkey,))
-
-    roles = c.fetchall()
-    conn.close()
+    """, (current_sortkey,), tables=("roles",))
     return roles
 
-### returns all users which the manager has created ###
+### returns all users below the manager, over all levels of the hierarchy ###
 def get_users_for_current_manager():
     if "user_ID" not in st.session_state:
         return []
 
     manager_id = st.session_state["user_ID"]
 
-    conn = connect()
-    c = conn.cursor()
-    c.execute("""
-        SELECT user_ID, username, email, role
-        FROM users
-        WHERE manager_ID = ?
-        ORDER BY username
-    """, (manager_id,))
-    rows = c.fetchall()
-    conn.close()
+    rows = cached_query("""
+        SELECT u.user_ID, u.username, u.email, u.role
+        FROM user_closure c
+        JOIN users u ON u.user_ID = c.descendant_ID
+        WHERE c.ancestor_ID = ? AND c.depth > 0
+        ORDER BY u.username
+    """, (manager_id,), tables=("users",))
     return rows
 
+### Org hierarchy lookups on user_closure, which triggers keep in sync with users.manager_ID ###
+# user_closure only changes together with users, so the users version covers it in the cache.
+def get_subtree(user_ID: int, max_depth: int | None = None):
+    return cached_query("""
+        SELECT u.user_ID, u.username, u.email, u.role, c.depth
+        FROM user_closure c
+        JOIN users u ON u.user_ID = c.descendant_ID
+        WHERE c.ancestor_ID = ? AND c.depth BETWEEN 1 AND ?
+        ORDER BY c.depth, u.username
+    """, (user_ID, max_depth if max_depth is not None else 1 << 30), tables=("users",))
+
+def count_subtree(user_ID: int) -> int:
+    return cached_query(
+        "SELECT COUNT(*) FROM user_closure WHERE ancestor_ID = ? AND depth > 0", (user_ID,), tables=("users",)
+    )[0][0]
+
+### True if user_ID is somewhere below ancestor_ID ###
+def is_under(user_ID: int, ancestor_ID: int) -> bool:
+    return bool(cached_query(
+        "SELECT 1 FROM user_closure WHERE ancestor_ID = ? AND descendant_ID = ? AND depth > 0",
+        (ancestor_ID, user_ID), tables=("users",)
+    ))
+
+### Users a manager (everyone below them) or an admin (manager_ID None) may edit or delete ###
+# Rows are (username, email, password, role, manager_ID), highest role first.
+def load_manageable_users(current_sortkey: int, manager_ID: int | None = None):
+    if manager_ID is None:
+        return cached_query("""
+            SELECT u.username, u.email, u.password, u.role, u.manager_ID
+            FROM users u
+            JOIN roles r ON u.role = r.role
+            WHERE r.sortkey < ?
+            ORDER BY r.sortkey DESC
+        """, (current_sortkey,), tables=("users", "roles"))
+    return cached_query("""
+        SELECT u.username, u.email, u.password, u.role, u.manager_ID
+        FROM user_closure c
+        JOIN users u ON u.user_ID = c.descendant_ID
+        JOIN roles r ON u.role = r.role
+        WHERE r.sortkey < ?
+        AND c.ancestor_ID = ? AND c.depth > 0
+        ORDER BY r.sortkey DESC
+    """, (current_sortkey, manager_ID), tables=("users", "roles"))
+
+### One page of users ordered by user_ID, as (user_ID, username, email, role, manager_ID) ###
+# `after` is the last user_ID of the previous page; passwords are never part of the rows.
+def load_users_page(after: int | None = None, limit: int = 100):
+    return cached_query("""
+        SELECT user_ID, username, email, role, manager_ID FROM users
+        WHERE user_ID > ?
+        ORDER BY user_ID
+        LIMIT ?
+    """, (after or 0, limit), tables=("users",))
+
+def load_user(user_ID: int):
+    rows = cached_query(
+        "SELECT user_ID, username, email, role, manager_ID FROM users WHERE user_ID = ?", (user_ID,), tables=("users",)
+    )
+    return rows[0] if rows else None
+
 ### Dropdown for manager page to register someone ###
 def register_user_dropdown(title: str = "Register new user"):
     if "role_sortkey" not in st.session_state:
@@ -175,8 +183,7 @@ def register_user_dropdown(title: str = "Register new user"):
 
             try:
                 add_user(username, password, email, role)
-                st.success(f"User **{username}** was registered")
-                time.sleep(2)
+                flash(f"User **{username}** was registered")
                 st.rerun()
             except sqlite3.IntegrityError as e:
                 st.error(f"Registration failed (maybe already exists): {e}")
@@ -219,8 +226,7 @@ def register_user_dropdown_admin(title: str = "Register new user"):
 
             try:
                 add_user(username, password, email, role)
-                st.success(f"User **{username}** was registered")
-                time.sleep(2)
+                flash(f"User **{username}** was registered")
                 st.rerun()
             except sqlite3.IntegrityError as e:
                 st.error(f"Registration failed (maybe already exists): {e}")
@@ -235,37 +241,20 @@ def del_user_dropdown(title: str = "Delete user"):
         return
 
     current_sortkey = st.session_state["role_sortkey"]
-    conn = sqlite3.connect(DB_USERS)
-    c = conn.cursor()
-
-    c.execute("""
-        SELECT u.username, u.role
-        FROM users u
-        JOIN roles r ON u.role = r.role
-        WHERE r.sortkey < ? 
-        AND u.manager_ID = ?
-        ORDER BY r.sortkey DESC
-    """, (current_sortkey, st.session_state["user_ID"]))
-    users = c.fetchall()
-    conn.close()
+    users = load_manageable_users(current_sortkey, st.session_state["user_ID"])
 
     if not users:
         st.info("No deletable users available.")
         return
 
     with st.expander(title, expanded=False):
-        user_list = [f"{u[0]}  ·  {u[1]}" for u in users]
+        user_list = [f"{u[0]}  ·  {u[3]}" for u in users]
         selected_user = st.selectbox("Select user to delete", user_list)
 
         if st.button("Delete user"):
             username = selected_user.split("·")[0].strip()
-            conn = sqlite3.connect(DB_USERS)
-            c = conn.cursor()
-            c.execute("DELETE FROM users WHERE username = ?", (username,))
-            conn.commit()
-            conn.close()
-            st.success(f"✅ User '{username}' has been deleted.")
-            time.sleep(2)
+            del_user(username)
+            flash(f"User '{username}' has been deleted.")
             st.rerun()
 
 ### Dropdown for Admin page to delete someone ###
@@ -275,36 +264,20 @@ def del_user_dropdown_admin(title: str = "Delete user"):
         return
 
     current_sortkey = st.session_state["role_sortkey"]
-    conn = sqlite3.connect(DB_USERS)
-    c = conn.cursor()
-
-    c.execute("""
-        SELECT u.username, u.role
-        FROM users u
-        JOIN roles r ON u.role = r.role
-        WHERE r.sortkey < ? 
-        ORDER BY r.sortkey DESC
-    """, (current_sortkey,))
-    users = c.fetchall()
-    conn.close()
+    users = load_manageable_users(current_sortkey)
 
     if not users:
         st.info("No deletable users available.")
         return
 
     with st.expander(title, expanded=False):
-        user_list = [f"{u[0]}  ·  {u[1]}" for u in users]
+        user_list = [f"{u[0]}  ·  {u[3]}" for u in users]
         selected_user = st.selectbox("Select user to delete", user_list)
 
         if st.button("Delete user"):
             username = selected_user.split("·")[0].strip()
-            conn = sqlite3.connect(DB_USERS)
-            c = conn.cursor()
-            c.execute("DELETE FROM users WHERE username = ?", (username,))
-            conn.commit()
-            conn.close()
-            st.success(f"✅ User '{username}' has been deleted.")
-            time.sleep(2)
+            del_user(username)
+            flash(f"User '{username}' has been deleted.")
             st.rerun()
 
 ### Dropdown for manager page to edit existing person ###
@@ -315,19 +288,7 @@ def edit_user_dropdown(title: str = "Edit user"):
 
     current_sortkey = st.session_state["role_sortkey"]
 
-    conn = sqlite3.connect(DB_USERS)
-    c = conn.cursor()
-
-    c.execute("""
-        SELECT u.username, u.email, u.password, u.role
-        FROM users u
-        JOIN roles r ON u.role = r.role
-        WHERE r.sortkey < ? 
-        AND u.manager_ID = ?
-        ORDER BY r.sortkey DESC
-    """, (current_sortkey, st.session_state["user_ID"]))
-    users = c.fetchall()
-    conn.close()
+    users = load_manageable_users(current_sortkey, st.session_state["user_ID"])
 
     if not users:
         st.info("No editable users available.")
@@ -337,11 +298,11 @@ def edit_user_dropdown(title: str = "Edit user"):
         user_list = [u[0] for u in users]
         selected_user = st.selectbox("Select user to edit", user_list)
 
-        conn = sqlite3.connect(DB_USERS)
-        c = conn.cursor()
-        c.execute("SELECT username, password, email, role FROM users WHERE username = ?", (selected_user,))
-        user_data = c.fetchone()
-        conn.close()
+        rows = cached_query(
+            "SELECT username, password, email, role FROM users WHERE username = ?", (selected_user,),
+            tables=("users",)
+        )
+        user_data = rows[0] if rows else None
 
         if not user_data:
             st.warning("User not found.")
@@ -361,18 +322,13 @@ def edit_user_dropdown(title: str = "Edit user"):
             submitted = st.form_submit_button("Save changes")
 
         if submitted:
-            conn = sqlite3.connect(DB_USERS)
-            c = conn.cursor()
-            c.execute("""
+            write_sql("""
                 UPDATE users
                 SET username = ?, password = ?, email = ?, role = ?
                 WHERE username = ?
-            """, (new_username, new_password, new_email, new_role, username))
-            conn.commit()
-            conn.close()
+            """, (new_username, new_password, new_email, new_role, username), tables=("users",))
 
-            st.success(f"✅ User '{username}' updated successfully.")
-            time.sleep (2)
+            flash(f"User '{username}' updated successfully.")
             st.rerun()
 
 ### Dropdown for Admin page to edit existing person ###
@@ -383,18 +339,7 @@ def edit_user_dropdown_admin(title: str = "Edit user"):
 
     current_sortkey = st.session_state["role_sortkey"]
 
-    conn = sqlite3.connect(DB_USERS)
-    c = conn.cursor()
-
-    c.execute("""
-        SELECT u.username, u.email, u.password, u.role, u.manager_ID
-        FROM users u
-        JOIN roles r ON u.role = r.role
-        WHERE r.sortkey < ?
-        ORDER BY r.sortkey DESC
-    """, (current_sortkey,))
-    users = c.fetchall()
-    conn.close()
+    users = load_manageable_users(current_sortkey)
 
     if not users:
         st.info("No editable users available.")
@@ -404,16 +349,12 @@ def edit_user_dropdown_admin(title: str = "Edit user"):
         user_list = [u[0] for u in users]
         selected_user = st.selectbox("Select user to edit", user_list)
 
-        conn = sqlite3.connect(DB_USERS)
-        c = conn.cursor()
-
-        c.execute("""
+        rows = cached_query("""
             SELECT username, password, email, role, manager_ID
             FROM users
             WHERE username = ?
-        """, (selected_user,))
-        user_data = c.fetchone()
-        conn.close()
+        """, (selected_user,), tables=("users",))
+        user_data = rows[0] if rows else None
 
         if not user_data:
             st.warning("User not found.")
@@ -434,23 +375,27 @@ def edit_user_dropdown_admin(title: str = "Edit user"):
             submitted = st.form_submit_button("Save changes")
 
         if submitted:
-            conn = sqlite3.connect(DB_USERS)
-            c = conn.cursor()
-
-            c.execute("""
-                UPDATE users
-                SET username = ?, password = ?, email = ?, role = ?, manager_ID = ?
-                WHERE username = ?
-            """, (
-                new_username, new_password, new_email,
-                new_role, new_manager_ID, username
-            ))
+            new_manager_ID = new_manager_ID.strip()
+            if new_manager_ID in ("", "None"):
+                new_manager_ID = None
+            elif not new_manager_ID.isdigit():
+                st.error("Manager ID has to be an integer")
+                return
 
-            conn.commit()
-            conn.close()
+            try:
+                write_sql("""
+                    UPDATE users
+                    SET username = ?, password = ?, email = ?, role = ?, manager_ID = ?
+                    WHERE username = ?
+                """, (
+                    new_username, new_password, new_email,
+                    new_role, new_manager_ID, username
+                ), tables=("users",))
+            except sqlite3.IntegrityError as e:
+                st.error(f"Update failed: {e}")
+                return
 
-            st.success(f"✅ User '{username}' updated successfully.")
-            time.sleep(1.5)
+            flash(f"User '{username}' updated successfully.")
             st.rerun()
 
 ### Dropdown for main page to register as manager ###
@@ -478,28 +423,22 @@ def register_main(title: str = "Register as manager"):
             role = "Manager"
 
             try:
-                conn = sqlite3.connect(DB_USERS)
-                c = conn.cursor()
-
-                c.execute(
-                    "INSERT INTO users (username, password, email, role) VALUES (?, ?, ?, ?)",
-                    (username, password, email, role)
-                )
-                conn.commit()
-
-                c.execute("SELECT user_ID FROM users WHERE username = ?", (username,))
-                new_user_id = c.fetchone()[0]
-
-                c.execute(
-                    "UPDATE users SET manager_ID = ? WHERE user_ID = ?",
-                    (new_user_id, new_user_id)
-                )
-                conn.commit()
-
-                conn.close()
-
-                st.success(f"✅ Manager '{username}' was successfully added. You can now log in.")
-                time.sleep(2)
+                def insert_manager(conn):
+                    c = conn.cursor()
+                    c.execute(
+                        "INSERT INTO users (username, password, email, role) VALUES (?, ?, ?, ?)",
+                        (username, password, email, role)
+                    )
+                    new_user_id = c.lastrowid
+
+                    c.execute(
+                        "UPDATE users SET manager_ID = ? WHERE user_ID = ?",
+                        (new_user_id, new_user_id)
+                    )
+
+                write(insert_manager, tables=("users",))
+
+                flash(f"Manager '{username}' was successfully added. You can now log in.")
                 st.rerun()
 
             except sqlite3.IntegrityError:
@@ -515,12 +454,12 @@ def edit_own_profile(title: str = "My profile"):
 
     current_user = st.session_state["username"]
 
-    conn = connect()
-    c = conn.cursor()
-    c.execute("SELECT username, email, password, role FROM users WHERE username = ?", (current_user,))
-    row = c.fetchone()
+    rows = cached_query(
+        "SELECT username, email, password, role FROM users WHERE username = ?", (current_user,),
+        tables=("users",)
+    )
+    row = rows[0] if rows else None
     if not row:
-        conn.close()
         st.error("User not found.")
         return
 
@@ -540,12 +479,10 @@ def edit_own_profile(title: str = "My profile"):
         submitted = st.form_submit_button("Safe changes")
 
     if not submitted:
-        conn.close()
         return
 
     if pw1 or pw2:
         if pw1 != pw2:
-            conn.close()
             st.error("Passwörter stimmen nicht überein.")
             return
         new_password = pw1
@@ -553,41 +490,44 @@ def edit_own_profile(title: str = "My profile"):
         new_password = stored_pw 
 
     try:
-        c.execute("""
+        write_sql("""
             UPDATE users
                SET username = ?, email = ?, password = ?
              WHERE username = ?
-        """, (new_username, new_email, new_password, username))
-        conn.commit()
+        """, (new_username, new_email, new_password, username), tables=("users",))
     except sqlite3.IntegrityError:
-        conn.close()
         st.error("User exists already.")
         return
-    finally:
-        conn.close()
 
     if new_username != username:
         st.session_state["username"] = new_username
 
-    st.success("Profile has been updated")
+    flash("Profile has been updated")
     st.rerun()
 
 ### Creates table for admin dashboard to see all registered managers/users ###
-def get_users_under_me() -> pd.DataFrame | None:
+# records=True returns a list of dicts instead of a DataFrame, without importing pandas.
+def get_users_under_me(records: bool = False) -> "pandas.DataFrame | list | None":
     if "role_sortkey" not in st.session_state:
         return None
 
     current = st.session_state["role_sortkey"]
-    conn = sqlite3.connect(DB_USERS)
-    c = conn.cursor()
-    c.execute("""
-        SELECT u.username, u.email, u.role, r.sortkey, u.manager_ID
+    #team_size counts everyone below the user, over all levels: one pass over user_closure
+    #grouped by manager, joined back instead of a count per listed user
+    rows = cached_query("""
+        SELECT u.username, u.email, u.role, r.sortkey, u.manager_ID, COALESCE(c.team_size, 0)
         FROM users u
         JOIN roles r ON u.role = r.role
+        LEFT JOIN (
+            SELECT ancestor_ID, COUNT(*) AS team_size FROM user_closure WHERE depth > 0 GROUP BY ancestor_ID
+        ) c ON c.ancestor_ID = u.user_ID
         WHERE r.sortkey < ?
         ORDER BY r.sortkey DESC, u.username
-    """, (current,))
-    rows = c.fetchall()
-    conn.close()
-
-    return pd.DataFrame(rows, columns=["username", "email", "role", "sortkey", "manager_ID"])
\ No newline at end of file
+    """, (current,), tables=("users", "roles"))
+
+    columns = ["username", "email", "role", "sortkey", "manager_ID", "team_size"]
+    if records:
+        return as_records(rows, columns)
+    #pandas takes about half a second to import, only pay for it when a DataFrame is asked for
+    import pandas as pd
+    return pd.DataFrame(rows, columns=columns)
\ No newline at end of file
@@ -1,72 +1,39 @@
 ##EMPLOYEE OVERVIEW PAGE FUNCTIONS####
-import sqlite3
-import sys
-import streamlit as st
-import pandas as pd
-from datetime import date
-from pathlib import Path
-
-DB_PATH = "db/users.db"
-DB_PATH_TRIPS = "db/trips.db"
-DB_PATH_USER_TRIPS = "db/user_trips.db"
-
-# Add parent directory to path
-sys.path.insert(0, str(Path(__file__).parent.parent))
-
-from db.db_functions_trips import get_user_trips, create_trip_table
-from db.db_functions_users import edit_own_profile
-
+# Only definitions, importing this module runs no Streamlit calls and no queries.
 import streamlit as st
+from db.db_cache import as_records
+from db.db_functions_trips import get_user_trips
 from db.db_functions_users import edit_own_profile
-st.set_page_config(page_title="User Dashboard", layout="wide")
-st.title("User Dashboard")
-
-""" Access control, so only users can access this page """
-if "role" not in st.session_state or st.session_state["role"] != "User":
-    st.error("Access denied. Please log in as User.")
-    st.stop()
-
-
-left, right = st.columns([4, 2], gap="large")
-with left:
-    st.subheader("Trip-Overview")
-
-
-with right:
-    edit_own_profile()
-
-
-### Connecting to the database trips.db ###
-def connect():
-    return sqlite3.connect(DB_PATH, DB_PATH_TRIPS, DB_PATH_USER_TRIPS)
-
-### Match database to signed in user ###
-
-if "user_id" not in st.session_state:
-    st.error("No employee is logged in.")
-else:
-    user_id = st.session_state["user_id"]
-    user_trips_df = get_user_trips(user_id)
-
-    if user_trips_df.empty:
-        st.info("You have no trips assigned yet.")
-    else:
-        st.dataframe(user_trips_df, use_container_width=True)
-
-
-### Create trips table for specific user###
-def create_trip_table():
-    conn = connect()
-    conn.execute("PRAGMA foreign_keys = ON;")
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS trips (
-                        trip_ID INTEGER NOT NULL UNIQUE PRIMARY KEY AUTOINCREMENT,
-                        destination TEXT NOT NULL,
-                        start_date TEXT,
-                        end_date TEXT, 
-                        occasion TEXT
+from db.db_functions_budget import format_amount
+
+TRIP_COLUMNS = ["destination", "date_start", "date_end", "occasion", "status", "budget"]
+
+### The signed in user's trips as records, newest first, None when nobody is signed in ###
+def load_my_trips(date_from=None, date_to=None) -> list | None:
+    user_ID = st.session_state.get("user_ID")
+    if user_ID is None:
+        return None
+    return as_records(
+        [(t[1], t[2], t[3], t[4], t[5], format_amount(t[6])) for t in get_user_trips(user_ID, date_from, date_to)],
+        TRIP_COLUMNS
     )
-    """)
-    conn.commit()
-    conn.close()
\ No newline at end of file
+
+### Trip overview plus profile editing for the signed in user ###
+def user_trips_overview():
+    if st.session_state.get("role") != "User":
+        st.error("Access denied. Please log in as User.")
+        return
+
+    left, right = st.columns([4, 2], gap="large")
+    with left:
+        st.subheader("Trip-Overview")
+        trips = load_my_trips()
+        if trips is None:
+            st.error("No employee is logged in.")
+        elif not trips:
+            st.info("You have no trips assigned yet.")
+        else:
+            st.dataframe(trips, hide_index=True, use_container_width=True)
+
+    with right:
+        edit_own_profile()
@@ -0,0 +1,264 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+### Statement timing for every connection the db layer opens ###
+# open_connection() creates InstrumentedConnection objects, whose cursors time each
+# execute/executemany plus the fetches that follow. Statements are aggregated per
+# fingerprint (the SQL with literals and IN lists normalised), attributed to the page
+# that called begin_rerun() in the current thread, and logged when slower than SLOW_QUERY_MS.
+# Work handed to another thread (the db writer) takes current_rerun() along and runs
+# inside attributed_to(), so its statements count for the page that asked for them.
+ENABLED = os.environ.get("TEAMVERSION_DB_INSTRUMENT", "1") != "0"
+SLOW_QUERY_MS = float(os.environ.get("TEAMVERSION_DB_SLOW_MS", "100"))
+SLOW_LOG = os.environ.get("TEAMVERSION_DB_SLOW_LOG")
+KEEP_RERUNS = 200
+KEEP_SLOW = 200
+ITERATION_BATCH = 1000
+
+log = logging.getLogger("teamversion.db.slow")
+if SLOW_LOG:
+    _handler = logging.FileHandler(SLOW_LOG)
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.WARNING)
+
+_lock = threading.Lock()
+_local = threading.local()
+_fingerprints = {}
+_reruns = deque(maxlen=KEEP_RERUNS)
+_slow = deque(maxlen=KEEP_SLOW)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+### Same fingerprint for statements that only differ in literals, IN list length or layout ###
+@lru_cache(maxsize=1024)
+def fingerprint(sql: str) -> str:
+    text = _STRING.sub("?", sql)
+    text = _NUMBER.sub("?", text)
+    text = _IN_LIST.sub("(?+)", text)
+    return _SPACE.sub(" ", text).strip()
+
+
+### Starts the per-rerun summary of the calling page; call at the top of every page ###
+def begin_rerun(page: str):
+    summary = {
+        "page": page,
+        "started": time.strftime("%H:%M:%S"),
+        "queries": 0,
+        "rows": 0,
+        "db_ms": 0.0,
+        "slow": 0,
+    }
+    _local.rerun = summary
+    with _lock:
+        _reruns.append(summary)
+
+
+### The summary this thread's statements are added to, None outside a rerun ###
+def current_rerun():
+    return getattr(_local, "rerun", None)
+
+
+### Adds this thread's statements to `rerun`, a current_rerun() of another thread, until the block ends ###
+@contextmanager
+def attributed_to(rerun):
+    previous = getattr(_local, "rerun", None)
+    _local.rerun = rerun
+    try:
+        yield
+    finally:
+        _local.rerun = previous
+
+
+def _current_page() -> str:
+    rerun = getattr(_local, "rerun", None)
+    return rerun["page"] if rerun else threading.current_thread().name
+
+
+### Timing of one statement, extended by the fetches that follow it ###
+class _Statement:
+    __slots__ = ("sql", "params", "page", "ms", "rows", "logged")
+
+    def __init__(self, sql: str, params: int):
+        self.sql = sql
+        self.params = params
+        self.page = _current_page()
+        self.ms = 0.0
+        self.rows = 0
+        self.logged = False
+
+    def add(self, ms: float, rows: int = 0, call: bool = False):
+        self.ms += ms
+        self.rows += rows
+        key = fingerprint(self.sql)
+        rerun = getattr(_local, "rerun", None)
+        with _lock:
+            stats = _fingerprints.get(key)
+            if stats is None:
+                stats = _fingerprints[key] = {"calls": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0, "pages": set()}
+            stats["calls"] += call
+            stats["rows"] += rows
+            stats["total_ms"] += ms
+            stats["max_ms"] = max(stats["max_ms"], self.ms)
+            stats["pages"].add(self.page)
+            if rerun is not None:
+                rerun["queries"] += call
+                rerun["rows"] += rows
+                rerun["db_ms"] += ms
+        if self.ms >= SLOW_QUERY_MS and not self.logged:
+            self.logged = True
+            self._log_slow(rerun)
+
+    def _log_slow(self, rerun):
+        entry = {
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "page": self.page,
+            "ms": round(self.ms, 2),
+            "params": self.params,
+            "rows": self.rows,
+            "fingerprint": fingerprint(self.sql),
+        }
+        with _lock:
+            _slow.append(entry)
+            if rerun is not None:
+                rerun["slow"] += 1
+        log.warning("slow query %.1f ms page=%s params=%d: %s", self.ms, self.page, self.params, entry["fingerprint"])
+
+
+def _param_count(params) -> int:
+    try:
+        return len(params)
+    except TypeError:
+        return 0
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    _statement = None
+    #iteration is accounted in batches, taking the stats lock per row would cost more than the row
+    _pending_ms = 0.0
+    _pending_rows = 0
+
+    def _run(self, method, sql, params, count: int):
+        if self._pending_rows:
+            self._flush_pending(time.perf_counter())
+        statement = _Statement(sql, count)
+        started = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            self._statement = statement
+            rows = self.rowcount if self.rowcount > 0 else 0
+            statement.add((time.perf_counter() - started) * 1000, rows, call=True)
+
+    def execute(self, sql, params=()):
+        return self._run(super().execute, sql, params, _param_count(params))
+
+    def executemany(self, sql, seq_of_params):
+        if not isinstance(seq_of_params, (list, tuple)):
+            seq_of_params = list(seq_of_params)
+        return self._run(super().executemany, sql, seq_of_params, sum(_param_count(p) for p in seq_of_params))
+
+    def _fetched(self, started: float, rows: int):
+        if self._statement is not None:
+            self._statement.add((time.perf_counter() - started) * 1000, rows)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._flush_pending(started)
+            raise
+        self._pending_ms += (time.perf_counter() - started) * 1000
+        self._pending_rows += 1
+        if self._pending_rows >= ITERATION_BATCH:
+            self._flush_pending(time.perf_counter())
+        return row
+
+    def _flush_pending(self, started: float):
+        if self._statement is not None:
+            self._statement.add(self._pending_ms + (time.perf_counter() - started) * 1000, self._pending_rows)
+        self._pending_ms = 0.0
+        self._pending_rows = 0
+
+
+### Connection whose execute()/cursor() hand out InstrumentedCursor objects ###
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+### Connection class for sqlite3.connect, the plain one when instrumentation is switched off ###
+def connection_factory():
+    return InstrumentedConnection if ENABLED else sqlite3.Connection
+
+
+def recent_reruns() -> list:
+    with _lock:
+        return [{**r, "db_ms": round(r["db_ms"], 2)} for r in reversed(_reruns)]
+
+
+def slow_queries() -> list:
+    with _lock:
+        return list(reversed(_slow))
+
+
+### Fingerprints ordered by total time spent in them ###
+def top_queries(limit: int = 20) -> list:
+    with _lock:
+        rows = [
+            {
+                "fingerprint": key,
+                "calls": s["calls"],
+                "rows": s["rows"],
+                "total_ms": round(s["total_ms"], 2),
+                "avg_ms": round(s["total_ms"] / s["calls"], 3) if s["calls"] else None,
+                "max_ms": round(s["max_ms"], 2),
+                "pages": ", ".join(sorted(s["pages"])),
+            }
+            for key, s in _fingerprints.items()
+        ]
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return rows[:limit]
+
+
+def reset_stats():
+    with _lock:
+        _fingerprints.clear()
+        _reruns.clear()
+        _slow.clear()
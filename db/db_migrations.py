@@ -0,0 +1,835 @@
+import threading
+from datetime import date, datetime
+from db import db_connection
+from db.db_connection import connection, transaction
+from db.db_cache import bump_version
+
+### Schema steps, applied in order and recorded in schema_version ###
+# Every step runs exactly once per database. Never edit a step that has shipped,
+# append a new one instead.
+
+def _base_tables(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        password TEXT NOT NULL,
+        email TEXT,
+        role TEXT NOT NULL,
+        manager_ID INTEGER,
+        FOREIGN KEY (role) REFERENCES roles (role)
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS roles (
+        role TEXT PRIMARY KEY,
+        sortkey INTEGER NOT NULL
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS trips (
+                        trip_ID INTEGER NOT NULL UNIQUE PRIMARY KEY AUTOINCREMENT,
+                        destination TEXT NOT NULL,
+                        start_date TEXT,
+                        end_date TEXT,
+                        occasion TEXT
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_trips (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        trip_ID INTEGER NOT NULL,
+                        user_ID INTEGER NOT NULL,
+                        UNIQUE (user_ID, trip_ID),
+                        FOREIGN KEY(trip_ID) REFERENCES trips(trip_ID) ON DELETE CASCADE,
+                        FOREIGN KEY(user_ID) REFERENCES users(user_ID) ON DELETE CASCADE
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_user_trips_trip ON user_trips(trip_ID);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_user_trips_user ON user_trips(user_ID);")
+    #keyset pagination of the trip overview walks this index
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trips_start ON trips(start_date, trip_ID);")
+
+### databases created before manager_ID existed ###
+def _users_manager_id(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(users)")]
+    if "manager_ID" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN manager_ID INTEGER")
+
+def _seed_roles(conn):
+    conn.executemany("""
+    INSERT OR IGNORE INTO roles (role, sortkey)
+    VALUES (?, ?)
+    """, [
+        ("Administrator", 3),
+        ("Manager", 2),
+        ("User", 1)
+    ])
+
+### dummies to log in with, formerly added by main.py on every rerun ###
+def _seed_demo_users(conn):
+    conn.executemany("""
+    INSERT OR IGNORE INTO users (username, password, email, role)
+    VALUES (?, ?, ?, ?)
+    """, [
+        ("Admin", "123", "a@gmail.com", "Administrator"),
+        ("Manager", "123", "manager@gmail.com", "Manager"),
+        ("User", "123", "user@gmail.com", "User")
+    ])
+
+### date-range lookups of the employee dashboard ###
+def _trip_date_index(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trips_end_start ON trips(end_date, start_date);")
+
+### the manager who planned a trip, for per-manager import/export ###
+def _trips_manager_id(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(trips)")]
+    if "manager_ID" not in columns:
+        conn.execute("ALTER TABLE trips ADD COLUMN manager_ID INTEGER REFERENCES users(user_ID) ON DELETE SET NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trips_manager ON trips(manager_ID, start_date);")
+
+### org hierarchy as a closure table, one row per (ancestor, descendant) pair including self ###
+# Kept in sync with users.manager_ID by triggers, so every write path (forms, CSV import,
+# scripts) maintains it. A user whose manager_ID is their own user_ID is a root.
+def _user_closure(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_closure (
+        ancestor_ID INTEGER NOT NULL,
+        descendant_ID INTEGER NOT NULL,
+        depth INTEGER NOT NULL,
+        PRIMARY KEY (ancestor_ID, descendant_ID)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_user_closure_descendant ON user_closure(descendant_ID, depth);")
+
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_users_closure_insert AFTER INSERT ON users
+    BEGIN
+        INSERT INTO user_closure (ancestor_ID, descendant_ID, depth) VALUES (NEW.user_ID, NEW.user_ID, 0);
+        INSERT INTO user_closure (ancestor_ID, descendant_ID, depth)
+        SELECT ancestor_ID, NEW.user_ID, depth + 1 FROM user_closure
+        WHERE descendant_ID = NEW.manager_ID AND NEW.manager_ID != NEW.user_ID;
+    END
+    """)
+
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_users_closure_cycle BEFORE UPDATE OF manager_ID ON users
+    WHEN NEW.manager_ID != NEW.user_ID AND NEW.manager_ID IN (
+        SELECT descendant_ID FROM user_closure WHERE ancestor_ID = NEW.user_ID
+    )
+    BEGIN
+        SELECT RAISE(ABORT, 'manager_ID would make the user their own manager');
+    END
+    """)
+
+    #moving a user moves their whole subtree: drop the paths from the old ancestors, add the new ones
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_users_closure_move AFTER UPDATE OF manager_ID ON users
+    WHEN OLD.manager_ID IS NOT NEW.manager_ID
+    BEGIN
+        DELETE FROM user_closure
+        WHERE descendant_ID IN (SELECT descendant_ID FROM user_closure WHERE ancestor_ID = NEW.user_ID)
+        AND ancestor_ID NOT IN (SELECT descendant_ID FROM user_closure WHERE ancestor_ID = NEW.user_ID);
+        INSERT INTO user_closure (ancestor_ID, descendant_ID, depth)
+        SELECT a.ancestor_ID, d.descendant_ID, a.depth + d.depth + 1
+        FROM user_closure a, user_closure d
+        WHERE a.descendant_ID = NEW.manager_ID AND d.ancestor_ID = NEW.user_ID
+        AND NEW.manager_ID != NEW.user_ID;
+    END
+    """)
+
+    #the users below a deleted user become roots of their own subtrees
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_users_closure_delete AFTER DELETE ON users
+    BEGIN
+        DELETE FROM user_closure
+        WHERE ancestor_ID IN (SELECT ancestor_ID FROM user_closure WHERE descendant_ID = OLD.user_ID)
+        AND descendant_ID IN (SELECT descendant_ID FROM user_closure WHERE ancestor_ID = OLD.user_ID);
+    END
+    """)
+
+    #backfill from the manager_ID chains, capped in case old data contains a cycle
+    conn.execute("DELETE FROM user_closure")
+    conn.execute("""
+    INSERT OR IGNORE INTO user_closure (ancestor_ID, descendant_ID, depth)
+    WITH RECURSIVE chain(ancestor_ID, descendant_ID, depth) AS (
+        SELECT user_ID, user_ID, 0 FROM users
+        UNION ALL
+        SELECT m.user_ID, c.descendant_ID, c.depth + 1
+        FROM chain c
+        JOIN users u ON u.user_ID = c.ancestor_ID
+        JOIN users m ON m.user_ID = u.manager_ID
+        WHERE u.manager_ID != u.user_ID AND c.depth < 32
+    )
+    SELECT ancestor_ID, descendant_ID, MIN(depth) FROM chain GROUP BY ancestor_ID, descendant_ID
+    """)
+
+### full-text indexes over trips and users, external content kept in sync by triggers ###
+# remove_diacritics folds "Zürich" to "zurich", prefix='2 3' keeps short prefix queries fast.
+def _fts_search(conn):
+    for table, key, columns in (
+        ("trips", "trip_ID", ("destination", "occasion")),
+        ("users", "user_ID", ("username", "email")),
+    ):
+        fts = f"{table}_fts"
+        cols = ", ".join(columns)
+        new = ", ".join(f"NEW.{c}" for c in columns)
+        old = ", ".join(f"OLD.{c}" for c in columns)
+        conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {cols}, content='{table}', content_rowid='{key}',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO {fts} (rowid, {cols}) VALUES (NEW.{key}, {new});
+        END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', OLD.{key}, {old});
+        END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_update AFTER UPDATE OF {cols} ON {table}
+        BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', OLD.{key}, {old});
+            INSERT INTO {fts} (rowid, {cols}) VALUES (NEW.{key}, {new});
+        END
+        """)
+        conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+### trip statistics per user and per planning manager, maintained by triggers ###
+# Totals plus buckets per start month, so "upcoming" and "this year" read a handful of rows.
+# Increments upsert, decrements update rows that exist already. A deleted trip is settled
+# before the delete, the links removed by ON DELETE CASCADE no longer see their trip.
+def _trip_stats(conn):
+    conn.execute("""
+    CREATE VIEW IF NOT EXISTS v_trip_days AS
+    SELECT trip_ID, manager_ID, substr(start_date, 1, 7) AS month,
+           COALESCE(CAST(julianday(COALESCE(end_date, start_date)) - julianday(start_date) + 1 AS INTEGER), 1) AS days
+    FROM trips
+    WHERE start_date IS NOT NULL
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS trip_stats_user (
+        user_ID INTEGER PRIMARY KEY,
+        trips INTEGER NOT NULL DEFAULT 0,
+        travel_days INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS trip_stats_user_month (
+        user_ID INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        trips INTEGER NOT NULL DEFAULT 0,
+        travel_days INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_ID, month)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS trip_stats_manager (
+        manager_ID INTEGER PRIMARY KEY,
+        trips INTEGER NOT NULL DEFAULT 0,
+        participants INTEGER NOT NULL DEFAULT 0,
+        travel_days INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS trip_stats_manager_month (
+        manager_ID INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        trips INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (manager_ID, month)
+    ) WITHOUT ROWID
+    """)
+
+    #a participant was added
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_link_insert AFTER INSERT ON user_trips
+    BEGIN
+        INSERT INTO trip_stats_user (user_ID, trips, travel_days)
+        SELECT NEW.user_ID, 1, days FROM v_trip_days WHERE trip_ID = NEW.trip_ID
+        ON CONFLICT(user_ID) DO UPDATE SET trips = trips + 1, travel_days = travel_days + excluded.travel_days;
+        INSERT INTO trip_stats_user_month (user_ID, month, trips, travel_days)
+        SELECT NEW.user_ID, month, 1, days FROM v_trip_days WHERE trip_ID = NEW.trip_ID
+        ON CONFLICT(user_ID, month) DO UPDATE SET trips = trips + 1, travel_days = travel_days + excluded.travel_days;
+        INSERT INTO trip_stats_manager (manager_ID, participants, travel_days)
+        SELECT manager_ID, 1, days FROM v_trip_days WHERE trip_ID = NEW.trip_ID AND manager_ID IS NOT NULL
+        ON CONFLICT(manager_ID) DO UPDATE SET participants = participants + 1, travel_days = travel_days + excluded.travel_days;
+    END
+    """)
+
+    #a participant was removed from a trip that still exists
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_link_delete AFTER DELETE ON user_trips
+    WHEN EXISTS (SELECT 1 FROM v_trip_days WHERE trip_ID = OLD.trip_ID)
+    BEGIN
+        UPDATE trip_stats_user
+        SET trips = trips - 1, travel_days = travel_days - (SELECT days FROM v_trip_days WHERE trip_ID = OLD.trip_ID)
+        WHERE user_ID = OLD.user_ID;
+        UPDATE trip_stats_user_month
+        SET trips = trips - 1, travel_days = travel_days - (SELECT days FROM v_trip_days WHERE trip_ID = OLD.trip_ID)
+        WHERE user_ID = OLD.user_ID AND month = (SELECT month FROM v_trip_days WHERE trip_ID = OLD.trip_ID);
+        UPDATE trip_stats_manager
+        SET participants = participants - 1, travel_days = travel_days - (SELECT days FROM v_trip_days WHERE trip_ID = OLD.trip_ID)
+        WHERE manager_ID = (SELECT manager_ID FROM v_trip_days WHERE trip_ID = OLD.trip_ID);
+    END
+    """)
+
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_trip_insert AFTER INSERT ON trips
+    WHEN NEW.start_date IS NOT NULL AND NEW.manager_ID IS NOT NULL
+    BEGIN
+        INSERT INTO trip_stats_manager (manager_ID, trips) VALUES (NEW.manager_ID, 1)
+        ON CONFLICT(manager_ID) DO UPDATE SET trips = trips + 1;
+        INSERT INTO trip_stats_manager_month (manager_ID, month, trips) VALUES (NEW.manager_ID, substr(NEW.start_date, 1, 7), 1)
+        ON CONFLICT(manager_ID, month) DO UPDATE SET trips = trips + 1;
+    END
+    """)
+
+    #settles the trip and all its participants while the links still exist
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_trip_delete BEFORE DELETE ON trips
+    WHEN OLD.start_date IS NOT NULL
+    BEGIN
+        UPDATE trip_stats_user
+        SET trips = trips - 1, travel_days = travel_days - (SELECT days FROM v_trip_days WHERE trip_ID = OLD.trip_ID)
+        WHERE user_ID IN (SELECT user_ID FROM user_trips WHERE trip_ID = OLD.trip_ID);
+        UPDATE trip_stats_user_month
+        SET trips = trips - 1, travel_days = travel_days - (SELECT days FROM v_trip_days WHERE trip_ID = OLD.trip_ID)
+        WHERE month = substr(OLD.start_date, 1, 7)
+        AND user_ID IN (SELECT user_ID FROM user_trips WHERE trip_ID = OLD.trip_ID);
+        UPDATE trip_stats_manager
+        SET trips = trips - 1,
+            participants = participants - (SELECT COUNT(*) FROM user_trips WHERE trip_ID = OLD.trip_ID),
+            travel_days = travel_days - (SELECT COUNT(*) FROM user_trips WHERE trip_ID = OLD.trip_ID)
+                                      * (SELECT days FROM v_trip_days WHERE trip_ID = OLD.trip_ID)
+        WHERE manager_ID = OLD.manager_ID;
+        UPDATE trip_stats_manager_month SET trips = trips - 1
+        WHERE manager_ID = OLD.manager_ID AND month = substr(OLD.start_date, 1, 7);
+    END
+    """)
+
+    #new dates or another manager: take the old values out, put the new ones in
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_trip_update AFTER UPDATE OF start_date, end_date, manager_ID ON trips
+    BEGIN
+        UPDATE trip_stats_user
+        SET trips = trips - 1,
+            travel_days = travel_days - COALESCE(CAST(julianday(COALESCE(OLD.end_date, OLD.start_date)) - julianday(OLD.start_date) + 1 AS INTEGER), 1)
+        WHERE OLD.start_date IS NOT NULL
+        AND user_ID IN (SELECT user_ID FROM user_trips WHERE trip_ID = OLD.trip_ID);
+        UPDATE trip_stats_user_month
+        SET trips = trips - 1,
+            travel_days = travel_days - COALESCE(CAST(julianday(COALESCE(OLD.end_date, OLD.start_date)) - julianday(OLD.start_date) + 1 AS INTEGER), 1)
+        WHERE month = substr(OLD.start_date, 1, 7)
+        AND user_ID IN (SELECT user_ID FROM user_trips WHERE trip_ID = OLD.trip_ID);
+        UPDATE trip_stats_manager
+        SET trips = trips - 1,
+            participants = participants - (SELECT COUNT(*) FROM user_trips WHERE trip_ID = OLD.trip_ID),
+            travel_days = travel_days - (SELECT COUNT(*) FROM user_trips WHERE trip_ID = OLD.trip_ID)
+                * COALESCE(CAST(julianday(COALESCE(OLD.end_date, OLD.start_date)) - julianday(OLD.start_date) + 1 AS INTEGER), 1)
+        WHERE OLD.start_date IS NOT NULL AND manager_ID = OLD.manager_ID;
+        UPDATE trip_stats_manager_month SET trips = trips - 1
+        WHERE manager_ID = OLD.manager_ID AND month = substr(OLD.start_date, 1, 7);
+
+        INSERT INTO trip_stats_user (user_ID, trips, travel_days)
+        SELECT ut.user_ID, 1, v.days FROM user_trips ut JOIN v_trip_days v ON v.trip_ID = ut.trip_ID
+        WHERE ut.trip_ID = NEW.trip_ID
+        ON CONFLICT(user_ID) DO UPDATE SET trips = trips + 1, travel_days = travel_days + excluded.travel_days;
+        INSERT INTO trip_stats_user_month (user_ID, month, trips, travel_days)
+        SELECT ut.user_ID, v.month, 1, v.days FROM user_trips ut JOIN v_trip_days v ON v.trip_ID = ut.trip_ID
+        WHERE ut.trip_ID = NEW.trip_ID
+        ON CONFLICT(user_ID, month) DO UPDATE SET trips = trips + 1, travel_days = travel_days + excluded.travel_days;
+        INSERT INTO trip_stats_manager (manager_ID, trips, participants, travel_days)
+        SELECT v.manager_ID, 1, n, n * v.days
+        FROM v_trip_days v, (SELECT COUNT(*) AS n FROM user_trips WHERE trip_ID = NEW.trip_ID)
+        WHERE v.trip_ID = NEW.trip_ID AND v.manager_ID IS NOT NULL
+        ON CONFLICT(manager_ID) DO UPDATE SET trips = trips + 1, participants = participants + excluded.participants,
+            travel_days = travel_days + excluded.travel_days;
+        INSERT INTO trip_stats_manager_month (manager_ID, month, trips)
+        SELECT manager_ID, month, 1 FROM v_trip_days WHERE trip_ID = NEW.trip_ID AND manager_ID IS NOT NULL
+        ON CONFLICT(manager_ID, month) DO UPDATE SET trips = trips + 1;
+    END
+    """)
+
+    #the cascades above already ran when this fires, only the user's own rows are left
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_user_delete AFTER DELETE ON users
+    BEGIN
+        DELETE FROM trip_stats_user WHERE user_ID = OLD.user_ID;
+        DELETE FROM trip_stats_user_month WHERE user_ID = OLD.user_ID;
+        DELETE FROM trip_stats_manager WHERE manager_ID = OLD.user_ID;
+        DELETE FROM trip_stats_manager_month WHERE manager_ID = OLD.user_ID;
+    END
+    """)
+
+    #backfill from the existing trips
+    for table in ("trip_stats_user", "trip_stats_user_month", "trip_stats_manager", "trip_stats_manager_month"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute("""
+    INSERT INTO trip_stats_user (user_ID, trips, travel_days)
+    SELECT ut.user_ID, COUNT(*), SUM(v.days) FROM user_trips ut JOIN v_trip_days v ON v.trip_ID = ut.trip_ID
+    GROUP BY ut.user_ID
+    """)
+    conn.execute("""
+    INSERT INTO trip_stats_user_month (user_ID, month, trips, travel_days)
+    SELECT ut.user_ID, v.month, COUNT(*), SUM(v.days) FROM user_trips ut JOIN v_trip_days v ON v.trip_ID = ut.trip_ID
+    GROUP BY ut.user_ID, v.month
+    """)
+    conn.execute("""
+    INSERT INTO trip_stats_manager (manager_ID, trips, participants, travel_days)
+    SELECT v.manager_ID, COUNT(*), SUM(COALESCE(l.n, 0)), SUM(COALESCE(l.n, 0) * v.days)
+    FROM v_trip_days v LEFT JOIN (SELECT trip_ID, COUNT(*) AS n FROM user_trips GROUP BY trip_ID) l ON l.trip_ID = v.trip_ID
+    WHERE v.manager_ID IS NOT NULL
+    GROUP BY v.manager_ID
+    """)
+    conn.execute("""
+    INSERT INTO trip_stats_manager_month (manager_ID, month, trips)
+    SELECT manager_ID, month, COUNT(*) FROM v_trip_days WHERE manager_ID IS NOT NULL
+    GROUP BY manager_ID, month
+    """)
+
+### trip status and budget, an append-only expense ledger and its running totals ###
+# Amounts are integer cents. The ledger is never updated or deleted from; a wrong entry
+# is corrected by booking the negative amount. Only deleting the trip (cascade) removes
+# entries, and a deleted user leaves their entries behind with user_ID NULL.
+# trip_expense_totals holds the sum per trip, trip_stats_user / trip_stats_manager
+# (migration 9) get the spent and budget sums, so reports never re-sum the ledger.
+TRIP_STATUSES = ("planned", "approved", "booked", "completed", "cancelled")
+
+def _trip_budgets(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(trips)")]
+    if "status" not in columns:
+        statuses = ", ".join(f"'{s}'" for s in TRIP_STATUSES)
+        conn.execute(f"ALTER TABLE trips ADD COLUMN status TEXT NOT NULL DEFAULT 'planned' CHECK (status IN ({statuses}))")
+    if "budget_cents" not in columns:
+        conn.execute("ALTER TABLE trips ADD COLUMN budget_cents INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trips_status ON trips(status, start_date);")
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS trip_expenses (
+        expense_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+        trip_ID INTEGER NOT NULL REFERENCES trips(trip_ID) ON DELETE CASCADE,
+        user_ID INTEGER REFERENCES users(user_ID) ON DELETE SET NULL,
+        amount_cents INTEGER NOT NULL,
+        category TEXT NOT NULL DEFAULT 'other',
+        note TEXT,
+        booked_by INTEGER,
+        booked_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trip_expenses_trip ON trip_expenses(trip_ID, user_ID);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trip_expenses_user ON trip_expenses(user_ID);")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS trip_expense_totals (
+        trip_ID INTEGER PRIMARY KEY,
+        spent_cents INTEGER NOT NULL DEFAULT 0,
+        entries INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    for table, column in (("trip_stats_user", "spent_cents"),
+                          ("trip_stats_manager", "budget_cents"),
+                          ("trip_stats_manager", "spent_cents")):
+        if column not in [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+
+    #append-only; the cascade of a trip delete runs after the trip row is gone
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_no_delete BEFORE DELETE ON trip_expenses
+    WHEN EXISTS (SELECT 1 FROM trips WHERE trip_ID = OLD.trip_ID)
+    BEGIN
+        SELECT RAISE(ABORT, 'trip_expenses is append-only, book a correction instead');
+    END
+    """)
+    #user_ID stays writable for ON DELETE SET NULL
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_no_update
+    BEFORE UPDATE OF expense_ID, trip_ID, amount_cents, category, note, booked_by, booked_at ON trip_expenses
+    BEGIN
+        SELECT RAISE(ABORT, 'trip_expenses is append-only, book a correction instead');
+    END
+    """)
+
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_insert AFTER INSERT ON trip_expenses
+    BEGIN
+        INSERT INTO trip_expense_totals (trip_ID, spent_cents, entries) VALUES (NEW.trip_ID, NEW.amount_cents, 1)
+        ON CONFLICT(trip_ID) DO UPDATE SET spent_cents = spent_cents + excluded.spent_cents, entries = entries + 1;
+        INSERT INTO trip_stats_user (user_ID, spent_cents)
+        SELECT NEW.user_ID, NEW.amount_cents WHERE NEW.user_ID IS NOT NULL
+        ON CONFLICT(user_ID) DO UPDATE SET spent_cents = spent_cents + excluded.spent_cents;
+        INSERT INTO trip_stats_manager (manager_ID, spent_cents)
+        SELECT manager_ID, NEW.amount_cents FROM trips WHERE trip_ID = NEW.trip_ID AND manager_ID IS NOT NULL
+        ON CONFLICT(manager_ID) DO UPDATE SET spent_cents = spent_cents + excluded.spent_cents;
+    END
+    """)
+
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_budget_trip_insert AFTER INSERT ON trips
+    WHEN NEW.manager_ID IS NOT NULL AND NEW.budget_cents IS NOT NULL
+    BEGIN
+        INSERT INTO trip_stats_manager (manager_ID, budget_cents) VALUES (NEW.manager_ID, NEW.budget_cents)
+        ON CONFLICT(manager_ID) DO UPDATE SET budget_cents = budget_cents + excluded.budget_cents;
+    END
+    """)
+
+    #a new budget or another manager: move the trip's budget and spending over
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_budget_trip_update AFTER UPDATE OF budget_cents, manager_ID ON trips
+    BEGIN
+        UPDATE trip_stats_manager
+        SET budget_cents = budget_cents - COALESCE(OLD.budget_cents, 0),
+            spent_cents = spent_cents - COALESCE((SELECT spent_cents FROM trip_expense_totals WHERE trip_ID = OLD.trip_ID), 0)
+        WHERE manager_ID = OLD.manager_ID;
+        INSERT INTO trip_stats_manager (manager_ID, budget_cents, spent_cents)
+        SELECT NEW.manager_ID, COALESCE(NEW.budget_cents, 0),
+               COALESCE((SELECT spent_cents FROM trip_expense_totals WHERE trip_ID = NEW.trip_ID), 0)
+        WHERE NEW.manager_ID IS NOT NULL
+        ON CONFLICT(manager_ID) DO UPDATE SET budget_cents = budget_cents + excluded.budget_cents,
+            spent_cents = spent_cents + excluded.spent_cents;
+    END
+    """)
+
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_budget_trip_delete BEFORE DELETE ON trips
+    BEGIN
+        UPDATE trip_stats_user
+        SET spent_cents = spent_cents - (SELECT SUM(e.amount_cents) FROM trip_expenses e
+                                         WHERE e.trip_ID = OLD.trip_ID AND e.user_ID = trip_stats_user.user_ID)
+        WHERE user_ID IN (SELECT user_ID FROM trip_expenses WHERE trip_ID = OLD.trip_ID);
+        UPDATE trip_stats_manager
+        SET budget_cents = budget_cents - COALESCE(OLD.budget_cents, 0),
+            spent_cents = spent_cents - COALESCE((SELECT spent_cents FROM trip_expense_totals WHERE trip_ID = OLD.trip_ID), 0)
+        WHERE manager_ID = OLD.manager_ID;
+        DELETE FROM trip_expense_totals WHERE trip_ID = OLD.trip_ID;
+    END
+    """)
+
+    #backfill from the existing budgets and ledger
+    conn.execute("DELETE FROM trip_expense_totals")
+    conn.execute("""
+    INSERT INTO trip_expense_totals (trip_ID, spent_cents, entries)
+    SELECT trip_ID, SUM(amount_cents), COUNT(*) FROM trip_expenses GROUP BY trip_ID
+    """)
+    conn.execute("UPDATE trip_stats_user SET spent_cents = 0")
+    conn.execute("""
+    INSERT INTO trip_stats_user (user_ID, spent_cents)
+    SELECT user_ID, SUM(amount_cents) FROM trip_expenses WHERE user_ID IS NOT NULL GROUP BY user_ID
+    ON CONFLICT(user_ID) DO UPDATE SET spent_cents = excluded.spent_cents
+    """)
+    conn.execute("UPDATE trip_stats_manager SET budget_cents = 0, spent_cents = 0")
+    conn.execute("""
+    INSERT INTO trip_stats_manager (manager_ID, budget_cents, spent_cents)
+    SELECT t.manager_ID, SUM(COALESCE(t.budget_cents, 0)), SUM(COALESCE(x.spent_cents, 0))
+    FROM trips t LEFT JOIN trip_expense_totals x ON x.trip_ID = t.trip_ID
+    WHERE t.manager_ID IS NOT NULL
+    GROUP BY t.manager_ID
+    ON CONFLICT(manager_ID) DO UPDATE SET budget_cents = excluded.budget_cents, spent_cents = excluded.spent_cents
+    """)
+
+### change feed: one row per insert, update and delete of the synced tables ###
+# Written by triggers, so the entry commits or rolls back together with the change itself.
+# seq comes from AUTOINCREMENT and is never reused, consumers keep the last seq they saw.
+# SQLite runs one write transaction at a time, so seq order is commit order and a consumer
+# never skips an entry that commits after a higher one.
+# data is the row after the change, old_data the row before (both JSON); passwords are left out.
+def _change_log(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_ID INTEGER NOT NULL,
+        op TEXT NOT NULL CHECK (op IN ('insert', 'update', 'delete')),
+        data TEXT,
+        old_data TEXT,
+        changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_change_log_row ON change_log(table_name, row_ID);")
+    for table, key, columns in (
+        ("users", "user_ID", ("username", "email", "role", "manager_ID")),
+        ("trips", "trip_ID", ("destination", "start_date", "end_date", "occasion", "manager_ID", "status", "budget_cents")),
+        ("user_trips", "id", ("trip_ID", "user_ID")),
+        ("trip_expenses", "expense_ID", ("trip_ID", "user_ID", "amount_cents", "category", "note", "booked_by", "booked_at")),
+    ):
+        new = "json_object(" + ", ".join(f"'{c}', NEW.{c}" for c in (key, *columns)) + ")"
+        old = "json_object(" + ", ".join(f"'{c}', OLD.{c}" for c in (key, *columns)) + ")"
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_log_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO change_log (table_name, row_ID, op, data) VALUES ('{table}', NEW.{key}, 'insert', {new});
+        END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_log_update AFTER UPDATE ON {table}
+        BEGIN
+            INSERT INTO change_log (table_name, row_ID, op, data, old_data) VALUES ('{table}', NEW.{key}, 'update', {new}, {old});
+        END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_log_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO change_log (table_name, row_ID, op, old_data) VALUES ('{table}', OLD.{key}, 'delete', {old});
+        END
+        """)
+
+### trip dates as integer day numbers, converted in place ###
+# start_day / end_day hold date.toordinal() of the day; start_date / end_date become virtual
+# ISO text columns generated from them, so readers keep working while writers set the day
+# numbers (see day_number). A trip without an end ends on its start day, so end_day is only
+# NULL together with start_day. Text that was no date becomes NULL, an end before the start
+# becomes the start day; end < start is rejected from then on.
+# All steps share one transaction with foreign keys on, where dropping and rebuilding trips
+# would cascade into user_trips and the ledger, so the columns are swapped with ALTER TABLE.
+# DROP COLUMN needs every index, view and trigger that reads the old columns gone first.
+JULIAN_ORDINAL = 1721424.5  #julianday() minus this is date.toordinal()
+
+#triggers that only read start_date / end_date, recreated unchanged from their saved SQL
+_TRIP_DATE_TRIGGERS = (
+    "trg_stats_link_insert", "trg_stats_link_delete", "trg_stats_trip_insert", "trg_stats_trip_delete",
+    "trg_trips_log_insert", "trg_trips_log_update", "trg_trips_log_delete",
+)
+
+### date, datetime or ISO text -> day number stored in trips, None for no date ###
+def day_number(value) -> int | None:
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        value = value.date()
+    if not isinstance(value, date):
+        value = date.fromisoformat(str(value).strip()[:10])
+    return value.toordinal()
+
+def iso_date(day: int | None) -> str | None:
+    return None if day is None else date.fromordinal(day).isoformat()
+
+#day number of an ISO text column, NULL for text that is no date; julianday() rolls
+#impossible days over ('2024-02-30' is March 1st), the round trip through date() catches them
+def _text_day(column: str) -> str:
+    return (f"CASE WHEN date(julianday({column})) = date({column}) "
+            f"THEN CAST(julianday({column}) - {JULIAN_ORDINAL} AS INTEGER) END")
+
+def _trip_day_numbers(conn):
+    names = ", ".join(f"'{name}'" for name in _TRIP_DATE_TRIGGERS)
+    saved = conn.execute(f"SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({names})").fetchall()
+    for name in (*_TRIP_DATE_TRIGGERS, "trg_stats_trip_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("DROP VIEW IF EXISTS v_trip_days")
+    for index in ("ix_trips_start", "ix_trips_end_start", "ix_trips_manager", "ix_trips_status"):
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+
+    conn.execute("ALTER TABLE trips ADD COLUMN start_day INTEGER")
+    conn.execute("ALTER TABLE trips ADD COLUMN end_day INTEGER CHECK (end_day >= start_day)")
+    conn.execute(f"UPDATE trips SET start_day = {_text_day('start_date')}")
+    conn.execute(f"""
+    UPDATE trips
+    SET end_day = MAX(start_day, COALESCE({_text_day('end_date')}, start_day))
+    WHERE start_day IS NOT NULL
+    """)
+    conn.execute("ALTER TABLE trips DROP COLUMN start_date")
+    conn.execute("ALTER TABLE trips DROP COLUMN end_date")
+    conn.execute(f"ALTER TABLE trips ADD COLUMN start_date TEXT GENERATED ALWAYS AS (date(start_day + {JULIAN_ORDINAL})) VIRTUAL")
+    conn.execute(f"ALTER TABLE trips ADD COLUMN end_date TEXT GENERATED ALWAYS AS (date(end_day + {JULIAN_ORDINAL})) VIRTUAL")
+
+    #keyset pagination, date windows (end_day >= from AND start_day <= to), per manager and status
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trips_start ON trips(start_day, trip_ID);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trips_end_start ON trips(end_day, start_day);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trips_manager ON trips(manager_ID, start_day);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trips_status ON trips(status, start_day);")
+    #a manager's direct reports by name (user directory, participant choices)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_users_manager ON users(manager_ID, username);")
+
+    conn.execute("""
+    CREATE VIEW IF NOT EXISTS v_trip_days AS
+    SELECT trip_ID, manager_ID, substr(start_date, 1, 7) AS month, end_day - start_day + 1 AS days
+    FROM trips
+    WHERE start_day IS NOT NULL
+    """)
+    for (sql,) in saved:
+        conn.execute(sql)
+
+    #dates or the manager changed: take the trip out with its old values, add it back with the new ones
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stats_trip_update AFTER UPDATE OF start_day, end_day, manager_ID ON trips
+    BEGIN
+        UPDATE trip_stats_user
+        SET trips = trips - 1, travel_days = travel_days - (OLD.end_day - OLD.start_day + 1)
+        WHERE OLD.start_day IS NOT NULL
+        AND user_ID IN (SELECT user_ID FROM user_trips WHERE trip_ID = OLD.trip_ID);
+        UPDATE trip_stats_user_month
+        SET trips = trips - 1, travel_days = travel_days - (OLD.end_day - OLD.start_day + 1)
+        WHERE month = substr(OLD.start_date, 1, 7)
+        AND user_ID IN (SELECT user_ID FROM user_trips WHERE trip_ID = OLD.trip_ID);
+        UPDATE trip_stats_manager
+        SET trips = trips - 1,
+            participants = participants - (SELECT COUNT(*) FROM user_trips WHERE trip_ID = OLD.trip_ID),
+            travel_days = travel_days - (SELECT COUNT(*) FROM user_trips WHERE trip_ID = OLD.trip_ID)
+                * (OLD.end_day - OLD.start_day + 1)
+        WHERE OLD.start_day IS NOT NULL AND manager_ID = OLD.manager_ID;
+        UPDATE trip_stats_manager_month SET trips = trips - 1
+        WHERE manager_ID = OLD.manager_ID AND month = substr(OLD.start_date, 1, 7);
+
+        INSERT INTO trip_stats_user (user_ID, trips, travel_days)
+        SELECT ut.user_ID, 1, v.days FROM user_trips ut JOIN v_trip_days v ON v.trip_ID = ut.trip_ID
+        WHERE ut.trip_ID = NEW.trip_ID
+        ON CONFLICT(user_ID) DO UPDATE SET trips = trips + 1, travel_days = travel_days + excluded.travel_days;
+        INSERT INTO trip_stats_user_month (user_ID, month, trips, travel_days)
+        SELECT ut.user_ID, v.month, 1, v.days FROM user_trips ut JOIN v_trip_days v ON v.trip_ID = ut.trip_ID
+        WHERE ut.trip_ID = NEW.trip_ID
+        ON CONFLICT(user_ID, month) DO UPDATE SET trips = trips + 1, travel_days = travel_days + excluded.travel_days;
+        INSERT INTO trip_stats_manager (manager_ID, trips, participants, travel_days)
+        SELECT v.manager_ID, 1, n, n * v.days
+        FROM v_trip_days v, (SELECT COUNT(*) AS n FROM user_trips WHERE trip_ID = NEW.trip_ID)
+        WHERE v.trip_ID = NEW.trip_ID AND v.manager_ID IS NOT NULL
+        ON CONFLICT(manager_ID) DO UPDATE SET trips = trips + 1, participants = participants + excluded.participants,
+            travel_days = travel_days + excluded.travel_days;
+        INSERT INTO trip_stats_manager_month (manager_ID, month, trips)
+        SELECT manager_ID, month, 1 FROM v_trip_days WHERE trip_ID = NEW.trip_ID AND manager_ID IS NOT NULL
+        ON CONFLICT(manager_ID, month) DO UPDATE SET trips = trips + 1;
+    END
+    """)
+
+    #trips whose text was no date or ended before it started count differently now, so the
+    #date-derived statistics are recounted; budgets and spending are left as they are
+    conn.execute("DELETE FROM trip_stats_user_month")
+    conn.execute("DELETE FROM trip_stats_manager_month")
+    conn.execute("UPDATE trip_stats_user SET trips = 0, travel_days = 0")
+    conn.execute("UPDATE trip_stats_manager SET trips = 0, participants = 0, travel_days = 0")
+    conn.execute("""
+    INSERT INTO trip_stats_user (user_ID, trips, travel_days)
+    SELECT ut.user_ID, COUNT(*), SUM(v.days) FROM user_trips ut JOIN v_trip_days v ON v.trip_ID = ut.trip_ID
+    GROUP BY ut.user_ID
+    ON CONFLICT(user_ID) DO UPDATE SET trips = excluded.trips, travel_days = excluded.travel_days
+    """)
+    conn.execute("""
+    INSERT INTO trip_stats_user_month (user_ID, month, trips, travel_days)
+    SELECT ut.user_ID, v.month, COUNT(*), SUM(v.days) FROM user_trips ut JOIN v_trip_days v ON v.trip_ID = ut.trip_ID
+    GROUP BY ut.user_ID, v.month
+    """)
+    conn.execute("""
+    INSERT INTO trip_stats_manager (manager_ID, trips, participants, travel_days)
+    SELECT v.manager_ID, COUNT(*), SUM(COALESCE(l.n, 0)), SUM(COALESCE(l.n, 0) * v.days)
+    FROM v_trip_days v LEFT JOIN (SELECT trip_ID, COUNT(*) AS n FROM user_trips GROUP BY trip_ID) l ON l.trip_ID = v.trip_ID
+    WHERE v.manager_ID IS NOT NULL
+    GROUP BY v.manager_ID
+    ON CONFLICT(manager_ID) DO UPDATE SET trips = excluded.trips, participants = excluded.participants,
+        travel_days = excluded.travel_days
+    """)
+    conn.execute("""
+    INSERT INTO trip_stats_manager_month (manager_ID, month, trips)
+    SELECT manager_ID, month, COUNT(*) FROM v_trip_days WHERE manager_ID IS NOT NULL
+    GROUP BY manager_ID, month
+    """)
+
+### trip days copied onto user_trips, for per-user date-range lookups ###
+# ix_user_trips_days orders every user's links by (end_day, start_day), so "trips of these
+# users overlapping [from, to]" is one index range per user (end_day >= from, start_day <= to
+# checked in the index), no longer a visit of every trip the user ever had.
+# Triggers keep the copy in line: a new link takes its trip's days, new trip days are copied
+# to the trip's links. The change feed of user_trips only reports its own columns, the copy
+# is no change of the link.
+def _user_trip_days(conn):
+    conn.execute("ALTER TABLE user_trips ADD COLUMN start_day INTEGER")
+    conn.execute("ALTER TABLE user_trips ADD COLUMN end_day INTEGER")
+
+    conn.execute("DROP TRIGGER IF EXISTS trg_user_trips_log_update")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_user_trips_log_update AFTER UPDATE OF id, trip_ID, user_ID ON user_trips
+    BEGIN
+        INSERT INTO change_log (table_name, row_ID, op, data, old_data) VALUES (
+            'user_trips', NEW.id, 'update',
+            json_object('id', NEW.id, 'trip_ID', NEW.trip_ID, 'user_ID', NEW.user_ID),
+            json_object('id', OLD.id, 'trip_ID', OLD.trip_ID, 'user_ID', OLD.user_ID)
+        );
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_user_trips_days_insert AFTER INSERT ON user_trips
+    BEGIN
+        UPDATE user_trips
+        SET start_day = (SELECT start_day FROM trips WHERE trip_ID = NEW.trip_ID),
+            end_day = (SELECT end_day FROM trips WHERE trip_ID = NEW.trip_ID)
+        WHERE id = NEW.id;
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_trips_days_update AFTER UPDATE OF start_day, end_day ON trips
+    BEGIN
+        UPDATE user_trips SET start_day = NEW.start_day, end_day = NEW.end_day WHERE trip_ID = NEW.trip_ID;
+    END
+    """)
+
+    conn.execute("""
+    UPDATE user_trips SET start_day = t.start_day, end_day = t.end_day
+    FROM trips t WHERE t.trip_ID = user_trips.trip_ID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_user_trips_days ON user_trips(user_ID, end_day, start_day, trip_ID);")
+    #the leading user_ID of ix_user_trips_days and of the (user_ID, trip_ID) key serve its lookups
+    conn.execute("DROP INDEX IF EXISTS ix_user_trips_user")
+
+MIGRATIONS = [
+    (1, "base tables", _base_tables),
+    (2, "users.manager_ID", _users_manager_id),
+    (3, "seed roles", _seed_roles),
+    (4, "seed demo users", _seed_demo_users),
+    (5, "trips date index", _trip_date_index),
+    (6, "trips.manager_ID", _trips_manager_id),
+    (7, "user_closure", _user_closure),
+    (8, "full-text search", _fts_search),
+    (9, "trip statistics", _trip_stats),
+    (10, "trip budgets and expenses", _trip_budgets),
+    (11, "change log", _change_log),
+    (12, "trip dates as day numbers", _trip_day_numbers),
+    (13, "user_trips days", _user_trip_days),
+]
+
+_lock = threading.Lock()
+_migrated = set()
+
+### Brings the database up to the latest schema version, once per process and database file ###
+def run_migrations():
+    path = db_connection.DB_USERS
+    if path in _migrated:
+        return
+
+    with _lock:
+        if path in _migrated:
+            return
+
+        with transaction() as conn:
+            #take the write lock up front, so concurrent processes migrate one after another
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            current = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+            for version, name, step in MIGRATIONS:
+                if version <= current:
+                    continue
+                step(conn)
+                conn.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+
+        bump_version("users", "roles", "trips", "user_trips")
+        _migrated.add(path)
+
+### Latest applied version, 0 for a database that was never migrated ###
+def schema_version() -> int:
+    with connection() as conn:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+        ).fetchone()
+        if not exists:
+            return 0
+        return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
@@ -0,0 +1,147 @@
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+from db import db_connection
+from db.db_cache import bump_version
+from db.db_instrumentation import current_rerun, attributed_to
+
+QUEUE_SIZE = int(os.environ.get("TEAMVERSION_DB_WRITE_QUEUE", "1000"))
+BATCH_SIZE = int(os.environ.get("TEAMVERSION_DB_WRITE_BATCH", "100"))
+SUBMIT_TIMEOUT = float(os.environ.get("TEAMVERSION_DB_WRITE_TIMEOUT", "5"))
+
+
+class WriterBusy(sqlite3.OperationalError):
+    pass
+
+
+### Single writer thread that owns every write to the database ###
+# Write helpers submit an operation, a function taking the writer's connection, together
+# with the tables it changes. The thread drains the queue in batches and runs each batch in
+# one transaction, every operation inside its own savepoint: a failing operation is rolled
+# back on its own and only its caller sees the exception. Operations must not commit and
+# must not submit further writes themselves. Statements of an operation are attributed to the
+# rerun of the page that submitted it.
+class Writer:
+    def __init__(self, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE):
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._conn = None
+        self._conn_key = None
+        self._stats = {"submitted": 0, "committed": 0, "failed": 0, "rejected": 0, "batches": 0, "largest_batch": 0}
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, op, tables=(), timeout: float = SUBMIT_TIMEOUT) -> Future:
+        self._ensure_started()
+        future = Future()
+        try:
+            #backpressure: callers wait for a free slot, at most `timeout` seconds
+            self._queue.put((op, tuple(tables), future, current_rerun()), timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise WriterBusy(f"Write queue is full ({self._queue.maxsize} pending writes)")
+        with self._lock:
+            self._stats["submitted"] += 1
+        return future
+
+    #reconnects when db_connection.configure() pointed the app at another file or profile
+    def _connection(self) -> sqlite3.Connection:
+        key = (db_connection.DB_USERS, db_connection.current_profile())
+        if self._conn_key != key:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = db_connection.open_connection(*key)
+            self._conn_key = key
+        return self._conn
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._apply(batch)
+
+    def _apply(self, batch):
+        outcomes = []
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            for op, tables, future, rerun in batch:
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    with attributed_to(rerun):
+                        result = op(conn)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_op")
+                    conn.execute("RELEASE write_op")
+                    outcomes.append((future, tables, None, e))
+                else:
+                    conn.execute("RELEASE write_op")
+                    outcomes.append((future, tables, result, None))
+            conn.commit()
+        except Exception as e:
+            #the transaction itself failed, nothing of this batch was written
+            if self._conn is not None and self._conn.in_transaction:
+                self._conn.rollback()
+            with self._lock:
+                self._stats["failed"] += len(batch)
+            for _, _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        changed = {table for _, tables, _, error in outcomes if error is None for table in tables}
+        if changed:
+            bump_version(*changed)
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+            for _, _, _, error in outcomes:
+                self._stats["failed" if error else "committed"] += 1
+
+        for future, _, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"queued": self._queue.qsize(), "max_queue": self._queue.maxsize, **self._stats}
+
+
+_writer = Writer()
+
+
+### Queue a write, returns a Future with op's return value ###
+def submit(op, tables=()) -> Future:
+    return _writer.submit(op, tables)
+
+
+### Queue a write and wait until it is committed ###
+def write(op, tables=()):
+    return _writer.submit(op, tables).result()
+
+
+### Single statement shortcut, returns the cursor's lastrowid ###
+def write_sql(sql: str, params=(), tables=()):
+    return write(lambda conn: conn.execute(sql, params).lastrowid, tables)
+
+
+def writer_stats() -> dict:
+    return _writer.stats()
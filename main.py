@@ -1,17 +1,18 @@
 import streamlit as st
-import time
-from db.db_functions_users import create_tables, add_user, get_user_by_credentials, get_role_sortkey, register_main
+from db.db_functions_users import get_user_by_credentials, get_role_sortkey, get_user_ID, register_main
+from db.db_instrumentation import begin_rerun
+from db.db_functions_feedback import show_flashes, flash
+from db.db_migrations import run_migrations
 
 ### basic page settings ###
 st.set_page_config(page_title="Login", layout="centered", initial_sidebar_state="collapsed")
 st.title("Login")
 
-### create db and table if non-existent ###
-create_tables()
-### add dummies to user.db ###
-add_user("Admin", "123", "a@gmail.com", "Administrator")
-add_user("Manager", "123", "manager@gmail.com", "Manager")
-add_user("User", "123", "user@gmail.com", "User")
+begin_rerun("main")
+show_flashes()
+
+### create db, tables and dummies if non-existent, only on the first run of this process ###
+run_migrations()
 
 
 
@@ -28,10 +29,10 @@ if submitted:
         uname, role = result
         st.session_state["username"] = uname
         st.session_state["role"] = role
+        st.session_state["user_ID"] = get_user_ID(uname)
         role_sortkey = get_role_sortkey(role)
         st.session_state["role_sortkey"] =  role_sortkey
-        st.success(f"Welcome {uname}! 🎉 Role: {role}")
-        time.sleep(1)
+        flash(f"Welcome {uname}! Role: {role}", icon="🎉")
         if role == "Administrator":
             st.switch_page("pages/admin_overview.py")
         elif role == "Manager":
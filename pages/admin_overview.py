@@ -1,9 +1,23 @@
 import streamlit as st
-import pandas as pd
 import sqlite3
+from db.db_instrumentation import begin_rerun
+from db.db_functions_feedback import show_flashes
+from db.db_migrations import run_migrations
 from db.db_functions_users import register_user_dropdown_admin, edit_user_dropdown_admin, get_users_under_me, del_user_dropdown_admin
+from db.db_functions_import import import_users_dropdown
+from db.db_functions_conflicts import conflict_report_dropdown
+from db.db_functions_budget import budget_report_dropdown
+from db.db_functions_changes import change_log_dropdown
+from db.db_functions_search import user_search_box
+from db.db_connection import pool_stats
+from db.db_cache import cache_stats
+from db.db_writer import writer_stats
+from db.db_instrumentation import recent_reruns, slow_queries, top_queries, reset_stats, SLOW_QUERY_MS
 st.set_page_config(page_title="Admin Dashboard", layout="wide")
 st.title("Admin Dashboard")
+begin_rerun("admin_overview")
+show_flashes()
+run_migrations()
 
 ### Access control, so only admin can access this page ###
 if "role" not in st.session_state or st.session_state["role"] != "Administrator":
@@ -14,16 +28,43 @@ if "role" not in st.session_state or st.session_state["role"] != "Administrator"
 left, right = st.columns([4, 2], gap="large")
 with left:
     st.subheader("Table")
-    df = get_users_under_me()         
-    if df is None:
+    user_search_box()
+    users = get_users_under_me(records=True)
+    if users is None:
         st.warning("Fehlender Kontext: 'role_sortkey' ist nicht im session_state.")
-    elif df.empty:
+    elif not users:
         st.info("Keine Benutzer unter deiner Rolle.")
     else:
-        st.dataframe(df, use_container_width=True)
+        st.dataframe(users, use_container_width=True)
 
 with right:
     st.subheader("User Management")
     register_user_dropdown_admin()
+    import_users_dropdown(allow_manager_column=True)
     del_user_dropdown_admin()
-    edit_user_dropdown_admin(title="Edit user")
\ No newline at end of file
+    edit_user_dropdown_admin(title="Edit user")
+    conflict_report_dropdown(title="Double bookings (all users)")
+    budget_report_dropdown(title="Budget report (all managers)")
+    change_log_dropdown()
+
+    with st.expander("Database connections", expanded=False):
+        st.json(pool_stats())
+    with st.expander("Query cache", expanded=False):
+        st.json(cache_stats())
+    with st.expander("Write queue", expanded=False):
+        st.json(writer_stats())
+    with st.expander("Query diagnostics", expanded=False):
+        st.caption(f"Statements slower than {SLOW_QUERY_MS:g} ms are logged as slow.")
+        st.markdown("**Recent reruns**")
+        st.dataframe(recent_reruns(), hide_index=True, use_container_width=True)
+        st.markdown("**Top statements by total time**")
+        st.dataframe(top_queries(), hide_index=True, use_container_width=True)
+        st.markdown("**Slow statements**")
+        slow = slow_queries()
+        if slow:
+            st.dataframe(slow, hide_index=True, use_container_width=True)
+        else:
+            st.info("No slow statements so far.")
+        if st.button("Reset diagnostics"):
+            reset_stats()
+            st.rerun()
\ No newline at end of file
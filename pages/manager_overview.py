@@ -1,27 +1,48 @@
 import streamlit as st
 from db.db_functions_users import register_user_dropdown, del_user_dropdown, edit_user_dropdown
-from db.db_functions_trips import create_trip_dropdown, del_trip_dropdown, create_trip_table, create_trip_users_table, trip_list_view
+from db.db_functions_import import import_users_dropdown, import_trips_dropdown
+from db.db_functions_export import export_trips_dropdown
+from db.db_functions_conflicts import conflict_report_dropdown
+from db.db_functions_budget import budget_report_dropdown
+from db.db_functions_search import trip_search_box, user_search_box
+from db.db_functions_stats import manager_kpi_tiles
+from db.db_functions_occupancy import team_calendar_dropdown
+from db.db_functions_trips import create_trip_dropdown, del_trip_dropdown, trip_list_view
+from db.db_instrumentation import begin_rerun
+from db.db_functions_feedback import show_flashes
+from db.db_migrations import run_migrations
 st.set_page_config(page_title="Manager Overview", layout="wide")
 st.title("Manager Dashboard")
-create_trip_table()
-create_trip_users_table()
+begin_rerun("manager_overview")
+show_flashes()
+run_migrations()
 
 ### Access control, so only managers can access this page ###
 if "role" not in st.session_state or st.session_state["role"] != "Manager":
     st.error("Access denied. Please log in as Manager.")
     st.stop()
 
+manager_kpi_tiles(st.session_state["user_ID"])
+
 left, right = st.columns([4, 2], gap="large")
 
 with right:
     st.subheader("User-Management")
+    user_search_box(manager_ID=st.session_state["user_ID"])
     register_user_dropdown()
+    import_users_dropdown()
     edit_user_dropdown()
     del_user_dropdown()
     st. subheader("Trip-Management")
     create_trip_dropdown()
     del_trip_dropdown()
+    import_trips_dropdown()
+    export_trips_dropdown(manager_ID=st.session_state["user_ID"])
+    conflict_report_dropdown(manager_ID=st.session_state["user_ID"])
+    team_calendar_dropdown(st.session_state["user_ID"])
+    budget_report_dropdown(manager_ID=st.session_state["user_ID"])
 
 with left:
     st.subheader("Trip-Overview")
+    trip_search_box()
     trip_list_view()
\ No newline at end of file
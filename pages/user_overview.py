@@ -1,18 +1,30 @@
 import streamlit as st
-import pandas as pd
 from datetime import date
+from db.db_instrumentation import begin_rerun
+from db.db_functions_feedback import show_flashes
+from db.db_migrations import run_migrations
 from db.db_functions_users import edit_own_profile
-from db.db_functions_usertrips import get_user_trips
+from db.db_functions_trips import user_has_trips
+from db.db_functions_export import export_trips_dropdown
+from db.db_functions_stats import user_kpi_tiles
+from db.db_functions_usertrips import load_my_trips
+from db.db_functions_occupancy import my_calendar_dropdown
 
 # --- Page setup ---
 st.set_page_config(page_title="Employee Dashboard", layout="wide")
 st.title("Employee Dashboard")
+begin_rerun("user_overview")
+show_flashes()
+run_migrations()
 
 # --- Access control ---
 if "role" not in st.session_state or st.session_state["role"] != "User":
     st.error("Access denied. Please log in as User.")
     st.stop()
 
+if st.session_state.get("user_ID") is not None:
+    user_kpi_tiles(st.session_state["user_ID"])
+
 # --- Layout ---
 left, right = st.columns([4, 2], gap="large")
 
@@ -20,20 +32,14 @@ left, right = st.columns([4, 2], gap="large")
 with left:
     st.subheader("Trip Overview")
 
-    user_id = st.session_state.get("user_id", None)
+    user_id = st.session_state.get("user_ID", None)
     if user_id is None:
         st.warning("No user logged in. Please log in first.")
         st.stop()
 
-    # Fetch trips from the DB
-    trips = get_user_trips(user_id)
-
-    if trips is None or trips.empty:
+    if not user_has_trips(user_id):
         st.info("You have no trips recorded yet.")
     else:
-        trips["date_start"] = pd.to_datetime(trips["date_start"])
-        trips["date_end"] = pd.to_datetime(trips["date_end"])
-
         # --- Calendar filter ---
         st.markdown("### 📅 Filter trips by date range")
         date_range = st.date_input(
@@ -44,22 +50,21 @@ with left:
 
         # Handle single vs range selection
         if isinstance(date_range, tuple):
-            start_date, end_date = date_range
+            start_date = date_range[0] if date_range else None
+            end_date = date_range[-1] if date_range else None
         else:
             start_date = end_date = date_range
 
-        # Filter trips that overlap with the chosen date(s)
-        mask = (trips["date_start"] <= end_date) & (trips["date_end"] >= start_date)
-        filtered = trips.loc[mask].sort_values("date_start", ascending=False)
+        # Trips that overlap with the chosen date(s), filtered and sorted in SQL
+        filtered = load_my_trips(start_date, end_date)
 
-        if filtered.empty:
+        if not filtered:
             st.warning("No trips found for the selected date(s).")
         else:
-            st.dataframe(
-                filtered[["destination", "date_start", "date_end", "budget", "status"]],
-                use_container_width=True,
-                hide_index=True
-            )
+            st.dataframe(filtered, use_container_width=True, hide_index=True)
+
+        export_trips_dropdown(user_ID=user_id)
+        my_calendar_dropdown(user_id)
 
 # --- RIGHT COLUMN: Edit Profile ---
 with right:
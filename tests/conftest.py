@@ -0,0 +1,18 @@
+import pytest
+
+from db import db_connection
+from db.db_cache import clear_cache
+from db.db_migrations import run_migrations
+
+
+### A freshly migrated database file per test, the app's pool pointed at it ###
+@pytest.fixture
+def db(tmp_path):
+    original = db_connection.DB_USERS
+    path = str(tmp_path / "users.db")
+    db_connection.configure(path=path)
+    clear_cache()
+    run_migrations()
+    yield path
+    db_connection.configure(path=original)
+    clear_cache()
@@ -0,0 +1,50 @@
+import base64
+
+import pytest
+
+import api
+from api import encode_cursor
+
+
+@pytest.fixture
+def client(db):
+    return api.TestClient(api.make_app("secret"), "secret")
+
+
+def _raw_cursor(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/users", {"after": "!!!"}),
+    ("/users", {"after": _raw_cursor("not json")}),
+    ("/users", {"after": encode_cursor([1, 2])}),
+    ("/users", {"after": encode_cursor(1.5)}),
+    ("/users", {"after": encode_cursor(2 ** 70)}),
+    ("/users", {"after": _raw_cursor("[" * 100000)}),
+    ("/users", {"limit": "x"}),
+    ("/users", {"limit": "1e999"}),
+    ("/users/99999999999999999999999", {}),
+    ("/trips", {"after": encode_cursor(["x", 1])}),
+    ("/trips", {"after": encode_cursor([None, True])}),
+    ("/trips", {"after": encode_cursor(7)}),
+    ("/trips/99999999999999999999999/participants", {}),
+    ("/changes", {"since": "99999999999999999999999"}),
+])
+def test_malformed_input_is_a_json_400(client, path, params):
+    response = client.get(path, params)
+    assert response.status == 400
+    assert response.headers["Content-Type"] == "application/json"
+    assert "error" in response.json()
+
+
+def test_malformed_body_is_a_json_400(client):
+    response = client.put("/participants/batch", {"trips": {"1": [1.5]}})
+    assert response.status == 400
+    assert response.json()["error"] == "trips.1 has to be an integer"
+
+
+def test_valid_cursor_still_pages(client):
+    response = client.get("/trips", {"after": encode_cursor([None, 0]), "limit": "10"})
+    assert response.status == 200
+    assert response.json() == {"items": [], "next": None}
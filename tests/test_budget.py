@@ -0,0 +1,66 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from db.db_cache import bump_version, table_versions
+from db.db_connection import transaction
+from db.db_functions_budget import book_expense, set_trip_budget, trip_budget, trip_budgets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEDGER_COLUMNS = ["booked_at", "user", "category", "amount", "note"]
+
+
+def _trip():
+    with transaction() as conn:
+        conn.execute("INSERT INTO trips (trip_ID, destination, occasion) VALUES (1, 'Rome', '')")
+    bump_version("trips")
+    return 1
+
+
+def test_status_and_budget_saved_in_one_write(db):
+    trip_ID = _trip()
+    before = table_versions("trips")
+    set_trip_budget(trip_ID, "approved", 125000)
+    assert table_versions("trips")[1] == before[1] + 1
+    assert trip_budget(trip_ID)[:2] == ("approved", 125000)
+
+
+def test_unknown_status_is_rejected(db):
+    trip_ID = _trip()
+    with pytest.raises(ValueError):
+        set_trip_budget(trip_ID, "archived", None)
+
+
+def test_budgets_of_a_page_in_one_lookup(db):
+    trip_ID = _trip()
+    with transaction() as conn:
+        conn.execute("INSERT INTO trips (trip_ID, destination, occasion, budget_cents) VALUES (2, 'Oslo', '', 5000)")
+    bump_version("trips")
+    book_expense(2, 1200)
+    book_expense(2, -200)
+    assert trip_budgets([trip_ID, 2, 99]) == {trip_ID: ("planned", None, 0, 0), 2: ("planned", 5000, 1000, 2)}
+    assert trip_budget(2) == ("planned", 5000, 1000, 2)
+    assert trip_budgets([]) == {}
+
+
+def test_ledger_is_read_only_when_shown(db):
+    with transaction() as conn:
+        boss = conn.execute("INSERT INTO users (username, password, role) VALUES ('boss', 'x', 'Manager')").lastrowid
+        conn.execute("INSERT INTO trips (trip_ID, destination, start_day, end_day, occasion, manager_ID) VALUES (1, 'Rome', 739000, 739001, '', ?)", (boss,))
+    bump_version("users", "trips")
+    book_expense(1, 1500, note="taxi")
+
+    at = AppTest.from_file(os.path.join(ROOT, "pages", "manager_overview.py"), default_timeout=30)
+    at.session_state["username"] = "boss"
+    at.session_state["role"] = "Manager"
+    at.session_state["user_ID"] = boss
+    at.session_state["role_sortkey"] = 2
+    at.run()
+    assert not at.exception
+    assert not [d for d in at.dataframe if list(d.value.columns) == LEDGER_COLUMNS]
+
+    at = at.toggle(key="trip_ledger_1").set_value(True).run()
+    assert not at.exception
+    [ledger] = [d for d in at.dataframe if list(d.value.columns) == LEDGER_COLUMNS]
+    assert list(ledger.value["note"]) == ["taxi"]
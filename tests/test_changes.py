@@ -0,0 +1,56 @@
+from db.db_cache import bump_version
+from db.db_connection import transaction
+from db.db_migrations import day_number
+from db.db_functions_changes import changes_since, latest_seq, row_history
+
+
+def test_change_log_records_every_write(db):
+    seq = latest_seq()
+    day = day_number("2024-05-01")
+    with transaction() as conn:
+        trip_ID = conn.execute(
+            "INSERT INTO trips (destination, start_day, end_day, occasion) VALUES ('Rome', ?, ?, 'Fair')", (day, day + 2)
+        ).lastrowid
+        conn.execute("UPDATE trips SET destination = 'Milan' WHERE trip_ID = ?", (trip_ID,))
+        conn.execute("DELETE FROM trips WHERE trip_ID = ?", (trip_ID,))
+    bump_version("trips")
+
+    entries = changes_since(seq)
+    assert [(e["table"], e["row_ID"], e["op"]) for e in entries] == [
+        ("trips", trip_ID, "insert"), ("trips", trip_ID, "update"), ("trips", trip_ID, "delete")
+    ]
+    insert, update, delete = entries
+    assert insert["data"]["destination"] == "Rome" and insert["data"]["start_date"] == "2024-05-01"
+    assert insert["old_data"] is None
+    assert (update["old_data"]["destination"], update["data"]["destination"]) == ("Rome", "Milan")
+    assert delete["data"] is None and delete["old_data"]["destination"] == "Milan"
+    assert [e["seq"] for e in entries] == sorted(e["seq"] for e in entries)
+    assert row_history("trips", trip_ID) == entries
+    assert latest_seq() == delete["seq"]
+
+
+def test_changes_since_pages_without_gaps(db):
+    seq = latest_seq()
+    with transaction() as conn:
+        for i in range(7):
+            user_ID = conn.execute(
+                "INSERT INTO users (username, password, role) VALUES (?, 'x', 'User')", (f"user{i}",)
+            ).lastrowid
+            conn.execute("UPDATE users SET email = ? WHERE user_ID = ?", (f"user{i}@example.com", user_ID))
+    bump_version("users")
+
+    pages, since = [], seq
+    while True:
+        page = changes_since(since, limit=3)
+        if not page:
+            break
+        assert len(page) <= 3
+        pages.append(page)
+        since = page[-1]["seq"]
+    entries = [e for page in pages for e in page]
+    assert [len(page) for page in pages] == [3, 3, 3, 3, 2]
+    assert entries == changes_since(seq, limit=100)
+    assert [e["op"] for e in entries] == ["insert", "update"] * 7
+    assert changes_since(since) == []
+    assert changes_since(seq, table_names=["trips"]) == []
+    assert len(changes_since(seq, table_names=["users", "trips"])) == 14
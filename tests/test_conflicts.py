@@ -0,0 +1,107 @@
+import os
+from datetime import date
+
+from streamlit.testing.v1 import AppTest
+
+from db.db_cache import bump_version
+from db.db_connection import transaction
+from db.db_migrations import day_number
+from db.db_functions_conflicts import find_conflicts, find_trip_conflicts, find_all_conflicts
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLUMNS = ["username", "trip_ID", "destination", "other_trip_ID", "other_destination", "overlap_from", "overlap_to"]
+
+
+#boss -> lead -> dev, and a second manager with their own user
+def _seed():
+    with transaction() as conn:
+        def user(name, role, manager_ID=None):
+            return conn.execute(
+                "INSERT INTO users (username, password, role, manager_ID) VALUES (?, 'x', ?, ?)", (name, role, manager_ID)
+            ).lastrowid
+        ids = {"boss": user("boss", "Manager")}
+        ids["lead"] = user("lead", "Manager", ids["boss"])
+        ids["dev"] = user("dev", "User", ids["lead"])
+        ids["other"] = user("other_boss", "Manager")
+        ids["outsider"] = user("outsider", "User", ids["other"])
+
+        def trip(destination, first, last, *participants):
+            trip_ID = conn.execute(
+                "INSERT INTO trips (destination, start_day, end_day, occasion) VALUES (?, ?, ?, '')",
+                (destination, day_number(first), day_number(last))
+            ).lastrowid
+            conn.executemany("INSERT INTO user_trips (trip_ID, user_ID) VALUES (?, ?)", [(trip_ID, ids[p]) for p in participants])
+            return trip_ID
+        #a long trip, then short ones inside it and after it
+        ids["sabbatical"] = trip("Sabbatical", "2024-01-01", "2024-12-31", "dev", "outsider")
+        ids["rome"] = trip("Rome", "2024-03-01", "2024-03-05", "dev", "outsider")
+        ids["oslo"] = trip("Oslo", "2024-03-05", "2024-03-06", "dev")
+        ids["lima"] = trip("Lima", "2025-02-01", "2025-02-03", "dev", "lead")
+    bump_version("users", "trips", "user_trips")
+    return ids
+
+
+def test_find_conflicts(db):
+    ids = _seed()
+    found = find_conflicts([ids["dev"], ids["lead"]], date(2024, 3, 5), date(2024, 3, 5))
+    assert found == {ids["dev"]: [
+        (ids["sabbatical"], "Sabbatical", "2024-01-01", "2024-12-31"),
+        (ids["rome"], "Rome", "2024-03-01", "2024-03-05"),
+        (ids["oslo"], "Oslo", "2024-03-05", "2024-03-06"),
+    ]}
+    #the trip being edited does not conflict with itself, a missing end is the start day
+    found = find_conflicts([ids["dev"]], "2024-03-06", None, exclude_trip=ids["oslo"])
+    assert [t[0] for t in found[ids["dev"]]] == [ids["sabbatical"]]
+    assert list(find_conflicts([ids["lead"]], "2025-01-31", "2025-02-01")) == [ids["lead"]]
+    assert find_conflicts([], "2024-03-05", "2024-03-05") == {}
+
+
+#one query for a page of trips answers what find_conflicts answers for each trip on its own
+def test_trip_conflicts_match_the_single_trip_lookup(db):
+    ids = _seed()
+    trips = [ids[name] for name in ("sabbatical", "rome", "oslo", "lima")]
+    found = find_trip_conflicts(trips)
+    with transaction() as conn:
+        for trip_ID in trips:
+            start, end = conn.execute("SELECT start_date, end_date FROM trips WHERE trip_ID = ?", (trip_ID,)).fetchone()
+            users = [r[0] for r in conn.execute("SELECT user_ID FROM user_trips WHERE trip_ID = ?", (trip_ID,))]
+            assert found.get(trip_ID, {}) == find_conflicts(users, start, end, exclude_trip=trip_ID)
+    assert set(found) == {ids["sabbatical"], ids["rome"], ids["oslo"]}
+    assert find_trip_conflicts([]) == {}
+
+
+def test_report_covers_the_whole_subtree(db):
+    ids = _seed()
+    report = find_all_conflicts(ids["boss"])
+    assert {(r[0], r[1], r[3]) for r in report} == {
+        ("dev", ids["sabbatical"], ids["rome"]),
+        ("dev", ids["sabbatical"], ids["oslo"]),
+        ("dev", ids["rome"], ids["oslo"]),
+    }
+    assert ("dev", ids["rome"], "Rome", ids["oslo"], "Oslo", "2024-03-05", "2024-03-05") in report
+    assert {r[0] for r in find_all_conflicts(ids["other"])} == {"outsider"}
+    assert len(find_all_conflicts()) == 4
+
+
+def _report_tables(at):
+    return [d for d in at.dataframe if list(d.value.columns) == COLUMNS]
+
+
+def test_report_is_built_only_when_asked_for(db):
+    ids = _seed()
+    at = AppTest.from_file(os.path.join(ROOT, "pages", "manager_overview.py"), default_timeout=30)
+    at.session_state["username"] = "boss"
+    at.session_state["role"] = "Manager"
+    at.session_state["user_ID"] = ids["boss"]
+    at.session_state["role_sortkey"] = 2
+    at.run()
+    assert not at.exception
+    assert _report_tables(at) == []
+
+    at = [b for b in at.button if b.label == "Check for double bookings"][0].click().run()
+    assert not at.exception
+    [table] = _report_tables(at)
+    assert set(table.value["username"]) == {"dev"}
+    assert len(table.value) == 3
+    #stays open on the following reruns
+    assert len(_report_tables(at.run())) == 1
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.testing.v1 import AppTest
+
+from db import db_functions_export
+from db.db_cache import bump_version
+from db.db_connection import transaction
+from db.db_migrations import day_number
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+### Keeps the deferred download callables AppTest registers, its runtime is gone after the run ###
+@pytest.fixture
+def deferred(monkeypatch):
+    registered = {}
+    add_deferred = MediaFileManager.add_deferred
+
+    def record(self, *args, **kwargs):
+        file_id = add_deferred(self, *args, **kwargs)
+        registered[file_id] = self
+        return file_id
+
+    monkeypatch.setattr(MediaFileManager, "add_deferred", record)
+    return registered
+
+
+#what Streamlit does when the browser asks for the file of a deferred download_button
+def _download(registered, button) -> str:
+    manager = registered[button.proto.deferred_file_id]
+    url = manager.execute_deferred(button.proto.deferred_file_id)
+    file_id = url.rsplit("/", 1)[-1].split(".")[0]
+    return manager._storage.get_file(file_id).content.decode("utf-8")
+
+
+def _seed():
+    day = day_number("2024-05-01")
+    with transaction() as conn:
+        manager_ID = conn.execute(
+            "INSERT INTO users (username, password, role) VALUES ('boss', 'x', 'Manager')"
+        ).lastrowid
+        user_ID = conn.execute(
+            "INSERT INTO users (username, password, role, manager_ID) VALUES ('worker', 'x', 'User', ?)", (manager_ID,)
+        ).lastrowid
+        for destination, offset in (("Rome", 0), ("Oslo, Norway", 10)):
+            trip_ID = conn.execute(
+                "INSERT INTO trips (destination, start_day, end_day, occasion, manager_ID) VALUES (?, ?, ?, 'Fair', ?)",
+                (destination, day + offset, day + offset + 2, manager_ID)
+            ).lastrowid
+            conn.execute("INSERT INTO user_trips (trip_ID, user_ID) VALUES (?, ?)", (trip_ID, user_ID))
+    bump_version("users", "trips", "user_trips")
+    return manager_ID, user_ID
+
+
+def _page(page: str, username: str, role: str, user_ID: int, sortkey: int) -> AppTest:
+    at = AppTest.from_file(os.path.join(ROOT, "pages", page), default_timeout=30)
+    at.session_state["username"] = username
+    at.session_state["role"] = role
+    at.session_state["user_ID"] = user_ID
+    at.session_state["role_sortkey"] = sortkey
+    at.run()
+    assert not at.exception
+    return at
+
+
+def _buttons(at) -> dict:
+    return {b.label: b for b in at.download_button}
+
+
+def test_manager_exports_csv_and_ics(db, deferred):
+    manager_ID, _ = _seed()
+    at = _page("manager_overview.py", "boss", "Manager", manager_ID, 2)
+    at = _buttons(at)["Download CSV"].click().run()
+    assert not at.exception
+
+    csv_text = _download(deferred, _buttons(at)["Download CSV"])
+    lines = csv_text.splitlines()
+    assert lines[0] == "trip_ID,destination,start_date,end_date,occasion,participants"
+    assert lines[1].endswith(",Rome,2024-05-01,2024-05-03,Fair,worker")
+    assert '"Oslo, Norway",2024-05-11' in lines[2]
+
+    ics = _download(deferred, _buttons(at)["Download iCalendar"])
+    assert ics.startswith("BEGIN:VCALENDAR\r\n") and ics.endswith("END:VCALENDAR\r\n")
+    assert ics.count("BEGIN:VEVENT") == 2
+    assert "DTSTART;VALUE=DATE:20240501\r\nDTEND;VALUE=DATE:20240504\r\n" in ics
+    assert "SUMMARY:Oslo\\, Norway" in ics
+
+
+def test_user_exports_own_trips(db, deferred):
+    _, user_ID = _seed()
+    at = _page("user_overview.py", "worker", "User", user_ID, 1)
+    assert len(_download(deferred, _buttons(at)["Download CSV"]).splitlines()) == 3
+    assert _download(deferred, _buttons(at)["Download iCalendar"]).count("BEGIN:VEVENT") == 2
+
+
+def test_abandoned_export_closes_its_own_connection(db, monkeypatch):
+    _seed()
+    opened = []
+
+    def record(*args, **kwargs):
+        opened.append(open_connection(*args, **kwargs))
+        return opened[-1]
+
+    open_connection = db_functions_export.open_connection
+    monkeypatch.setattr(db_functions_export, "open_connection", record)
+    chunks = db_functions_export.export_trips_csv()
+    first = next(chunks)
+    assert first.startswith("trip_ID,") and "Rome" in first
+
+    #a suspended export is closed from another thread, as when a download is abandoned
+    errors = []
+    closer = threading.Thread(target=lambda: errors.extend(_close(chunks)))
+    closer.start()
+    closer.join()
+    assert errors == []
+    with pytest.raises(sqlite3.ProgrammingError):
+        opened[0].execute("SELECT 1")
+
+    #the rows still stream to a file, each export on a connection of its own
+    path = os.path.join(os.path.dirname(db), "trips.ics")
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        file.writelines(db_functions_export.export_trips_ics())
+    with open(path, encoding="utf-8", newline="") as file:
+        assert file.read().count("BEGIN:VEVENT") == 2
+    assert len(opened) == 2
+
+
+def _close(chunks) -> list:
+    try:
+        chunks.close()
+    except Exception as e:
+        return [e]
+    return []
@@ -0,0 +1,137 @@
+import csv
+import io
+
+from db.db_cache import bump_version
+from db.db_connection import connection, transaction
+from db.db_functions_import import _to_csv, import_trips_csv, import_users_csv
+
+
+def _csv(columns, rows) -> bytes:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return out.getvalue().encode("utf-8")
+
+
+def _usernames() -> set:
+    with connection() as conn:
+        return {r[0] for r in conn.execute("SELECT username FROM users")}
+
+
+def test_user_import_reports_bad_rows_across_chunks(db):
+    with transaction() as conn:
+        manager_ID = conn.execute(
+            "INSERT INTO users (username, password, role) VALUES ('boss', 'x', 'Manager')"
+        ).lastrowid
+    bump_version("users")
+    rows = [
+        ("ana", "pw", "ana@example.com", "User", ""),
+        ("", "pw", "", "User", ""),
+        ("ben", "pw", "", "Administrator", ""),
+        ("cem", "pw", "", "User", "abc"),
+        ("dia", "pw", "", "Manager", str(manager_ID)),
+        ("ana", "pw", "", "User", ""),
+        ("eli", "", "", "User", ""),
+        #exists already, found in the writer's chunk
+        ("boss", "pw", "", "User", ""),
+        ("fay", "pw", "", "User", ""),
+    ]
+    report = import_users_csv(_csv(["username", "password", "email", "role", "manager_ID"], rows), 3,
+                              default_manager_ID=manager_ID, allow_manager_column=True, chunk_size=2)
+
+    assert report["rows"] == 9 and report["imported"] == 3
+    assert report["errors"] == [
+        (3, "", "username and password are required"),
+        (4, "ben", "role 'Administrator' is not allowed"),
+        (5, "cem", "manager_ID has to be an integer"),
+        (7, "ana", "duplicate username in file"),
+        (8, "eli", "username and password are required"),
+        (9, "boss", "username exists already"),
+    ]
+    assert {"ana", "dia", "fay"} <= _usernames() and not {"ben", "cem", "eli"} & _usernames()
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM user_closure c JOIN users u ON u.user_ID = c.descendant_ID "
+                            "WHERE c.ancestor_ID = ? AND u.username IN ('ana', 'dia', 'fay')", (manager_ID,)).fetchone()[0] == 3
+    report_csv = _to_csv(report["errors"], ["line", "username", "error"]).splitlines()
+    assert report_csv[0] == "line,username,error"
+    assert report_csv[-1] == "9,boss,username exists already"
+
+
+#every chunk size, chunks that end on the last row and chunks with nothing left to insert
+def test_user_import_chunk_boundaries(db):
+    rows = [(f"user{i}", "pw", "", "User") for i in range(6)]
+    for chunk_size, prefix in ((1, "a"), (3, "b"), (6, "c"), (7, "d")):
+        named = [(prefix + r[0], *r[1:]) for r in rows]
+        report = import_users_csv(_csv(["username", "password", "email", "role"], named), 2, chunk_size=chunk_size)
+        assert (report["rows"], report["imported"], report["errors"]) == (6, 6, [])
+        again = import_users_csv(_csv(["username", "password", "email", "role"], named), 2, chunk_size=chunk_size)
+        assert again["imported"] == 0
+        assert [e[0] for e in again["errors"]] == list(range(2, 8))
+    assert len([u for u in _usernames() if u[1:].startswith("user")]) == 24
+
+
+def _team() -> dict:
+    with transaction() as conn:
+        ids = {"boss": conn.execute(
+            "INSERT INTO users (username, password, role) VALUES ('boss', 'x', 'Manager')"
+        ).lastrowid}
+        ids["other"] = conn.execute(
+            "INSERT INTO users (username, password, role) VALUES ('other', 'x', 'Manager')"
+        ).lastrowid
+        for username, manager in (("lead", "boss"), ("dev", "lead"), ("intern", "dev"), ("outsider", "other")):
+            ids[username] = conn.execute(
+                "INSERT INTO users (username, password, role, manager_ID) VALUES (?, 'x', 'User', ?)",
+                (username, ids[manager])
+            ).lastrowid
+    bump_version("users")
+    return ids
+
+
+def _links(trip_destination: str) -> set:
+    with connection() as conn:
+        return {r[0] for r in conn.execute(
+            "SELECT u.username FROM trips t JOIN user_trips ut ON ut.trip_ID = t.trip_ID JOIN users u ON u.user_ID = ut.user_ID "
+            "WHERE t.destination = ?", (trip_destination,)
+        )}
+
+
+def test_trip_import_resolves_the_whole_subtree(db):
+    ids = _team()
+    rows = [
+        ("Rome", "2024-05-01", "2024-05-03", "Fair", "lead;dev"),
+        ("Oslo", "2024-05-10", "2024-05-10", "", "intern"),
+        ("", "2024-05-01", "2024-05-02", "", ""),
+        ("Lima", "01.05.2024", "2024-05-02", "", ""),
+        ("Quito", "2024-05-05", "2024-05-01", "", ""),
+        ("Bern", "2024-06-01", "2024-06-02", "", "dev;outsider"),
+        ("Nice", "2024-06-01", "2024-06-02", "", "boss"),
+        ("Riga", "2024-07-01", "2024-07-04", "", " dev ; ;intern"),
+    ]
+    report = import_trips_csv(_csv(["destination", "start_date", "end_date", "occasion", "participants"], rows),
+                              manager_ID=ids["boss"], chunk_size=2)
+
+    assert report["rows"] == 8 and report["imported"] == 3
+    assert report["errors"] == [
+        (4, "", "destination is required"),
+        (5, "Lima", "dates have to be YYYY-MM-DD"),
+        (6, "Quito", "end_date is before start_date"),
+        (7, "Bern", "unknown participants: outsider"),
+        (8, "Nice", "unknown participants: boss"),
+    ]
+    assert _links("Rome") == {"lead", "dev"}
+    assert _links("Oslo") == {"intern"}
+    assert _links("Riga") == {"dev", "intern"}
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM trips WHERE manager_ID = ?", (ids["boss"],)).fetchone()[0] == 3
+        assert conn.execute("SELECT user_ID, start_date, end_date FROM user_trips ut JOIN trips t USING (trip_ID) "
+                            "WHERE t.destination = 'Oslo'").fetchone() == (ids["intern"], "2024-05-10", "2024-05-10")
+
+    #a manager lower down only reaches their own subtree, an admin import reaches everyone
+    report = import_trips_csv(_csv(["destination", "start_date", "end_date", "occasion", "participants"],
+                                   [("Kyiv", "2024-08-01", "2024-08-02", "", "intern"),
+                                    ("Baku", "2024-08-01", "2024-08-02", "", "lead")]), manager_ID=ids["dev"])
+    assert report["imported"] == 1 and report["errors"] == [(3, "Baku", "unknown participants: lead")]
+    report = import_trips_csv(_csv(["destination", "start_date", "end_date", "occasion", "participants"],
+                                   [("Doha", "2024-09-01", "2024-09-01", "", "outsider;intern")]))
+    assert report["imported"] == 1 and _links("Doha") == {"outsider", "intern"}
@@ -0,0 +1,45 @@
+import threading
+
+from db.db_instrumentation import begin_rerun, attributed_to, current_rerun, recent_reruns, reset_stats, top_queries
+from db.db_writer import write_sql
+
+
+#stands in for a script thread, the rerun summary is per thread
+def _in_thread(target):
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+
+
+def test_writes_count_for_the_submitting_page(db):
+    reset_stats()
+
+    def page():
+        begin_rerun("test_page")
+        write_sql("INSERT INTO trips (destination, occasion) VALUES ('Rome', '')", tables=("trips",))
+
+    _in_thread(page)
+    [rerun] = recent_reruns()
+    assert rerun["page"] == "test_page"
+    assert rerun["queries"] == 1
+    [pages] = [q["pages"] for q in top_queries(1000) if q["fingerprint"].startswith("INSERT INTO trips")]
+    assert pages == "test_page"
+    reset_stats()
+
+
+def test_attribution_is_restored_after_the_block():
+    seen = []
+
+    def page():
+        begin_rerun("caller")
+        seen.append(current_rerun())
+
+    def writer():
+        with attributed_to(seen[0]):
+            seen.append(current_rerun())
+        seen.append(current_rerun())
+
+    _in_thread(page)
+    _in_thread(writer)
+    assert seen[1] is seen[0] and seen[2] is None
+    reset_stats()
@@ -0,0 +1,78 @@
+from db import db_connection, db_migrations
+from db.db_cache import clear_cache
+from db.db_connection import connection, transaction
+from db.db_migrations import day_number, run_migrations, schema_version
+
+#(destination, start_date, end_date) as the text columns of v11 held them, and the days they become
+TEXT_DATES = [
+    ("Rome", "2024-05-01", "2024-05-03", ("2024-05-01", "2024-05-03")),
+    ("Leap day", "2024-02-28", "2024-03-01", ("2024-02-28", "2024-03-01")),
+    ("New year", "2023-12-31", "2024-01-01", ("2023-12-31", "2024-01-01")),
+    ("With a time", "2024-06-01 09:30:00", "2024-06-02T18:00", ("2024-06-01", "2024-06-02")),
+    ("No end", "2024-07-01", None, ("2024-07-01", "2024-07-01")),
+    ("Empty end", "2024-07-05", "", ("2024-07-05", "2024-07-05")),
+    ("Bad end", "2024-07-10", "next week", ("2024-07-10", "2024-07-10")),
+    ("Ends before it starts", "2024-08-10", "2024-08-01", ("2024-08-10", "2024-08-10")),
+    ("No start", None, "2024-09-01", (None, None)),
+    ("Bad start", "someday", "2024-09-05", (None, None)),
+    ("Impossible date", "2024-02-30", "2024-03-02", (None, None)),
+]
+
+
+#a database migrated only up to version 11, where trips still kept their dates as text
+def _v11(monkeypatch, path: str):
+    monkeypatch.setattr(db_migrations, "MIGRATIONS", db_migrations.MIGRATIONS[:11])
+    db_connection.configure(path=path)
+    clear_cache()
+    run_migrations()
+    assert schema_version() == 11
+    monkeypatch.undo()
+    db_migrations._migrated.discard(path)
+
+
+def test_text_dates_become_day_numbers(tmp_path, monkeypatch):
+    original = db_connection.DB_USERS
+    try:
+        _v11(monkeypatch, str(tmp_path / "users.db"))
+        with transaction() as conn:
+            manager_ID = conn.execute(
+                "INSERT INTO users (username, password, role) VALUES ('boss', 'x', 'Manager')"
+            ).lastrowid
+            user_ID = conn.execute(
+                "INSERT INTO users (username, password, role, manager_ID) VALUES ('worker', 'x', 'User', ?)", (manager_ID,)
+            ).lastrowid
+            trip_IDs = {}
+            for destination, start_date, end_date, _ in TEXT_DATES:
+                trip_IDs[destination] = trip_ID = conn.execute(
+                    "INSERT INTO trips (destination, start_date, end_date, occasion, manager_ID) VALUES (?, ?, ?, '', ?)",
+                    (destination, start_date, end_date, manager_ID)
+                ).lastrowid
+                conn.execute("INSERT INTO user_trips (trip_ID, user_ID) VALUES (?, ?)", (trip_ID, user_ID))
+                conn.execute(
+                    "INSERT INTO trip_expenses (trip_ID, user_ID, amount_cents, booked_by) VALUES (?, ?, 100, ?)",
+                    (trip_ID, user_ID, manager_ID)
+                )
+
+        run_migrations()
+        assert schema_version() == len(db_migrations.MIGRATIONS)
+        with connection() as conn:
+            rows = {r[0]: r[1:] for r in conn.execute(
+                "SELECT destination, trip_ID, start_day, end_day, start_date, end_date FROM trips"
+            )}
+            links = dict(conn.execute("SELECT trip_ID, start_day || ',' || end_day FROM user_trips"))
+            assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+            assert conn.execute("SELECT COUNT(*) FROM trip_expenses").fetchone()[0] == len(TEXT_DATES)
+            stats = conn.execute("SELECT trips, travel_days FROM trip_stats_user WHERE user_ID = ?", (user_ID,)).fetchone()
+    finally:
+        db_connection.configure(path=original)
+        clear_cache()
+
+    dated = 0
+    for destination, _, _, (start, end) in TEXT_DATES:
+        trip_ID, start_day, end_day, start_date, end_date = rows[destination]
+        assert trip_ID == trip_IDs[destination]
+        assert (start_day, end_day) == (day_number(start), day_number(end))
+        assert (start_date, end_date) == (start, end)
+        assert links.get(trip_ID) == (f"{start_day},{end_day}" if start else None)
+        dated += end_day - start_day + 1 if start else 0
+    assert stats == (sum(1 for *_, (start, _) in TEXT_DATES if start), dated)
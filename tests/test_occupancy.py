@@ -0,0 +1,74 @@
+import os
+from datetime import date
+
+from streamlit.testing.v1 import AppTest
+
+from db.db_cache import bump_version
+from db.db_connection import transaction
+from db.db_migrations import day_number
+from db.db_functions_occupancy import daily_headcount, busy_days
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+YEAR = date.today().year
+
+
+#boss -> lead -> dev, and a second manager with their own user; trips in the current year
+def _seed():
+    with transaction() as conn:
+        def user(name, role, manager_ID=None):
+            return conn.execute(
+                "INSERT INTO users (username, password, role, manager_ID) VALUES (?, 'x', ?, ?)", (name, role, manager_ID)
+            ).lastrowid
+        ids = {"boss": user("boss", "Manager")}
+        ids["lead"] = user("lead", "Manager", ids["boss"])
+        ids["dev"] = user("dev", "User", ids["lead"])
+        ids["other"] = user("other_boss", "Manager")
+        ids["outsider"] = user("outsider", "User", ids["other"])
+
+        def trip(first, last, *participants):
+            trip_ID = conn.execute(
+                "INSERT INTO trips (destination, start_day, end_day, occasion) VALUES ('x', ?, ?, '')",
+                (day_number(first), day_number(last))
+            ).lastrowid
+            conn.executemany("INSERT INTO user_trips (trip_ID, user_ID) VALUES (?, ?)", [(trip_ID, ids[p]) for p in participants])
+        #overlapping trips of dev count once per day
+        trip(date(YEAR, 3, 1), date(YEAR, 3, 5), "dev", "outsider")
+        trip(date(YEAR, 3, 4), date(YEAR, 3, 6), "dev", "lead")
+        trip(date(YEAR - 1, 12, 30), date(YEAR, 1, 2), "lead")
+        trip(date(YEAR + 1, 1, 1), date(YEAR + 1, 1, 9), "dev")
+    bump_version("users", "trips", "user_trips")
+    return ids
+
+
+def test_headcount_is_scoped_to_users_subtree_and_window(db):
+    ids = _seed()
+    first, last = date(YEAR, 1, 1), date(YEAR, 12, 31)
+    team = daily_headcount(first, last, manager_ID=ids["boss"])
+    assert len(team) == (last - first).days + 1
+    assert team[:2].tolist() == [1, 1]
+    march = (date(YEAR, 3, 1) - first).days
+    assert team[march:march + 7].tolist() == [1, 1, 1, 2, 2, 2, 0]
+    assert int(team.sum()) == 6 + 3 + 2
+    assert int(daily_headcount(first, last, [ids["dev"]]).sum()) == 6
+    assert int(daily_headcount(first, last, manager_ID=ids["other"]).sum()) == 5
+    assert int(daily_headcount(first, last).sum()) == 6 + 3 + 2 + 5
+    users, days = busy_days(first, last, manager_ID=ids["boss"])
+    assert users.tolist() == [ids["dev"], ids["lead"]] and days.tolist() == [6, 5]
+
+
+def test_team_calendar_is_built_only_when_asked_for(db):
+    ids = _seed()
+    at = AppTest.from_file(os.path.join(ROOT, "pages", "manager_overview.py"), default_timeout=30)
+    at.session_state["username"] = "boss"
+    at.session_state["role"] = "Manager"
+    at.session_state["user_ID"] = ids["boss"]
+    at.session_state["role_sortkey"] = 2
+    at.run()
+    assert not at.exception
+    assert "Person-days away" not in [m.label for m in at.metric]
+
+    at = [b for b in at.button if b.label == "Show calendar"][0].click().run()
+    assert not at.exception
+    metrics = {m.label: m.value for m in at.metric}
+    assert metrics["Person-days away"] == "11"
+    assert metrics["Busiest day"] == "2"
@@ -0,0 +1,51 @@
+from db.db_cache import bump_version
+from db.db_connection import transaction
+from db.db_migrations import day_number
+from db.db_functions_search import search_trips, search_users
+from db.db_functions_trips import del_trip
+
+
+def _found(text: str) -> list:
+    rows, _ = search_trips(text)
+    return sorted(r[1] for r in rows)
+
+
+def test_search_follows_renamed_and_deleted_trips(db):
+    day = day_number("2024-05-01")
+    with transaction() as conn:
+        trip_IDs = [conn.execute(
+            "INSERT INTO trips (destination, start_day, end_day, occasion) VALUES (?, ?, ?, ?)",
+            (destination, day, day + 1, occasion)
+        ).lastrowid for destination, occasion in (("Rome", "Trade fair"), ("Romania", "Workshop"), ("Oslo", "Trade fair"))]
+    bump_version("trips")
+    assert _found("rom") == ["Romania", "Rome"]
+    assert _found("trade fair") == ["Oslo", "Rome"]
+
+    with transaction() as conn:
+        conn.execute("UPDATE trips SET destination = 'Milan' WHERE trip_ID = ?", (trip_IDs[0],))
+    bump_version("trips")
+    assert _found("rome") == []
+    assert _found("rom") == ["Romania"]
+    assert _found("milan") == ["Milan"]
+    #the columns that were not renamed stay searchable
+    assert _found("trade fair") == ["Milan", "Oslo"]
+
+    del_trip(trip_IDs[2])
+    assert _found("oslo") == []
+    assert _found("trade fair") == ["Milan"]
+
+
+def test_search_follows_renamed_users(db):
+    with transaction() as conn:
+        user_ID = conn.execute(
+            "INSERT INTO users (username, password, email, role) VALUES ('jdoe', 'x', 'jdoe@example.com', 'User')"
+        ).lastrowid
+        conn.execute("UPDATE users SET username = 'jsmith' WHERE user_ID = ?", (user_ID,))
+    bump_version("users")
+    #found through the email, which kept the old name
+    assert search_users("jdoe", 3)[0][0][:2] == (user_ID, "jsmith")
+    assert [r[1] for r in search_users("jsmith", 3)[0]] == ["jsmith"]
+    with transaction() as conn:
+        conn.execute("DELETE FROM users WHERE user_ID = ?", (user_ID,))
+    bump_version("users")
+    assert search_users("jsmith", 3)[0] == []
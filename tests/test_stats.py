@@ -0,0 +1,97 @@
+from db.db_cache import bump_version
+from db.db_connection import connection, transaction
+from db.db_migrations import day_number
+from db.db_functions_budget import book_expense
+from db.db_functions_trips import del_trip, set_trip_participants
+
+#each statistics table next to the same numbers aggregated from scratch
+FRESH = {
+    "trip_stats_user": ("SELECT user_ID, trips, travel_days, spent_cents FROM trip_stats_user", """
+        SELECT user_ID, SUM(trips), SUM(days), SUM(spent) FROM (
+            SELECT ut.user_ID, 1 AS trips, v.days, 0 AS spent FROM user_trips ut JOIN v_trip_days v ON v.trip_ID = ut.trip_ID
+            UNION ALL
+            SELECT user_ID, 0, 0, amount_cents FROM trip_expenses WHERE user_ID IS NOT NULL
+        ) GROUP BY user_ID"""),
+    "trip_stats_user_month": ("SELECT user_ID, month, trips, travel_days FROM trip_stats_user_month", """
+        SELECT ut.user_ID, v.month, COUNT(*), SUM(v.days) FROM user_trips ut JOIN v_trip_days v ON v.trip_ID = ut.trip_ID
+        GROUP BY ut.user_ID, v.month"""),
+    "trip_stats_manager": ("SELECT manager_ID, trips, participants, travel_days, budget_cents, spent_cents FROM trip_stats_manager", """
+        SELECT manager_ID, SUM(trips), SUM(n), SUM(n * days), SUM(budget), SUM(spent) FROM (
+            SELECT t.manager_ID, t.start_day IS NOT NULL AS trips,
+                   CASE WHEN t.start_day IS NOT NULL THEN (SELECT COUNT(*) FROM user_trips WHERE trip_ID = t.trip_ID) ELSE 0 END AS n,
+                   COALESCE(t.end_day - t.start_day + 1, 0) AS days, COALESCE(t.budget_cents, 0) AS budget,
+                   (SELECT COALESCE(SUM(amount_cents), 0) FROM trip_expenses WHERE trip_ID = t.trip_ID) AS spent
+            FROM trips t WHERE t.manager_ID IS NOT NULL
+        ) GROUP BY manager_ID"""),
+    "trip_stats_manager_month": ("SELECT manager_ID, month, trips FROM trip_stats_manager_month", """
+        SELECT manager_ID, month, COUNT(*) FROM v_trip_days WHERE manager_ID IS NOT NULL GROUP BY manager_ID, month"""),
+}
+
+
+#rows that were counted down to nothing are the same as no row
+def _nonzero(rows, keys: int) -> set:
+    return {tuple(r) for r in rows if any(r[keys:])}
+
+
+def _assert_fresh():
+    with connection() as conn:
+        for table, (stored, fresh) in FRESH.items():
+            keys = 2 if table.endswith("_month") else 1
+            assert _nonzero(conn.execute(stored), keys) == _nonzero(conn.execute(fresh), keys), table
+
+
+def _seed() -> dict:
+    day = day_number("2024-05-30")
+    with transaction() as conn:
+        ids = {"boss": conn.execute(
+            "INSERT INTO users (username, password, role) VALUES ('boss', 'x', 'Manager')"
+        ).lastrowid}
+        for username in ("ana", "ben", "cem"):
+            ids[username] = conn.execute(
+                "INSERT INTO users (username, password, role, manager_ID) VALUES (?, 'x', 'User', ?)", (username, ids["boss"])
+            ).lastrowid
+        for destination, start, length, budget in (("Rome", day, 4, 100000), ("Oslo", day + 20, 2, None), ("Lima", None, None, 5000)):
+            ids[destination] = conn.execute(
+                "INSERT INTO trips (destination, start_day, end_day, occasion, manager_ID, budget_cents) VALUES (?, ?, ?, '', ?, ?)",
+                (destination, start, start + length - 1 if start else None, ids["boss"], budget)
+            ).lastrowid
+    bump_version("users", "trips")
+    set_trip_participants(ids["Rome"], [ids["ana"], ids["ben"], ids["cem"]])
+    set_trip_participants(ids["Oslo"], [ids["ana"], ids["ben"]])
+    set_trip_participants(ids["Lima"], [ids["cem"]])
+    book_expense(ids["Rome"], 2500, ids["ben"], booked_by=ids["boss"])
+    book_expense(ids["Rome"], 700, ids["ana"], booked_by=ids["boss"])
+    book_expense(ids["Oslo"], 1200, ids["ben"], booked_by=ids["boss"])
+    book_expense(ids["Lima"], 300, ids["cem"], booked_by=ids["boss"])
+    return ids
+
+
+def _set_days(trip_ID: int, start_day, end_day):
+    with transaction() as conn:
+        conn.execute("UPDATE trips SET start_day = ?, end_day = ? WHERE trip_ID = ?", (start_day, end_day, trip_ID))
+    bump_version("trips")
+
+
+def test_statistics_follow_every_change(db):
+    ids = _seed()
+    _assert_fresh()
+
+    #a participant leaves, the trip keeps its expenses
+    set_trip_participants(ids["Rome"], [ids["ana"], ids["cem"]])
+    _assert_fresh()
+
+    #other days, into another month, then no dates at all and back
+    day = day_number("2024-07-01")
+    _set_days(ids["Rome"], day, day + 9)
+    _assert_fresh()
+    _set_days(ids["Oslo"], None, None)
+    _assert_fresh()
+    _set_days(ids["Lima"], day + 3, day + 3)
+    _assert_fresh()
+
+    #deleting trips takes their participants, budget and expenses out
+    for destination in ("Rome", "Lima"):
+        del_trip(ids[destination])
+        _assert_fresh()
+    with connection() as conn:
+        assert conn.execute("SELECT SUM(budget_cents) FROM trip_stats_manager").fetchone()[0] == 0
@@ -0,0 +1,180 @@
+import os
+from datetime import date
+from types import SimpleNamespace
+
+from streamlit.testing.v1 import AppTest
+
+from db import db_functions_trips
+from db.db_cache import bump_version
+from db.db_connection import connection, transaction
+from db.db_migrations import day_number
+from db.db_functions_trips import add_trips, load_trip_page, get_user_trips, set_many_trip_participants, set_trip_participants
+from db.db_functions_conflicts import find_all_conflicts
+from db.db_functions_occupancy import daily_headcount
+from db.db_instrumentation import recent_reruns, reset_stats
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _insert_trips(rows):
+    with transaction() as conn:
+        conn.executemany("INSERT INTO trips (trip_ID, destination, start_day, end_day, occasion) VALUES (?, ?, ?, ?, '')", rows)
+    bump_version("trips")
+
+
+def _walk(limit, **filters):
+    seen, after = [], None
+    while True:
+        trips, _, after = load_trip_page(after, limit, **filters)
+        seen += [t[0] for t in trips]
+        if after is None:
+            return seen
+
+
+def test_pages_cover_every_trip_in_order(db):
+    day = day_number("2024-05-01")
+    _insert_trips([(t, f"City {t}", day + t % 3, day + t % 3 + 1) for t in range(1, 8)])
+    assert _walk(2) == [3, 6, 1, 4, 7, 2, 5]
+
+
+#trips whose date did not convert in migration 12 have no start_day
+def test_page_boundary_on_trip_without_date(db):
+    day = day_number("2024-05-01")
+    _insert_trips([(1, "No date", None, None), (2, "No date", None, None), (3, "Rome", day, day), (4, "Oslo", day + 1, day + 2)])
+    trips, _, after = load_trip_page(None, 1)
+    assert [t[0] for t in trips] == [1]
+    assert after == (None, 1)
+    for limit in (1, 2, 3):
+        assert _walk(limit) == [1, 2, 3, 4]
+
+
+def test_page_filters(db):
+    day = day_number("2024-05-01")
+    _insert_trips([(1, "No date", None, None), (2, "Rome", day, day + 3), (3, "Oslo", day + 10, day + 12)])
+    assert _walk(1, date_from="2024-05-02", date_to="2024-05-04") == [2]
+    assert _walk(1, status="planned") == [1, 2, 3]
+
+
+#AppTest always runs the whole page, so the fragment's run context is stood in for
+def test_fragment_rerun_opens_its_own_summary(monkeypatch):
+    reset_stats()
+    for fragment_ids in ([], ["trip_panel_fragment"]):
+        monkeypatch.setattr(db_functions_trips, "get_script_run_ctx", lambda: SimpleNamespace(fragment_ids_this_run=fragment_ids))
+        db_functions_trips._begin_fragment_rerun("trip_panel")
+    assert [r["page"] for r in recent_reruns()] == ["trip_panel"]
+    reset_stats()
+
+
+def test_user_trip_days_follow_their_trip(db):
+    day = day_number("2024-05-01")
+    _insert_trips([(1, "Rome", day, day + 2), (2, "Oslo", day + 30, day + 31)])
+    with transaction() as conn:
+        conn.execute("INSERT INTO users (user_ID, username, password, role) VALUES (7, 'dev', 'x', 'User')")
+        conn.executemany("INSERT INTO user_trips (trip_ID, user_ID) VALUES (?, 7)", [(1,), (2,)])
+        seq = conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+        conn.execute("UPDATE trips SET start_day = ?, end_day = ? WHERE trip_ID = 2", (day + 1, day + 1))
+    bump_version("users", "trips", "user_trips")
+
+    with connection() as conn:
+        assert conn.execute("SELECT trip_ID, start_day, end_day FROM user_trips ORDER BY trip_ID").fetchall() == [
+            (1, day, day + 2), (2, day + 1, day + 1)
+        ]
+        #the copied days are no change of the link
+        assert conn.execute("SELECT table_name FROM change_log WHERE seq > ?", (seq,)).fetchall() == [("trips",)]
+        plan = " ".join(row[3] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT trip_ID FROM user_trips WHERE user_ID = ? AND end_day >= ? AND start_day <= ?",
+            (7, day, day)
+        ))
+        assert "ix_user_trips_days (user_ID=? AND end_day>?)" in plan
+    assert [t[0] for t in get_user_trips(7, "2024-05-02", "2024-05-02")] == [2, 1]
+    assert get_user_trips(7, "2024-05-04", "2024-05-30") == []
+
+
+def _manager_page(manager_ID):
+    at = AppTest.from_file(os.path.join(ROOT, "pages", "manager_overview.py"), default_timeout=30)
+    at.session_state["username"] = "boss"
+    at.session_state["role"] = "Manager"
+    at.session_state["user_ID"] = manager_ID
+    at.session_state["role_sortkey"] = 2
+    return at
+
+
+def _panel_trip_IDs(at):
+    return [int(e.label.split(" — ")[0]) for e in at.expander if " — " in e.label]
+
+
+def test_load_more_fetches_only_the_next_page(db, monkeypatch):
+    day = day_number("2024-05-01")
+    with transaction() as conn:
+        boss = conn.execute("INSERT INTO users (username, password, role) VALUES ('boss', 'x', 'Manager')").lastrowid
+    _insert_trips([(t, f"City {t}", day + t, day + t) for t in range(1, 61)])
+    calls = []
+    real_load_trip_page = db_functions_trips.load_trip_page
+    monkeypatch.setattr(db_functions_trips, "load_trip_page", lambda after, *args: calls.append(after) or real_load_trip_page(after, *args))
+
+    at = _manager_page(boss).run()
+    assert not at.exception
+    assert calls == [None] and _panel_trip_IDs(at) == list(range(1, 26))
+    at = [b for b in at.button if b.label == "Load more"][0].click().run()
+    assert calls == [None, (day + 25, 25)] and _panel_trip_IDs(at) == list(range(1, 51))
+    at.run()
+    assert len(calls) == 2
+
+    #after a write the pages are read again, each after the reloaded page before it
+    _insert_trips([(61, "Early", day, day)])
+    at.run()
+    assert _panel_trip_IDs(at) == [61, *range(1, 50)]
+    assert calls[2:] == [None, (day + 24, 24)]
+
+
+#migration 12: end_day is only NULL together with start_day
+def test_batch_trip_without_end_ends_on_its_start_day(db):
+    with transaction() as conn:
+        conn.execute("INSERT INTO users (user_ID, username, password, role) VALUES (7, 'dev', 'x', 'User')")
+    bump_version("users")
+    [trip_ID] = add_trips([{"destination": "Rome", "start_date": "2024-05-01", "participants": [7]}])
+    with connection() as conn:
+        assert conn.execute("SELECT start_date, end_date FROM trips WHERE trip_ID = ?", (trip_ID,)).fetchone() == ("2024-05-01", "2024-05-01")
+        assert conn.execute("SELECT trips, travel_days FROM trip_stats_user WHERE user_ID = 7").fetchone() == (1, 1)
+    assert find_all_conflicts() == []
+    assert daily_headcount(date(2024, 5, 1), date(2024, 5, 2), [7]).tolist() == [1, 0]
+
+
+def _links() -> dict:
+    with connection() as conn:
+        return {(t, u): i for i, t, u in conn.execute("SELECT id, trip_ID, user_ID FROM user_trips")}
+
+
+def _logged_since(seq: int) -> list:
+    with connection() as conn:
+        return conn.execute(
+            "SELECT table_name, op, json_extract(COALESCE(data, old_data), '$.trip_ID'), "
+            "json_extract(COALESCE(data, old_data), '$.user_ID') FROM change_log WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+
+
+def test_participant_updates_write_only_the_difference(db):
+    day = day_number("2024-05-01")
+    _insert_trips([(1, "Rome", day, day + 2), (2, "Oslo", day + 30, day + 31)])
+    with transaction() as conn:
+        conn.executemany("INSERT INTO users (user_ID, username, password, role) VALUES (?, ?, 'x', 'User')",
+                         [(100 + u, f"dev{u}") for u in range(1, 6)])
+    bump_version("users")
+    assert set_many_trip_participants({1: [101, 102, 103], 2: [101]}) == {1: (3, 0), 2: (1, 0)}
+    before = _links()
+    with connection() as conn:
+        seq = conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+
+    assert set_trip_participants(1, ["102", 103, 104]) == (1, 1)
+    after = _links()
+    assert set(after) == {(1, 102), (1, 103), (1, 104), (2, 101)}
+    for kept in ((1, 102), (1, 103), (2, 101)):
+        assert after[kept] == before[kept]
+    assert _logged_since(seq) == [("user_trips", "delete", 1, 101), ("user_trips", "insert", 1, 104)]
+
+    #an unchanged trip is neither deleted nor inserted again
+    with connection() as conn:
+        seq = conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+    assert set_many_trip_participants({1: [102, 103, 104], 2: [101, 105]}) == {1: (0, 0), 2: (1, 0)}
+    assert _links()[(1, 102)] == before[(1, 102)] and _links()[(2, 101)] == before[(2, 101)]
+    assert _logged_since(seq) == [("user_trips", "insert", 2, 105)]
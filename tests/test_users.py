@@ -0,0 +1,134 @@
+import sqlite3
+
+import pytest
+
+from db.db_cache import bump_version
+from db.db_connection import transaction
+from db.db_migrations import day_number
+from db.db_functions_users import count_subtree, del_user, get_subtree, is_under
+from db.db_functions_trips import del_trip
+from db.db_functions_budget import book_expense, load_expenses, load_trip_budgets
+
+
+def _manager_with_trip():
+    day = day_number("2024-05-01")
+    with transaction() as conn:
+        manager_ID = conn.execute(
+            "INSERT INTO users (username, password, role) VALUES ('boss', 'x', 'Manager')"
+        ).lastrowid
+        user_ID = conn.execute(
+            "INSERT INTO users (username, password, role, manager_ID) VALUES ('worker', 'x', 'User', ?)", (manager_ID,)
+        ).lastrowid
+        trip_ID = conn.execute(
+            "INSERT INTO trips (destination, start_day, end_day, occasion, manager_ID) VALUES ('Rome', ?, ?, '', ?)",
+            (day, day + 2, manager_ID)
+        ).lastrowid
+        conn.execute("INSERT INTO user_trips (trip_ID, user_ID) VALUES (?, ?)", (trip_ID, user_ID))
+    bump_version("users", "trips", "user_trips")
+    return manager_ID, user_ID, trip_ID
+
+
+#the cascade changes trips and trip_expenses, cached reads of them must not survive it
+def test_del_user_invalidates_cascaded_tables(db):
+    manager_ID, user_ID, trip_ID = _manager_with_trip()
+    book_expense(trip_ID, 500, user_ID)
+    assert [t[0] for t in load_trip_budgets(manager_ID)] == [trip_ID]
+    assert load_expenses(trip_ID)[0][2] == "worker"
+
+    del_user("boss")
+    assert load_trip_budgets(manager_ID) == []
+    del_user("worker")
+    assert load_expenses(trip_ID)[0][2] == "–"
+
+
+def test_del_trip_invalidates_expenses(db):
+    _, user_ID, trip_ID = _manager_with_trip()
+    book_expense(trip_ID, 500, user_ID)
+    assert len(load_expenses(trip_ID)) == 1
+
+    del_trip(trip_ID)
+    assert load_expenses(trip_ID) == []
+
+
+def test_team_size_counts_every_level(db):
+    import streamlit as st
+    from db.db_functions_users import get_users_under_me
+
+    manager_ID, _, _ = _manager_with_trip()
+    with transaction() as conn:
+        lead = conn.execute(
+            "INSERT INTO users (username, password, role, manager_ID) VALUES ('lead', 'x', 'Manager', ?)", (manager_ID,)
+        ).lastrowid
+        conn.execute("INSERT INTO users (username, password, role, manager_ID) VALUES ('dev', 'x', 'User', ?)", (lead,))
+    bump_version("users")
+
+    st.session_state["role_sortkey"] = 3
+    try:
+        sizes = {r["username"]: r["team_size"] for r in get_users_under_me(records=True)}
+    finally:
+        del st.session_state["role_sortkey"]
+    assert sizes["boss"] == 3
+    assert sizes["lead"] == 1
+    assert sizes["worker"] == 0 and sizes["dev"] == 0
+
+
+def _hierarchy() -> dict:
+    with transaction() as conn:
+        ids = {"ceo": conn.execute(
+            "INSERT INTO users (username, password, role) VALUES ('ceo', 'x', 'Manager')"
+        ).lastrowid}
+        for username, manager in (("a", "ceo"), ("a1", "a"), ("a2", "a1"), ("b", "ceo")):
+            ids[username] = conn.execute(
+                "INSERT INTO users (username, password, role, manager_ID) VALUES (?, 'x', 'User', ?)",
+                (username, ids[manager])
+            ).lastrowid
+    bump_version("users")
+    return ids
+
+
+def _set_manager(user_ID: int, manager_ID):
+    with transaction() as conn:
+        conn.execute("UPDATE users SET manager_ID = ? WHERE user_ID = ?", (manager_ID, user_ID))
+    bump_version("users")
+
+
+def _below(user_ID: int) -> list:
+    return [(r[1], r[4]) for r in get_subtree(user_ID)]
+
+
+def test_closure_follows_a_moved_subtree(db):
+    ids = _hierarchy()
+    assert _below(ids["a"]) == [("a1", 1), ("a2", 2)]
+    assert _below(ids["b"]) == []
+
+    _set_manager(ids["a1"], ids["b"])
+    assert _below(ids["a"]) == []
+    assert _below(ids["b"]) == [("a1", 1), ("a2", 2)]
+    assert _below(ids["ceo"]) == [("a", 1), ("b", 1), ("a1", 2), ("a2", 3)]
+    assert count_subtree(ids["a"]) == 0 and count_subtree(ids["b"]) == 2 and count_subtree(ids["ceo"]) == 4
+    assert is_under(ids["a2"], ids["b"]) and is_under(ids["a2"], ids["ceo"])
+    assert not is_under(ids["a2"], ids["a"])
+
+    #a move to the top detaches the subtree from every former ancestor
+    _set_manager(ids["a1"], None)
+    assert _below(ids["a1"]) == [("a2", 1)]
+    assert _below(ids["ceo"]) == [("a", 1), ("b", 1)]
+    assert count_subtree(ids["b"]) == 0 and count_subtree(ids["ceo"]) == 2
+    assert not is_under(ids["a2"], ids["ceo"]) and is_under(ids["a2"], ids["a1"])
+
+
+def test_closure_rejects_a_cycle(db):
+    ids = _hierarchy()
+    for user, manager in (("a", "a2"), ("a", "a1"), ("ceo", "b")):
+        with pytest.raises(sqlite3.IntegrityError, match="own manager"):
+            _set_manager(ids[user], ids[manager])
+        assert _below(ids["a"]) == [("a1", 1), ("a2", 2)]
+        assert _below(ids["ceo"]) == [("a", 1), ("b", 1), ("a1", 2), ("a2", 3)]
+        assert count_subtree(ids["a2"]) == 0
+        assert not is_under(ids[manager], ids[manager]) and not is_under(ids["ceo"], ids[user])
+
+    #a user that becomes their own manager is a root, not a cycle
+    _set_manager(ids["a1"], ids["a1"])
+    assert _below(ids["a1"]) == [("a2", 1)]
+    assert count_subtree(ids["a"]) == 0 and count_subtree(ids["ceo"]) == 2
+    assert not is_under(ids["a1"], ids["a1"])
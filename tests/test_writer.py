@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+from db.db_cache import table_versions
+from db.db_connection import connection
+from db.db_writer import Writer, WriterBusy
+
+
+#an operation that holds the writer thread until `release` is set
+def _blocking(started: threading.Event, release: threading.Event):
+    def op(conn):
+        started.set()
+        assert release.wait(5)
+    return op
+
+
+def _insert(destination: str):
+    return lambda conn: conn.execute(
+        "INSERT INTO trips (destination, occasion) VALUES (?, '')", (destination,)
+    ).lastrowid
+
+
+def _destinations() -> list:
+    with connection() as conn:
+        return [r[0] for r in conn.execute("SELECT destination FROM trips ORDER BY trip_ID")]
+
+
+def test_queued_writes_commit_in_one_batch(db):
+    writer = Writer(batch_size=10)
+    started, release = threading.Event(), threading.Event()
+    first = writer.submit(_blocking(started, release))
+    assert started.wait(5)
+    futures = [writer.submit(_insert(f"City {i}"), tables=("trips",)) for i in range(12)]
+    release.set()
+
+    trip_IDs = [f.result(5) for f in futures]
+    assert first.result(5) is None
+    assert trip_IDs == sorted(trip_IDs)
+    assert _destinations() == [f"City {i}" for i in range(12)]
+    stats = writer.stats()
+    #the blocking write alone, then batches of at most batch_size
+    assert stats["batches"] == 3 and stats["largest_batch"] == 10
+    assert stats["committed"] == 13 and stats["failed"] == 0
+
+
+def test_failing_write_is_rolled_back_alone(db):
+    writer = Writer()
+    started, release = threading.Event(), threading.Event()
+    writer.submit(_blocking(started, release))
+    assert started.wait(5)
+
+    def fails(conn):
+        conn.execute("INSERT INTO trips (destination, occasion) VALUES ('Half written', '')")
+        conn.execute("INSERT INTO trips (destination) VALUES (NULL)")
+
+    before = writer.submit(_insert("Rome"), tables=("trips",))
+    failing = writer.submit(fails, tables=("trips",))
+    after = writer.submit(_insert("Oslo"), tables=("trips",))
+    release.set()
+
+    assert before.result(5) and after.result(5)
+    with pytest.raises(Exception, match="NOT NULL"):
+        failing.result(5)
+    assert _destinations() == ["Rome", "Oslo"]
+    assert writer.stats()["failed"] == 1 and writer.stats()["batches"] == 2
+
+
+def test_full_queue_rejects_after_the_timeout(db):
+    writer = Writer(queue_size=1)
+    started, release = threading.Event(), threading.Event()
+    writer.submit(_blocking(started, release))
+    assert started.wait(5)
+    queued = writer.submit(_insert("Rome"), tables=("trips",))
+
+    with pytest.raises(WriterBusy, match="1 pending"):
+        writer.submit(_insert("Oslo"), tables=("trips",), timeout=0.05)
+    release.set()
+    assert queued.result(5)
+    assert _destinations() == ["Rome"]
+    assert writer.stats()["rejected"] == 1 and writer.stats()["submitted"] == 2
+
+
+def test_versions_move_once_the_batch_is_committed(db):
+    writer = Writer()
+    seen = {}
+
+    def op(conn):
+        seen["during"] = table_versions("trips", "users")
+        return conn.execute("INSERT INTO trips (destination, occasion) VALUES ('Rome', '')").lastrowid
+
+    before = table_versions("trips", "users")
+    writer.submit(op, tables=("trips",)).result(5)
+    assert seen["during"] == before
+    after = table_versions("trips", "users")
+    #(generation, trips, users)
+    assert after[1] == before[1] + 1 and after[2] == before[2]
+    #readers that see the new version see the committed row
+    assert _destinations() == ["Rome"]
+
+    failing = writer.submit(lambda conn: conn.execute("INSERT INTO nowhere VALUES (1)"), tables=("users",))
+    with pytest.raises(Exception, match="nowhere"):
+        failing.result(5)
+    assert table_versions("trips", "users") == after